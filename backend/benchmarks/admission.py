@@ -0,0 +1,90 @@
+"""Measure how the admission control shares the VM creation capacity between clients.
+
+A heavy client bursts many creation requests while light clients each send a few right after. Every admitted request
+holds its slot for `--service-time` seconds, as the cloud API call does. The waits of the admitted requests and the
+number of rejected ones are printed per kind of client, the light clients should wait about as little as the heavy
+client's first requests.
+
+Run it with ``python -m benchmarks.admission --heavy-requests 200 --light-clients 5``.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time as tm
+from typing import Any
+
+from cactus.components.vm.admission import AdmissionController
+from cactus.components.vm.admission import AdmissionRejectedError
+
+
+async def request(admission_controller: AdmissionController, client_id: str, service_time: float) -> float | None:
+    """Return the wait of the request until its admission, `None` if it was rejected."""
+
+    started_at = tm.perf_counter()
+    try:
+        await admission_controller.acquire(client_id)
+    except AdmissionRejectedError:
+        return None
+
+    waited = tm.perf_counter() - started_at
+    await asyncio.sleep(service_time)
+    admission_controller.release()
+
+    return waited
+
+
+def summarize(waits: list[float | None]) -> dict[str, Any]:
+    admitted = sorted(wait for wait in waits if wait is not None)
+
+    return {
+        'admitted': len(admitted),
+        'rejected': len(waits) - len(admitted),
+        'wait_p50_ms': statistics.median(admitted) * 1e3 if admitted else None,
+        'wait_max_ms': admitted[-1] * 1e3 if admitted else None,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    admission_controller = AdmissionController(
+        concurrency=args.concurrency,
+        rate=args.rate,
+        queue_size=args.queue_size,
+        client_queue_size=args.client_queue_size,
+        max_wait=args.max_wait,
+    )
+
+    heavy = [request(admission_controller, 'heavy', args.service_time) for _ in range(args.heavy_requests)]
+    light = [
+        request(admission_controller, f'light-{client}', args.service_time)
+        for client in range(args.light_clients)
+        for _ in range(args.light_requests)
+    ]
+    heavy_tasks = [asyncio.create_task(coroutine) for coroutine in heavy]
+    await asyncio.sleep(0)
+    light_waits = await asyncio.gather(*light)
+    heavy_waits = await asyncio.gather(*heavy_tasks)
+
+    return {
+        'concurrency': args.concurrency,
+        'rate': args.rate,
+        'heavy': summarize(heavy_waits),
+        'light': summarize(light_waits),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--heavy-requests', type=int, default=200)
+    parser.add_argument('--light-clients', type=int, default=5)
+    parser.add_argument('--light-requests', type=int, default=2)
+    parser.add_argument('--service-time', type=float, default=0.05)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=100)
+    parser.add_argument('--queue-size', type=int, default=100)
+    parser.add_argument('--client-queue-size', type=int, default=50)
+    parser.add_argument('--max-wait', type=float, default=30)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))  # noqa: T201
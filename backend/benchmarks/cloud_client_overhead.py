@@ -0,0 +1,69 @@
+"""Measure the per-request cost of resolving the cloud client dependency.
+
+Before the client became a process-wide singleton, every request rebuilt the Exoscale client, re-read the kernel setup
+script from disk and created a new repo validator. This compares that construction with the lookup of the instance
+that the application lifespan creates once.
+
+Run it with ``python -m benchmarks.cloud_client_overhead``.
+"""
+
+import argparse
+import asyncio
+import json
+import timeit
+from types import SimpleNamespace
+
+import httpx
+from cactus.components.artifacts.store import ArtifactStore
+from cactus.components.artifacts.store import create_artifact_store
+from cactus.components.cloud.clients import create_cloud_client
+from cactus.components.cloud.clients import get_cloud_client
+from cactus.components.cloud.clients import read_setup_environment_script
+from cactus.components.repo.cache import ValidationCache
+from cactus.components.repo.validators import create_repo_validator
+from cactus.components.repo.validators import create_validation_cache
+from cactus.config import Settings
+
+
+def build_per_request(
+    settings: Settings, http_client: httpx.AsyncClient, validation_cache: ValidationCache, artifact_store: ArtifactStore
+) -> None:
+    read_setup_environment_script.cache_clear()
+    create_cloud_client(
+        settings, create_repo_validator(settings, http_client, validation_cache), artifact_store, http_client
+    )
+
+
+async def main(number: int) -> dict[str, float]:
+    settings = Settings()
+
+    validation_cache = create_validation_cache(settings)
+    artifact_store = create_artifact_store(settings)
+
+    async with httpx.AsyncClient() as http_client:
+        app = SimpleNamespace(state=SimpleNamespace())
+        app.state.cloud_client = create_cloud_client(
+            settings, create_repo_validator(settings, http_client, validation_cache), artifact_store, http_client
+        )
+        request = SimpleNamespace(app=app)
+
+        per_request = timeit.timeit(
+            lambda: build_per_request(settings, http_client, validation_cache, artifact_store), number=number
+        )
+        singleton = timeit.timeit(lambda: get_cloud_client(request), number=number)
+
+    validation_cache.close()
+
+    return {
+        'iterations': number,
+        'per_request_construction_us': per_request / number * 1e6,
+        'singleton_lookup_us': singleton / number * 1e6,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(main(args.number)), indent=2))  # noqa: T201
@@ -0,0 +1,127 @@
+"""Minimal in-memory imitation of the Exoscale V2 API endpoints used by the cloud client.
+
+Run it with ``python -m benchmarks.fakes.exoscale`` and point ``CLOUD_API_URL`` at ``http://<host>:<port>/v2``.
+"""
+
+import argparse
+import time as tm
+from typing import Any
+from uuid import uuid4
+
+import uvicorn
+from cactus.components.cloud.exoscale import get_api_operations
+from fastapi import APIRouter
+from fastapi import Body
+from fastapi import FastAPI
+from fastapi import HTTPException
+
+
+class FakeExoscale:
+    def __init__(self, *, operation_latency: float = 0, public_ip: str = '127.0.0.1') -> None:
+        self.operation_latency = operation_latency
+        self.public_ip = public_ip
+
+        self.instances: dict[str, dict[str, Any]] = {}
+        self.operations: dict[str, dict[str, Any]] = {}
+
+    def start_operation(self, reference_id: str, command: str) -> dict[str, Any]:
+        operation = {
+            'id': str(uuid4()),
+            'state': 'pending',
+            'reference': {'id': reference_id, 'command': command},
+            'ready_at': tm.monotonic() + self.operation_latency,
+        }
+        self.operations[operation['id']] = operation
+
+        return self.get_operation(operation['id'])
+
+    def get_operation(self, operation_id: str) -> dict[str, Any]:
+        operation = self.operations.get(operation_id)
+        if operation is None:
+            raise HTTPException(status_code=404)
+
+        if operation['state'] == 'pending' and tm.monotonic() >= operation['ready_at']:
+            operation['state'] = 'success'
+            if operation['reference']['command'] == 'delete-instance':
+                self.instances.pop(operation['reference']['id'], None)
+
+        return {key: value for key, value in operation.items() if key != 'ready_at'}
+
+    @staticmethod
+    def check_body(operation_id: str, body: dict[str, Any]) -> None:
+        """Reject the body like the API does if its fields are not those of the operation specification."""
+
+        schema = get_api_operations()[operation_id]['operation']['requestBody']['content']['application/json']['schema']
+        unknown_fields = set(body) - set(schema['properties'])
+        missing_fields = set(schema.get('required', [])) - set(body)
+        if unknown_fields or missing_fields:
+            raise HTTPException(
+                status_code=400,
+                detail=f'Unknown fields: {sorted(unknown_fields)}, missing fields: {sorted(missing_fields)}',
+            )
+
+    def get_instance(self, instance_id: str) -> dict[str, Any]:
+        instance = self.instances.get(instance_id)
+        if instance is None:
+            raise HTTPException(status_code=404)
+
+        return instance
+
+    def create_router(self) -> APIRouter:
+        router = APIRouter(prefix='/v2')
+
+        @router.get('/instance')
+        def list_instances():
+            return {'instances': list(self.instances.values())}
+
+        @router.post('/instance')
+        def create_instance(body: dict[str, Any] = Body(...)):
+            self.check_body('create-instance', body)
+            instance_id = str(uuid4())
+            self.instances[instance_id] = {
+                'id': instance_id,
+                'name': f'vm-{instance_id[:8]}',
+                'public-ip': self.public_ip,
+                'labels': body.get('labels', {}),
+                'state': 'running',
+            }
+            return self.start_operation(instance_id, 'create-instance')
+
+        @router.get('/instance/{instance_id}')
+        def get_instance(instance_id: str):
+            return self.get_instance(instance_id)
+
+        @router.put('/instance/{instance_id}')
+        def update_instance(instance_id: str, body: dict[str, Any] = Body(...)):
+            self.check_body('update-instance', body)
+            self.get_instance(instance_id).update(body)
+            return self.start_operation(instance_id, 'update-instance')
+
+        @router.delete('/instance/{instance_id}')
+        def delete_instance(instance_id: str):
+            self.get_instance(instance_id)
+            return self.start_operation(instance_id, 'delete-instance')
+
+        @router.get('/operation/{operation_id}')
+        def get_operation(operation_id: str):
+            return self.get_operation(operation_id)
+
+        return router
+
+
+def create_fake_exoscale_app(**kwargs: Any) -> FastAPI:
+    app = FastAPI()
+    app.state.exoscale = FakeExoscale(**kwargs)
+    app.include_router(app.state.exoscale.create_router())
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9992)
+    parser.add_argument('--operation-latency', type=float, default=2)
+    args = parser.parse_args()
+
+    uvicorn.run(create_fake_exoscale_app(operation_latency=args.operation_latency), host=args.host, port=args.port)
@@ -0,0 +1,172 @@
+"""Minimal imitation of the GitHub REST API endpoints used by the repo validator.
+
+Every ``<owner>/<repo>`` exists and holds the same packaging files, except the repos named ``missing``. Run it with
+``python -m benchmarks.fakes.github`` and point ``GITHUB_API_URL`` at ``http://<host>:<port>``.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import tarfile
+from typing import Any
+
+import uvicorn
+from fastapi import APIRouter
+from fastapi import FastAPI
+from fastapi import HTTPException
+from fastapi import Request
+from fastapi.responses import RedirectResponse
+from fastapi.responses import Response
+
+DEFAULT_FILES = {
+    'pyproject.toml': (
+        '[project]\n'
+        'name = "demo"\n'
+        'requires-python = ">=3.11"\n'
+        'dependencies = ["numpy", "pandas>=2"]\n'
+        '\n'
+        '[build-system]\n'
+        'requires = ["setuptools"]\n'
+    ),
+    'requirements.txt': 'numpy\npandas>=2\n',
+    'README.md': '# Demo\n',
+}
+COMMIT_DATE = '2024-01-01T00:00:00Z'
+COMMIT_TIMESTAMP = 1704067200
+
+
+class FakeGitHub:
+    def __init__(
+        self, *, latency: float = 0, files: dict[str, str] | None = None, rate_limit: int = 5000, prefix: str = ''
+    ) -> None:
+        self.latency = latency
+        self.files = files or DEFAULT_FILES
+        self.rate_limit_remaining = rate_limit
+        self.prefix = prefix
+
+        self.calls = 0
+        self._archives: dict[str, bytes] = {}
+
+    @staticmethod
+    def get_commit_sha(owner: str, repo: str) -> str:
+        return hashlib.sha1(f'{owner}/{repo}'.encode()).hexdigest()
+
+    def get_archive(self, owner: str, repo: str, commit_sha: str) -> bytes:
+        if commit_sha not in self._archives:
+            archive = io.BytesIO()
+            with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+                for path, content in self.files.items():
+                    data = content.encode()
+                    member = tarfile.TarInfo(f'{owner}-{repo}-{commit_sha[:7]}/{path}')
+                    member.size = len(data)
+                    member.mtime = COMMIT_TIMESTAMP
+                    tar.addfile(member, io.BytesIO(data))
+            self._archives[commit_sha] = archive.getvalue()
+
+        return self._archives[commit_sha]
+
+    async def reply(self, request: Request, content: str, media_type: str = 'application/json') -> Response:
+        """Answer like the GitHub API, conditional requests answered with `304` do not count against the rate limit."""
+
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+        etag = f'"{hashlib.md5(content.encode()).hexdigest()}"'
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status_code=304, headers={'ETag': etag})
+
+        self.rate_limit_remaining = max(self.rate_limit_remaining - 1, 0)
+        headers = {'ETag': etag, 'X-RateLimit-Remaining': str(self.rate_limit_remaining)}
+
+        return Response(content, media_type=media_type, headers=headers)
+
+    def check_repo(self, owner: str, repo: str, commit_sha: str | None = None) -> None:
+        if repo == 'missing' or commit_sha not in (None, 'HEAD', self.get_commit_sha(owner, repo)):
+            raise HTTPException(status_code=404)
+
+    def create_router(self) -> APIRouter:
+        router = APIRouter(prefix=self.prefix)
+
+        @router.get('/repos/{owner}/{repo}/commits/{ref}')
+        async def get_commit(owner: str, repo: str, ref: str, request: Request):
+            self.check_repo(owner, repo, ref)
+            commit_sha = self.get_commit_sha(owner, repo)
+
+            if request.headers.get('Accept') == 'application/vnd.github.sha':
+                return await self.reply(request, commit_sha, 'text/plain')
+            return await self.reply(
+                request, json.dumps({'sha': commit_sha, 'commit': {'committer': {'date': COMMIT_DATE}}})
+            )
+
+        @router.get('/repos/{owner}/{repo}/commits')
+        async def list_commits(owner: str, repo: str, request: Request, sha: str | None = None):
+            self.check_repo(owner, repo, sha)
+            commits = [{'sha': self.get_commit_sha(owner, repo), 'commit': {'committer': {'date': COMMIT_DATE}}}]
+
+            return await self.reply(request, json.dumps(commits))
+
+        @router.get('/repos/{owner}/{repo}/contents/')
+        async def list_contents(owner: str, repo: str, request: Request, ref: str | None = None):
+            self.check_repo(owner, repo, ref)
+            commit_sha = self.get_commit_sha(owner, repo)
+            base_url = f'{str(request.base_url).rstrip("/")}{self.prefix}'
+            contents = [
+                {
+                    'name': path,
+                    'path': path,
+                    'type': 'file',
+                    'download_url': f'{base_url}/raw/{owner}/{repo}/{commit_sha}/{path}',
+                }
+                for path in self.files
+                if '/' not in path
+            ]
+
+            return await self.reply(request, json.dumps(contents))
+
+        @router.get('/raw/{owner}/{repo}/{commit_sha}/{path:path}')
+        async def get_raw_file(owner: str, repo: str, commit_sha: str, path: str, request: Request):
+            self.check_repo(owner, repo, commit_sha)
+            if path not in self.files:
+                raise HTTPException(status_code=404)
+
+            return await self.reply(request, self.files[path], 'text/plain')
+
+        @router.get('/repos/{owner}/{repo}/tarball/{commit_sha}')
+        async def get_tarball(owner: str, repo: str, commit_sha: str):
+            self.check_repo(owner, repo, commit_sha)
+            self.calls += 1
+            await asyncio.sleep(self.latency)
+
+            return RedirectResponse(f'{self.prefix}/codeload/{owner}/{repo}/{commit_sha}', status_code=302)
+
+        @router.get('/codeload/{owner}/{repo}/{commit_sha}')
+        async def get_archive(owner: str, repo: str, commit_sha: str):
+            self.check_repo(owner, repo, commit_sha)
+
+            return Response(self.get_archive(owner, repo, commit_sha), media_type='application/x-gzip')
+
+        @router.get('/rate_limit')
+        def get_rate_limit():
+            return {'resources': {'core': {'remaining': self.rate_limit_remaining}}, 'calls': self.calls}
+
+        return router
+
+
+def create_fake_github_app(**kwargs: Any) -> FastAPI:
+    app = FastAPI()
+    app.state.github = FakeGitHub(**kwargs)
+    app.include_router(app.state.github.create_router())
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9994)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    uvicorn.run(create_fake_github_app(latency=args.latency), host=args.host, port=args.port)
@@ -0,0 +1,57 @@
+"""Minimal imitation of the JupyterHub login page probed by the cloud client.
+
+The hub answers `502 Bad Gateway` until `boot_time` seconds after the start, then `200 OK`. Every fake VM shares the
+same public IP, so a single hub stands for all of them. Run it with ``python -m benchmarks.fakes.jupyterhub`` and
+point ``JHUB_PORT`` at its port.
+"""
+
+import argparse
+import asyncio
+import time as tm
+from typing import Any
+
+import uvicorn
+from fastapi import APIRouter
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse
+from fastapi.responses import Response
+
+
+class FakeJupyterHub:
+    def __init__(self, *, boot_time: float = 0, latency: float = 0) -> None:
+        self.latency = latency
+        self.ready_at = tm.monotonic() + boot_time
+
+    def create_router(self) -> APIRouter:
+        router = APIRouter(prefix='/hub')
+
+        @router.get('/login')
+        async def login():
+            await asyncio.sleep(self.latency)
+
+            if tm.monotonic() < self.ready_at:
+                return Response(status_code=502)
+            return HTMLResponse('<html><body>Sign in with GitHub</body></html>')
+
+        return router
+
+
+def create_fake_jupyterhub_app(**kwargs: Any) -> FastAPI:
+    app = FastAPI()
+    app.state.jupyterhub = FakeJupyterHub(**kwargs)
+    app.include_router(app.state.jupyterhub.create_router())
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--boot-time', type=float, default=0)
+    parser.add_argument('--latency', type=float, default=0.01)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_fake_jupyterhub_app(boot_time=args.boot_time, latency=args.latency), host=args.host, port=args.port
+    )
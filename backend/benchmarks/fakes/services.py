@@ -0,0 +1,54 @@
+"""Serve the Exoscale, GitHub and JupyterHub stand-ins from a single port.
+
+The Exoscale API is served under ``/v2``, the GitHub API under ``/github`` and JupyterHub under ``/hub``. Run it with
+``python -m benchmarks.fakes.services`` and point ``CLOUD_API_URL`` at ``http://<host>:<port>/v2``,
+``GITHUB_API_URL`` at ``http://<host>:<port>/github`` and ``JHUB_PORT`` at the port.
+"""
+
+import argparse
+
+import uvicorn
+from fastapi import FastAPI
+
+from benchmarks.fakes.exoscale import FakeExoscale
+from benchmarks.fakes.github import FakeGitHub
+from benchmarks.fakes.jupyterhub import FakeJupyterHub
+
+
+def create_fake_services_app(
+    *, operation_latency: float = 0, github_latency: float = 0, jhub_boot_time: float = 0, jhub_latency: float = 0
+) -> FastAPI:
+    app = FastAPI()
+    app.state.exoscale = FakeExoscale(operation_latency=operation_latency)
+    app.state.github = FakeGitHub(latency=github_latency, prefix='/github')
+    app.state.jupyterhub = FakeJupyterHub(boot_time=jhub_boot_time, latency=jhub_latency)
+
+    app.include_router(app.state.exoscale.create_router())
+    app.include_router(app.state.github.create_router())
+    app.include_router(app.state.jupyterhub.create_router())
+
+    return app
+
+
+def run_fake_services(host: str, port: int, **kwargs: float) -> None:
+    uvicorn.run(create_fake_services_app(**kwargs), host=host, port=port, log_level='warning')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9992)
+    parser.add_argument('--operation-latency', type=float, default=2)
+    parser.add_argument('--github-latency', type=float, default=0.05)
+    parser.add_argument('--jhub-boot-time', type=float, default=0)
+    parser.add_argument('--jhub-latency', type=float, default=0.01)
+    args = parser.parse_args()
+
+    run_fake_services(
+        args.host,
+        args.port,
+        operation_latency=args.operation_latency,
+        github_latency=args.github_latency,
+        jhub_boot_time=args.jhub_boot_time,
+        jhub_latency=args.jhub_latency,
+    )
@@ -0,0 +1,73 @@
+"""Measure the cost of turning a listing of the whole organization into the models of our instances.
+
+The listing used to build a model for every instance of the organization before dropping those without a
+`redirect_id` label. This compares it with filtering the raw data first and validating the remaining instances in a
+single call.
+
+Run it with ``python -m benchmarks.instance_listing``.
+"""
+
+import argparse
+import json
+import timeit
+from typing import Any
+from uuid import uuid4
+
+from cactus.components.cloud.clients import CloudClient
+from cactus.components.cloud.models import Instance
+
+
+def build_listing(instances: int, ours: int) -> dict[str, Any]:
+    listing = []
+    for index in range(instances):
+        labels = {'redirect_id': str(uuid4())} if index < ours else {'team': 'other'}
+        listing.append(
+            {
+                'id': str(uuid4()),
+                'name': f'vm-{index}',
+                'public-ip': '127.0.0.1',
+                'labels': labels,
+                'state': 'running',
+                'instance-type': {'id': str(uuid4())},
+                'template': {'id': str(uuid4())},
+            }
+        )
+
+    return {'instances': listing}
+
+
+def validate_all(response: dict[str, Any]) -> list[Instance]:
+    instances = []
+    for instance in response['instances']:
+        instance = Instance.model_validate(instance)
+        if 'redirect_id' in instance.labels:
+            instances.append(instance)
+
+    return instances
+
+
+def main(instances: int, ours: int, number: int) -> dict[str, float]:
+    response = build_listing(instances, ours)
+
+    validate_all_time = timeit.timeit(lambda: validate_all(response), number=number)
+    filter_first_time = timeit.timeit(
+        lambda: CloudClient._parse_labelled_instances(response, 'redirect_id', 'de-fra-1'), number=number
+    )
+
+    return {
+        'instances': instances,
+        'labelled_instances': ours,
+        'iterations': number,
+        'validate_all_ms': validate_all_time / number * 1e3,
+        'filter_first_ms': filter_first_time / number * 1e3,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--instances', type=int, default=5000)
+    parser.add_argument('--ours', type=int, default=50)
+    parser.add_argument('--number', type=int, default=100)
+    args = parser.parse_args()
+
+    print(json.dumps(main(args.instances, args.ours, args.number), indent=2))  # noqa: T201
@@ -0,0 +1,56 @@
+"""Measure the cost of serializing a listing of instances for `GET /vms/`.
+
+The listing used to go through `jsonable_encoder` and the standard library JSON encoder on every poll. This compares
+it with serializing the models in a single pydantic-core call, and reports the size of the body a 304 saves.
+
+Run it with ``python -m benchmarks.instance_serialization``.
+"""
+
+import argparse
+import json
+import timeit
+from uuid import uuid4
+
+from cactus.components.cloud.models import INSTANCE_LIST_ADAPTER
+from cactus.components.cloud.models import Instance
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+def build_instances(instances: int) -> list[Instance]:
+    return INSTANCE_LIST_ADAPTER.validate_python(
+        [
+            {
+                'id': str(uuid4()),
+                'name': f'vm-{index}',
+                'public-ip': '127.0.0.1',
+                'labels': {'redirect_id': str(uuid4())},
+                'zone': 'de-fra-1',
+            }
+            for index in range(instances)
+        ]
+    )
+
+
+def main(instances: int, number: int) -> dict[str, float]:
+    models = build_instances(instances)
+
+    encoder_time = timeit.timeit(lambda: JSONResponse(jsonable_encoder(models)).body, number=number)
+    dump_json_time = timeit.timeit(lambda: INSTANCE_LIST_ADAPTER.dump_json(models, by_alias=True), number=number)
+
+    return {
+        'instances': instances,
+        'iterations': number,
+        'jsonable_encoder_ms': encoder_time / number * 1e3,
+        'dump_json_ms': dump_json_time / number * 1e3,
+        'full_response_bytes': len(INSTANCE_LIST_ADAPTER.dump_json(models, by_alias=True)),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--instances', type=int, default=500)
+    parser.add_argument('--number', type=int, default=100)
+    args = parser.parse_args()
+
+    print(json.dumps(main(args.instances, args.number), indent=2))  # noqa: T201
@@ -0,0 +1,213 @@
+"""Measure the throughput and latency of the main API endpoints under concurrent load.
+
+The application is created with ``create_app()`` and driven in-process, while the Exoscale, GitHub and JupyterHub
+stand-ins run in a separate process, so their cost is not charged to the application. Every scenario is run at each
+concurrency level, the results are printed as JSON to be compared between releases.
+
+Run it with ``python -m benchmarks.load --output results.json``.
+"""
+
+import argparse
+import asyncio
+import datetime as dt
+import itertools
+import json
+import multiprocessing
+import platform
+import socket
+import statistics
+import tempfile
+import time as tm
+from collections.abc import Awaitable
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+import httpx
+from cactus.app import create_app
+from cactus.config import Settings
+
+from benchmarks.fakes.services import run_fake_services
+
+Scenario = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def get_scenarios(path_hash: str, instance_id: str, repos: int) -> dict[str, Scenario]:
+    return {
+        'list_vms': lambda client, _: client.get(f'{path_hash}/vms/'),
+        'get_vm_services_status': lambda client, _: client.get(f'{path_hash}/vms/{instance_id}/status'),
+        # The first request of each repo validates it, the next ones are served from the validation cache
+        'validate_repo': lambda client, index: client.get(
+            f'{path_hash}/repos/validate/https://github.com/benchmark/repo-{index % repos}'
+        ),
+        'create_vm': lambda client, _: client.post(f'{path_hash}/vms/', json={'python_envs': ['sklearn']}),
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, scenario: Scenario, *, concurrency: int, requests: int
+) -> dict[str, Any]:
+    latencies = []
+    errors = 0
+    indexes = itertools.count()
+
+    async def work() -> None:
+        nonlocal errors
+        while (index := next(indexes)) < requests:
+            started_at = tm.perf_counter()
+            try:
+                response = await scenario(client, index)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(tm.perf_counter() - started_at)
+            if response.is_error:
+                errors += 1
+
+    started_at = tm.perf_counter()
+    await asyncio.gather(*(work() for _ in range(concurrency)))
+    duration = tm.perf_counter() - started_at
+
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': errors,
+        'duration_s': duration,
+        'throughput_rps': requests / duration,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else None,
+        'p50_ms': percentiles[49] * 1000 if latencies else None,
+        'p99_ms': percentiles[98] * 1000 if latencies else None,
+    }
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_server(url: str, timeout: float = 10) -> None:
+    deadline = tm.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                if tm.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+
+async def seed_instances(cloud_api_url: str, count: int) -> list[str]:
+    """Create VMs directly in the fake cloud, so the listings have a realistic size from the first request."""
+
+    async with httpx.AsyncClient() as client:
+        responses = await asyncio.gather(
+            *(
+                client.post(
+                    f'{cloud_api_url}/instance',
+                    json={
+                        'instance-type': {'id': str(uuid4())},
+                        'template': {'id': str(uuid4())},
+                        'disk-size': 50,
+                        'labels': {'redirect_id': str(uuid4())},
+                    },
+                )
+                for _ in range(count)
+            )
+        )
+
+    instance_ids = []
+    for response in responses:
+        response.raise_for_status()
+        instance_ids.append(response.json()['reference']['id'])
+
+    return instance_ids
+
+
+async def main(args: argparse.Namespace) -> dict[str, Any]:
+    port = get_free_port()
+    fake_services = multiprocessing.get_context('spawn').Process(
+        target=run_fake_services,
+        args=('127.0.0.1', port),
+        kwargs={
+            'operation_latency': args.operation_latency,
+            'github_latency': args.github_latency,
+            'jhub_latency': args.jhub_latency,
+        },
+        daemon=True,
+    )
+    fake_services.start()
+
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        await wait_for_server(f'{base_url}/v2/instance')
+        instance_ids = await seed_instances(f'{base_url}/v2', args.instances)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            settings = Settings(
+                cloud_api_url=f'{base_url}/v2',
+                github_api_url=f'{base_url}/github',
+                github_cache_path=Path(tmp_dir) / 'github-cache.sqlite3',
+                artifact_store_path=Path(tmp_dir) / 'artifacts',
+                jhub_port=port,
+                operation_poll_initial_interval=args.operation_latency / 2,
+            )
+            app = create_app(settings)
+            scenarios = get_scenarios(settings.path_hash, instance_ids[0], args.repos)
+
+            results = []
+            async with (
+                app.router.lifespan_context(app),
+                httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://cactus') as client,
+            ):
+                for name in args.scenarios:
+                    for concurrency in args.concurrency:
+                        result = await run_scenario(
+                            client, scenarios[name], concurrency=concurrency, requests=args.requests
+                        )
+                        results.append({'scenario': name, **result})
+    finally:
+        fake_services.terminate()
+        fake_services.join()
+
+    return {
+        'timestamp': dt.datetime.now(dt.UTC).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {
+            'requests': args.requests,
+            'instances': args.instances,
+            'repos': args.repos,
+            'operation_latency': args.operation_latency,
+            'github_latency': args.github_latency,
+            'jhub_latency': args.jhub_latency,
+        },
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scenarios', type=lambda value: value.split(','), default=list(get_scenarios('', '', 1)))
+    parser.add_argument(
+        '--concurrency', type=lambda value: [int(level) for level in value.split(',')], default=[1, 8, 32]
+    )
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--instances', type=int, default=50)
+    parser.add_argument('--repos', type=int, default=10)
+    parser.add_argument('--operation-latency', type=float, default=1)
+    parser.add_argument('--github-latency', type=float, default=0.05)
+    parser.add_argument('--jhub-latency', type=float, default=0.01)
+    parser.add_argument('--output', type=Path)
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(main(args)), indent=2)
+    if args.output is None:
+        print(report)  # noqa: T201
+    else:
+        args.output.write_text(report)
@@ -0,0 +1,82 @@
+"""Measure the cost of the dependency preflight of a repo.
+
+A synthetic index stands for the package index: packages with several releases each, the latest requiring a newer
+Python than the target, depending on a few of the following packages with random lower bounds. This compares a cold
+check, fetching all the metadata, a check of a new set of requirements with the metadata memoized, and a check of a
+set of requirements seen before.
+
+Run it with ``python -m benchmarks.preflight --packages 200``.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time as tm
+from pathlib import Path
+from typing import Any
+
+from cactus.components.repo.preflight import DependencyPreflight
+from cactus.components.repo.preflight import SnapshotPackageIndex
+
+
+def build_snapshot(packages: int, releases: int, seed: int) -> dict[str, Any]:
+    generator = random.Random(seed)
+    snapshot = {}
+    for index in range(packages):
+        snapshot[f'package-{index}'] = {
+            f'{major}.0': {
+                'requires_python': '>=3.8' if major < releases - 1 else '>=3.12',
+                'requires_dist': [
+                    f'package-{dependency}>={generator.randrange(releases - 1)}.0'
+                    for dependency in generator.sample(range(index + 1, packages), min(3, packages - index - 1))
+                ],
+            }
+            for major in range(releases)
+        }
+
+    return snapshot
+
+
+async def measure(preflight: DependencyPreflight, requirements: list[str]) -> float:
+    started_at = tm.perf_counter()
+    result = await preflight.check('3.11', requirements)
+    assert result.status == 'resolvable', result.error
+
+    return tm.perf_counter() - started_at
+
+
+async def run(packages: int, releases: int) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = Path(tmp_dir) / 'snapshot.json'
+        snapshot_path.write_text(json.dumps(build_snapshot(packages, releases, seed=0)))
+        preflight = DependencyPreflight(
+            SnapshotPackageIndex(snapshot_path),
+            mode='reject',
+            timeout=600,
+            cache_size=1024,
+            metadata_cache_size=10000,
+            cache_ttl=3600,
+        )
+
+        cold_time = await measure(preflight, ['package-0', 'package-1'])
+        memoized_metadata_time = await measure(preflight, ['package-0', 'package-1', 'package-2'])
+        memoized_result_time = await measure(preflight, ['package-1', 'package-0'])
+
+    return {
+        'packages': packages,
+        'releases': releases,
+        'cold_ms': cold_time * 1e3,
+        'memoized_metadata_ms': memoized_metadata_time * 1e3,
+        'memoized_result_ms': memoized_result_time * 1e3,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--packages', type=int, default=200)
+    parser.add_argument('--releases', type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args.packages, args.releases)), indent=2))  # noqa: T201
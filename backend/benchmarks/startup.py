@@ -0,0 +1,104 @@
+"""Measure how fast a worker process starts serving.
+
+Every run starts a fresh interpreter, as uvicorn does for each worker, and measures the import of `cactus.app`, the
+`create_app()` call, the lifespan startup and the first response. The app runs on the in-memory cloud simulator, so
+no network call is made. The median and the minimum of the runs are printed as JSON.
+
+Run it with ``python -m benchmarks.startup --runs 10``.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time as tm
+from typing import Any
+
+# Run in the child interpreters, `started_at` is taken before any import of the app
+MEASURE_CODE = """
+import time as tm
+started_at = tm.perf_counter()
+
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import cactus.app
+
+imported_at = tm.perf_counter()
+
+# Only needed by the first call to Exoscale or the first repo validation
+DEFERRED_MODULES = {'configparser', 'exoscale.api.v2', 'requests', 'resolvelib', 'tarfile', 'toml'}
+
+
+async def main():
+    import httpx
+    from cactus.config import Settings
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        settings = Settings(
+            cloud_provider='simulator',
+            jhub_probe_interval=3600,
+            github_cache_path=Path(tmp_dir) / 'github-cache.sqlite3',
+            artifact_store_path=Path(tmp_dir) / 'artifacts',
+        )
+        create_app_started_at = tm.perf_counter()
+        app = cactus.app.create_app(settings)
+        created_at = tm.perf_counter()
+
+        async with app.router.lifespan_context(app):
+            started_up_at = tm.perf_counter()
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://cactus') as client:
+                response = await client.get(f'{settings.path_hash}/vms/status')
+                response.raise_for_status()
+            responded_at = tm.perf_counter()
+
+    return {
+        'import_s': imported_at - started_at,
+        'create_app_s': created_at - create_app_started_at,
+        'lifespan_startup_s': started_up_at - created_at,
+        'first_response_s': responded_at - started_up_at,
+        'time_to_first_response_s': responded_at - started_at,
+        'deferred_modules_loaded': len(DEFERRED_MODULES & set(sys.modules)),
+    }
+
+
+print(json.dumps(asyncio.run(main())))
+"""
+
+
+def measure() -> dict[str, Any]:
+    started_at = tm.perf_counter()
+    process = subprocess.run([sys.executable, '-c', MEASURE_CODE], capture_output=True, text=True, check=True)
+    measurement = json.loads(process.stdout)
+
+    return {**measurement, 'process_s': tm.perf_counter() - started_at}
+
+
+def main(runs: int) -> dict[str, Any]:
+    # The first run warms the bytecode cache up
+    measure()
+    measurements = [measure() for _ in range(runs)]
+
+    return {
+        'runs': runs,
+        **{
+            name: {
+                'median': statistics.median(measurement[name] for measurement in measurements),
+                'min': min(measurement[name] for measurement in measurements),
+            }
+            for name in measurements[0]
+        },
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    print(json.dumps(main(args.runs), indent=2))  # noqa: T201
@@ -0,0 +1,108 @@
+"""Measure the cost of building the cloud-init user data of a VM.
+
+The user data used to be rendered from scratch for every VM, indenting the whole setup script and dedenting the whole
+document. This compares it with assembling the document from the parts rendered once by the user data builder.
+
+Run it with ``python -m benchmarks.user_data``.
+"""
+
+import argparse
+import base64
+import json
+import tempfile
+import timeit
+from pathlib import Path
+from textwrap import dedent
+from textwrap import indent
+from uuid import UUID
+from uuid import uuid4
+
+from cactus.components.artifacts.store import create_artifact_store
+from cactus.components.cloud.clients import read_setup_environment_script
+from cactus.components.cloud.user_data import SETUP_PLAN_FOOTER
+from cactus.components.cloud.user_data import SETUP_PLAN_HEADER
+from cactus.components.cloud.user_data import START_JUPYTERHUB
+from cactus.components.cloud.user_data import UserDataBuilder
+from cactus.components.vm.schemas import KERNELS
+from cactus.components.vm.schemas import InstanceCreateSchema
+from cactus.config import Settings
+
+
+def render_from_scratch(builder: UserDataBuilder, script: str, payload: InstanceCreateSchema, template_id: UUID) -> str:
+    commands = []
+    setups = builder.get_setups(payload, [], template_id)
+    for env, (key, _) in zip(payload.python_envs or [], setups, strict=True):
+        variables = builder.get_artifact_variables(key)
+        assignments = ' '.join(f"{name}='{value}'" for name, value in variables)
+        commands.append(
+            f"wait_for_slot; {assignments} setup_kernel /usr/local/bin/setup_environment.sh "
+            f"'{env['PYTHON_VERSION']}' '{env['UNIQUE_ENV_NAME']}' '{env['KERNEL_DISPLAY_NAME']}' "
+            f"'{' '.join(env['PIP_PACKAGES'])}' &"
+        )
+
+    setup_environment_script = '\n' + indent(script, ' ' * 18)
+    plan = SETUP_PLAN_HEADER.format(parallelism=payload.size.to_setup_parallelism(), on_kernel_ready=START_JUPYTERHUB)
+    setup_plan = '\n' + indent(plan + '\n'.join(commands) + '\n' + SETUP_PLAN_FOOTER, ' ' * 18)
+
+    user_data = dedent(
+        f"""
+        #cloud-config
+        write_files:
+          - path: /usr/local/bin/setup_environment.sh
+            permissions: '0755'
+            owner: root:root
+            content: | {setup_environment_script}
+          - path: /usr/local/bin/setup_environments.sh
+            permissions: '0755'
+            owner: root:root
+            content: | {setup_plan}
+        runcmd:
+          - >
+            sed -i
+            -e "s|GITHUB_OAUTH_CLIENT_ID|client-id|g"
+            -e "s|GITHUB_OAUTH_CLIENT_SECRET|client-secret|g"
+            -e "s|GITHUB_OAUTH_CALLBACK_URL|{builder.host_url}/vms/oauth/{uuid4()}|g"
+            /opt/tljh/config/config.yaml
+          - "tljh-config reload"
+          - "systemctl stop jupyterhub"
+          - "/usr/local/bin/setup_environments.sh"
+          - "systemctl start jupyterhub"
+        """
+    )
+
+    return base64.b64encode(user_data.encode()).decode()
+
+
+def main(number: int) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        settings = Settings(artifact_store_path=Path(tmp_dir))
+        script = read_setup_environment_script()
+        builder = UserDataBuilder(
+            setup_environment_script=script,
+            host_url=settings.cloud_host_url,
+            github_oauth_client_id='client-id',
+            github_oauth_client_secret='client-secret',
+            artifact_store=create_artifact_store(settings),
+        )
+        payload = InstanceCreateSchema(python_envs=list(KERNELS))
+        template_id = uuid4()
+
+        from_scratch_time = timeit.timeit(
+            lambda: render_from_scratch(builder, script, payload, template_id), number=number
+        )
+        builder_time = timeit.timeit(lambda: builder.build(payload, [], uuid4(), template_id), number=number)
+
+    return {
+        'kernels': len(KERNELS),
+        'iterations': number,
+        'from_scratch_us': from_scratch_time / number * 1e6,
+        'builder_us': builder_time / number * 1e6,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=10000)
+    args = parser.parse_args()
+
+    print(json.dumps(main(args.number), indent=2))  # noqa: T201
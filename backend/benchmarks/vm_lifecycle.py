@@ -0,0 +1,145 @@
+"""Measure the VM lifecycle at scale against the in-memory cloud simulator.
+
+Thousands of VMs are created through the batch endpoint, tracked until their jobs finished, listed and deleted, all
+within a single process and without any real VM. The simulated zones have a configurable API latency, operation
+latency and failure rates, the results are printed as JSON.
+
+Run it with ``python -m benchmarks.vm_lifecycle --instances 2000``.
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time as tm
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+
+import httpx
+from cactus.app import create_app
+from cactus.components.cloud.jobs import JobScheduler
+from cactus.config import Settings
+
+# Largest batch accepted by the batch endpoints
+BATCH_SIZE = 100
+
+
+async def wait_for_jobs(job_scheduler: JobScheduler, job_ids: list[UUID]) -> dict[str, int]:
+    while not all(job_scheduler.jobs[job_id].is_finished for job_id in job_ids):
+        await asyncio.sleep(0.05)
+
+    statuses = [job_scheduler.jobs[job_id].status for job_id in job_ids]
+
+    return {status: statuses.count(status) for status in set(statuses)}
+
+
+async def run_batches(client: httpx.AsyncClient, requests: list[dict[str, Any]]) -> tuple[list[UUID], int]:
+    """Send the batch requests concurrently, return the IDs of the started jobs and the number of refused items."""
+
+    responses = await asyncio.gather(*(client.request(**request) for request in requests))
+
+    job_ids = []
+    errors = 0
+    for response in responses:
+        response.raise_for_status()
+        for item in response.json():
+            if item['job'] is None:
+                errors += 1
+            else:
+                job_ids.append(UUID(item['job']['id']))
+
+    return job_ids, errors
+
+
+async def main(args: argparse.Namespace) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        settings = Settings(
+            cloud_provider='simulator',
+            cloud_zones=[f'simulated-{index}' for index in range(args.zones)],
+            cloud_simulator_api_latency=args.api_latency,
+            cloud_simulator_operation_latency=args.operation_latency,
+            cloud_simulator_error_rate=args.error_rate,
+            cloud_simulator_operation_failure_rate=args.operation_failure_rate,
+            batch_concurrency=args.batch_concurrency,
+            batch_rate_limit=args.batch_rate_limit,
+            # Simulated VMs do not run JupyterHub, probing them only measures connection errors
+            jhub_probe_interval=3600,
+            github_cache_path=Path(tmp_dir) / 'github-cache.sqlite3',
+            artifact_store_path=Path(tmp_dir) / 'artifacts',
+        )
+        app = create_app(settings)
+        path_hash = settings.path_hash
+
+        async with (
+            app.router.lifespan_context(app),
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://cactus', timeout=None) as client,
+        ):
+            job_scheduler = app.state.job_scheduler
+            counts = [min(BATCH_SIZE, args.instances - offset) for offset in range(0, args.instances, BATCH_SIZE)]
+
+            started_at = tm.perf_counter()
+            create_job_ids, create_errors = await run_batches(
+                client,
+                [
+                    {
+                        'method': 'POST',
+                        'url': f'{path_hash}/vms/batch',
+                        'json': {'python_envs': ['sklearn'], 'count': count},
+                    }
+                    for count in counts
+                ],
+            )
+            create_requests_duration = tm.perf_counter() - started_at
+            create_jobs = await wait_for_jobs(job_scheduler, create_job_ids)
+            create_duration = tm.perf_counter() - started_at
+
+            started_at = tm.perf_counter()
+            response = await client.get(f'{path_hash}/vms/')
+            list_duration = tm.perf_counter() - started_at
+            instance_ids = [instance['id'] for instance in response.json()]
+
+            started_at = tm.perf_counter()
+            delete_job_ids, delete_errors = await run_batches(
+                client,
+                [
+                    {
+                        'method': 'DELETE',
+                        'url': f'{path_hash}/vms/batch',
+                        'json': {'instance_ids': instance_ids[offset : offset + BATCH_SIZE]},
+                    }
+                    for offset in range(0, len(instance_ids), BATCH_SIZE)
+                ],
+            )
+            delete_jobs = await wait_for_jobs(job_scheduler, delete_job_ids)
+            delete_duration = tm.perf_counter() - started_at
+
+            cloud_calls = sum(provider.calls for provider in app.state.cloud_client.clients.values())
+
+    return {
+        'parameters': vars(args),
+        'create': {
+            'requests_duration_s': create_requests_duration,
+            'duration_s': create_duration,
+            'refused': create_errors,
+            'jobs': create_jobs,
+        },
+        'list': {'instances': len(instance_ids), 'duration_ms': list_duration * 1000},
+        'delete': {'duration_s': delete_duration, 'refused': delete_errors, 'jobs': delete_jobs},
+        'cloud_calls': cloud_calls,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--instances', type=int, default=2000)
+    parser.add_argument('--zones', type=int, default=3)
+    parser.add_argument('--api-latency', type=float, default=0.05)
+    parser.add_argument('--operation-latency', type=float, default=5)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--operation-failure-rate', type=float, default=0)
+    parser.add_argument('--batch-concurrency', type=int, default=100)
+    parser.add_argument('--batch-rate-limit', type=float, default=1000)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(main(args)), indent=2))  # noqa: T201
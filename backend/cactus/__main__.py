@@ -1,8 +1,12 @@
 import uvicorn
 from cactus.config import get_settings
+from cactus.metrics import setup_multiprocess_metrics
 
 if __name__ == '__main__':
     settings = get_settings()
+    if settings.workers > 1:
+        # Otherwise every scrape of `/metrics` would only return the metrics of the worker that answered it
+        setup_multiprocess_metrics(settings.metrics_path)
     uvicorn.run(
         'cactus.app:create_app',
         factory=True,
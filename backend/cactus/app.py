@@ -1,11 +1,35 @@
+from collections.abc import AsyncIterator
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager
+from contextlib import AsyncExitStack
+from contextlib import asynccontextmanager
+
+from cactus.components.artifacts import artifact_router
+from cactus.components.artifacts.store import create_artifact_store
+from cactus.components.cloud.batch import BatchExecutor
+from cactus.components.cloud.clients import create_cloud_client
+from cactus.components.cloud.coordination import create_coordination_store
+from cactus.components.cloud.events import EventBroker
+from cactus.components.cloud.jobs import JobScheduler
+from cactus.components.cloud.pool import WarmPool
+from cactus.components.cloud.readiness import ReadinessTracker
+from cactus.components.http_client import create_http_client
 from cactus.components.repo import repo_router
+from cactus.components.repo.validators import create_repo_validator
+from cactus.components.repo.validators import create_validation_cache
+from cactus.components.static import PrecompressedStaticFiles
 from cactus.components.vm import vm_router
+from cactus.components.vm.admission import AdmissionController
+from cactus.components.vm.schemas import InstanceCreateSchema
 from cactus.config import Settings
 from cactus.config import get_settings
+from cactus.metrics import TimingMiddleware
+from cactus.metrics import mark_worker_dead
+from cactus.metrics import router as metrics_router
 from fastapi import FastAPI
 from fastapi.middleware import Middleware
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import ORJSONResponse
 
 
 def create_app(settings: Settings | None = None) -> FastAPI:
@@ -15,12 +39,15 @@ def create_app(settings: Settings | None = None) -> FastAPI:
         settings = get_settings()
 
     middlewares = setup_middlewares()
+    lifespan = setup_lifespan(settings)
 
     app = FastAPI(
         openapi_url=f'{settings.path_hash}/openapi.json',
         docs_url=f'{settings.path_hash}/docs',
         redoc_url=None,
+        default_response_class=ORJSONResponse,
         middleware=middlewares,
+        lifespan=lifespan,
     )
 
     setup_routers(app, settings)
@@ -33,19 +60,102 @@ def setup_routers(app: FastAPI, settings: Settings) -> None:
 
     app.include_router(vm_router, prefix=settings.path_hash)
     app.include_router(repo_router, prefix=settings.path_hash)
+    app.include_router(artifact_router, prefix=settings.path_hash)
+    app.include_router(metrics_router, prefix=settings.path_hash)
 
-    app.mount(settings.path_hash, StaticFiles(directory=settings.frontend_folder_path, html=True))
+    app.mount(settings.path_hash, PrecompressedStaticFiles(directory=settings.frontend_folder_path))
 
 
 def setup_middlewares() -> list[Middleware]:
     """Configure the application middlewares."""
 
     return [
+        Middleware(TimingMiddleware),
         Middleware(
             CORSMiddleware,
             allow_origins=['*'],
             allow_credentials=True,
             allow_methods=['*'],
             allow_headers=['*'],
-        )
+        ),
     ]
+
+
+def setup_lifespan(settings: Settings) -> Callable[[FastAPI], AbstractAsyncContextManager[None]]:
+    """Configure the application lifespan."""
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        # Everything started is stopped in the reverse order, even if the start-up or the shutdown fails
+        async with AsyncExitStack() as stack:
+            stack.callback(mark_worker_dead)
+
+            http_client = create_http_client(settings)
+            stack.push_async_callback(http_client.aclose)
+            app.state.http_client = http_client
+
+            validation_cache = create_validation_cache(settings)
+            stack.callback(validation_cache.close)
+            repo_validator = create_repo_validator(settings, http_client, validation_cache)
+            app.state.repo_validator = repo_validator
+
+            artifact_store = create_artifact_store(settings)
+            app.state.artifact_store = artifact_store
+
+            cloud_client = create_cloud_client(settings, repo_validator, artifact_store, http_client)
+            app.state.cloud_client = cloud_client
+
+            job_scheduler = JobScheduler(
+                cloud_client,
+                timeout=settings.job_timeout,
+                retention=settings.job_retention,
+            )
+            app.state.job_scheduler = job_scheduler
+
+            batch_executor = BatchExecutor(concurrency=settings.batch_concurrency, rate=settings.batch_rate_limit)
+            app.state.batch_executor = batch_executor
+
+            admission_controller = AdmissionController(
+                concurrency=settings.admission_concurrency,
+                rate=settings.admission_rate_limit,
+                queue_size=settings.admission_queue_size,
+                client_queue_size=settings.admission_client_queue_size,
+                max_wait=settings.admission_max_wait,
+            )
+            app.state.admission_controller = admission_controller
+
+            event_broker = EventBroker(queue_size=settings.event_queue_size)
+            app.state.event_broker = event_broker
+
+            readiness_tracker = ReadinessTracker(cloud_client, event_broker, interval=settings.jhub_probe_interval)
+            app.state.readiness_tracker = readiness_tracker
+
+            coordination_store = create_coordination_store(settings)
+            stack.callback(coordination_store.close)
+            app.state.coordination_store = coordination_store
+
+            warm_pool = WarmPool(
+                cloud_client,
+                coordination_store,
+                targets=[
+                    (InstanceCreateSchema.from_pool_key(pool_key), count)
+                    for pool_key, count in settings.warm_pool_targets.items()
+                ],
+                refill_interval=settings.warm_pool_refill_interval,
+                refill_batch_size=settings.warm_pool_refill_batch_size,
+            )
+            app.state.warm_pool = warm_pool
+
+            for component in (
+                cloud_client.operation_poller,
+                cloud_client.artifact_builder,
+                job_scheduler,
+                readiness_tracker,
+                warm_pool,
+            ):
+                await component.start()
+                stack.push_async_callback(component.stop)
+
+            yield
+
+    return lifespan
@@ -0,0 +1,5 @@
+from cactus.components.artifacts.views import router as artifact_router
+
+__all__ = [
+    'artifact_router',
+]
@@ -0,0 +1,146 @@
+import asyncio
+import errno
+import hashlib
+import hmac
+import json
+import re
+import shutil
+from collections.abc import AsyncIterable
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+from cactus.config import Settings
+from fastapi import Request
+
+# Bumped whenever the way environments are packed changes, so older artifacts are never unpacked
+ARTIFACT_FORMAT_VERSION = 1
+
+ARTIFACT_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Files of the folder of every artifact, named after its key
+ARCHIVE_NAME = 'artifact.tar.gz'
+DIGEST_NAME = 'artifact.sha256'
+
+
+class ArtifactTooLargeError(Exception):
+    pass
+
+
+class ArtifactExistsError(Exception):
+    pass
+
+
+class ArtifactStore:
+    """Store packed kernel environments as tarballs addressed by the hash of everything that defines their content.
+
+    A VM downloads the artifact of every kernel it needs instead of solving and installing it. Environments that are
+    not stored yet are built on a dedicated VM, see `ArtifactBuilder`, which uploads the packed result authenticated by
+    a token derived from the artifact key. Artifacts are write-once, and the SHA-256 digest of every artifact is
+    stored in the same folder, so the VMs check what they download before unpacking it as root.
+    """
+
+    def __init__(self, path: Path, *, secret: str, max_size: int, base_url: str) -> None:
+        self.path = path
+        self.secret = secret.encode()
+        self.max_size = max_size
+        self.base_url = base_url
+
+        # Digests of the stored artifacts, which never change once written
+        self._digests: dict[str, str] = {}
+
+        path.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def accepts_uploads(self) -> bool:
+        return bool(self.secret)
+
+    def get_key(self, **spec: Any) -> str:
+        spec['format_version'] = ARTIFACT_FORMAT_VERSION
+        return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get_url(self, key: str) -> str:
+        return f'{self.base_url}/artifacts/{key}'
+
+    def get_upload_token(self, key: str) -> str:
+        return hmac.new(self.secret, msg=key.encode(), digestmod=hashlib.sha256).hexdigest()
+
+    def is_upload_token_valid(self, key: str, token: str) -> bool:
+        return self.accepts_uploads and hmac.compare_digest(self.get_upload_token(key), token)
+
+    def get_path(self, key: str) -> Path | None:
+        if not ARTIFACT_KEY_PATTERN.match(key):
+            return None
+
+        path = self.path / key / ARCHIVE_NAME
+        return path if path.is_file() else None
+
+    def get_digest(self, key: str) -> str | None:
+        """Return the SHA-256 digest of the stored artifact, `None` if there is none."""
+
+        digest = self._digests.get(key)
+        if digest is None and self.get_path(key) is not None:
+            digest = self._digests[key] = (self.path / key / DIGEST_NAME).read_text().strip()
+
+        return digest
+
+    async def save(self, key: str, content: AsyncIterable[bytes]) -> None:
+        """Write the artifact and its digest to a temporary folder first, so partial uploads are never served.
+
+        The folder is then renamed to its final path, which fails if it exists, so the artifact and its digest are
+        published together, and concurrent uploads of the same key cannot replace each other, only the first one is
+        kept. The files are written from a thread, not to block the event loop on large uploads.
+        """
+
+        if not ARTIFACT_KEY_PATTERN.match(key):
+            raise ValueError(f'Invalid artifact key: {key}')
+        if self.get_path(key) is not None:
+            raise ArtifactExistsError(f'Artifact {key} already exists')
+
+        temporary_path = self.path / f'.{key}.{uuid4().hex}.part'
+        await asyncio.to_thread(temporary_path.mkdir)
+
+        try:
+            file = await asyncio.to_thread((temporary_path / ARCHIVE_NAME).open, 'wb')
+            digest = hashlib.sha256()
+            size = 0
+
+            def write(chunk: bytes) -> None:
+                digest.update(chunk)
+                file.write(chunk)
+
+            try:
+                async for chunk in content:
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise ArtifactTooLargeError(f'Artifact exceeds {self.max_size} bytes')
+                    await asyncio.to_thread(write, chunk)
+            finally:
+                await asyncio.to_thread(file.close)
+
+            await asyncio.to_thread(self._publish, key, temporary_path, digest.hexdigest())
+        finally:
+            await asyncio.to_thread(shutil.rmtree, temporary_path, ignore_errors=True)
+
+    def _publish(self, key: str, temporary_path: Path, digest: str) -> None:
+        (temporary_path / DIGEST_NAME).write_text(digest)
+
+        try:
+            temporary_path.rename(self.path / key)
+        except OSError as error:
+            if error.errno in (errno.EEXIST, errno.ENOTEMPTY):
+                raise ArtifactExistsError(f'Artifact {key} already exists')
+            raise
+
+
+def create_artifact_store(settings: Settings) -> ArtifactStore:
+    return ArtifactStore(
+        settings.artifact_store_path,
+        secret=settings.artifact_secret,
+        max_size=settings.artifact_max_size,
+        base_url=settings.cloud_host_url,
+    )
+
+
+def get_artifact_store(request: Request) -> ArtifactStore:
+    return request.app.state.artifact_store
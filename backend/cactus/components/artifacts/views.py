@@ -0,0 +1,52 @@
+from cactus.components.artifacts.store import ArtifactExistsError
+from cactus.components.artifacts.store import ArtifactStore
+from cactus.components.artifacts.store import ArtifactTooLargeError
+from cactus.components.artifacts.store import get_artifact_store
+from fastapi import APIRouter
+from fastapi import Depends
+from fastapi import Header
+from fastapi import HTTPException
+from fastapi import Request
+from fastapi.responses import FileResponse
+from fastapi.responses import Response
+
+router = APIRouter(prefix='/artifacts', tags=['Artifacts'])
+
+
+@router.get('/{key}', summary='Download an environment artifact.')
+def download_artifact(
+    key: str,
+    artifact_store: ArtifactStore = Depends(get_artifact_store),
+):
+    """Download the packed environment stored under the key."""
+
+    path = artifact_store.get_path(key)
+
+    if path is None:
+        raise HTTPException(status_code=404)
+
+    return FileResponse(path, media_type='application/gzip')
+
+
+@router.put('/{key}', summary='Upload an environment artifact.', status_code=204)
+async def upload_artifact(
+    key: str,
+    request: Request,
+    x_artifact_token: str = Header(),
+    artifact_store: ArtifactStore = Depends(get_artifact_store),
+):
+    """Store the packed environment built by a builder VM under the key, once."""
+
+    if not artifact_store.is_upload_token_valid(key, x_artifact_token):
+        raise HTTPException(status_code=403)
+
+    try:
+        await artifact_store.save(key, request.stream())
+    except ValueError:
+        raise HTTPException(status_code=400)
+    except ArtifactExistsError:
+        raise HTTPException(status_code=409)
+    except ArtifactTooLargeError:
+        raise HTTPException(status_code=413)
+
+    return Response(status_code=204)
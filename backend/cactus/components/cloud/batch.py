@@ -0,0 +1,59 @@
+import asyncio
+import time as tm
+from collections.abc import Awaitable
+from collections.abc import Callable
+from typing import Any
+
+from fastapi import Request
+
+
+class RateLimiter:
+    """Space the calls at least `1 / rate` seconds apart."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1 / rate
+        self._next_at = 0.0
+
+    async def acquire(self) -> None:
+        now = tm.monotonic()
+        delay = self._next_at - now
+        self._next_at = max(now, self._next_at) + self.interval
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, delay: float) -> None:
+        """Hold the next calls back for at least `delay` seconds, e.g. after the remote rate limit was hit."""
+
+        self._next_at = max(self._next_at, tm.monotonic() + delay)
+
+    @property
+    def delay(self) -> float:
+        """Seconds until the next call may start."""
+
+        return max(self._next_at - tm.monotonic(), 0)
+
+
+class BatchExecutor:
+    """Run the cloud calls of bulk requests concurrently within a process-wide concurrency and rate limit.
+
+    The limits are shared by all the bulk requests, so simultaneous workshops cannot trip the cloud API rate limit.
+    """
+
+    def __init__(self, *, concurrency: int, rate: float) -> None:
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._rate_limiter = RateLimiter(rate)
+
+    async def _run_one(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        async with self._semaphore:
+            await self._rate_limiter.acquire()
+            return await call()
+
+    async def run(self, calls: list[Callable[[], Awaitable[Any]]]) -> list[Any]:
+        """Return the result of every call in order, or the exception it raised."""
+
+        return await asyncio.gather(*(self._run_one(call) for call in calls), return_exceptions=True)
+
+
+def get_batch_executor(request: Request) -> BatchExecutor:
+    return request.app.state.batch_executor
@@ -0,0 +1,146 @@
+import asyncio
+import time as tm
+from collections.abc import Awaitable
+from collections.abc import Callable
+from typing import Any
+from uuid import UUID
+
+from cactus.components.artifacts.store import ArtifactStore
+from cactus.components.cloud.models import Instance
+from cactus.components.cloud.models import InstanceType
+from cactus.components.cloud.user_data import UserDataBuilder
+from cactus.logger import logger
+
+# Label of the artifact builder VMs, holding the Unix time after which they are deleted whatever their progress
+ARTIFACT_BUILD_LABEL = 'artifact_build'
+
+
+class ArtifactBuilder:
+    """Build the environment artifacts missing from the store on dedicated VMs.
+
+    A user VM installs the environments whose artifact is missing itself, and a builder VM started alongside builds and
+    uploads them, so the upload tokens never reach a VM users log in to. A builder powers off once done, and is deleted
+    as soon as all its artifacts are stored or after `timeout` seconds. The deadline is kept in a label, so any worker
+    deletes the builders left over by the others. A worker does not build an environment it is already building, other
+    workers may, only the first upload is kept.
+    """
+
+    def __init__(
+        self,
+        artifact_store: ArtifactStore,
+        user_data_builder: UserDataBuilder,
+        *,
+        create_instance: Callable[[str, InstanceType, str, dict[str, str]], Awaitable[UUID]],
+        list_instances: Callable[[], Awaitable[list[Instance]]],
+        delete_instance: Callable[[UUID], Awaitable[Any]],
+        interval: float,
+        timeout: float,
+    ) -> None:
+        self.artifact_store = artifact_store
+        self.user_data_builder = user_data_builder
+        self.create_instance = create_instance
+        self.list_instances = list_instances
+        self.delete_instance = delete_instance
+        self.interval = interval
+        self.timeout = timeout
+
+        # Artifact keys per builder VM started by this worker, and deadline per artifact key it is building
+        self.builds: dict[UUID, list[str]] = {}
+        self.building: dict[str, float] = {}
+        self._deleting: set[UUID] = set()
+        self._build_tasks: set[asyncio.Task] = set()
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self.artifact_store.accepts_uploads:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = [*self._build_tasks, *([self._task] if self._task is not None else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def request(self, zone: str, size: InstanceType, setups: list[tuple[str | None, tuple[str, ...]]]) -> None:
+        """Start a builder VM in the zone for the artifacts of the setups that are neither stored nor being built."""
+
+        if not self.artifact_store.accepts_uploads:
+            return
+
+        now = tm.time()
+        missing = {
+            key: arguments
+            for key, arguments in setups
+            if key is not None and self.building.get(key, 0) <= now and self.artifact_store.get_path(key) is None
+        }
+        if not missing:
+            return
+
+        deadline = now + self.timeout
+        self.building.update((key, deadline) for key in missing)
+
+        task = asyncio.create_task(self._build(zone, size, list(missing.items()), deadline))
+        self._build_tasks.add(task)
+        task.add_done_callback(self._build_tasks.discard)
+
+    async def _build(
+        self, zone: str, size: InstanceType, setups: list[tuple[str, tuple[str, ...]]], deadline: float
+    ) -> None:
+        keys = [key for key, _ in setups]
+        try:
+            instance_id = await self.create_instance(
+                zone,
+                size,
+                self.user_data_builder.build_artifact_builder(size, setups),
+                {ARTIFACT_BUILD_LABEL: str(int(deadline))},
+            )
+        except Exception:
+            logger.exception(f'Start of an artifact builder in zone "{zone}" failed')
+            for key in keys:
+                self.building.pop(key, None)
+            return
+
+        self.builds[instance_id] = keys
+        logger.info(f'Building {len(keys)} environment artifacts on VM {instance_id}')
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.clean_up()
+            except Exception:
+                logger.exception('Cleanup of the artifact builders failed')
+
+            await asyncio.sleep(self.interval)
+
+    async def clean_up(self) -> None:
+        """Delete the builder VMs whose artifacts are all stored or whose deadline passed."""
+
+        now = tm.time()
+        self.building = {
+            key: deadline
+            for key, deadline in self.building.items()
+            if deadline > now and self.artifact_store.get_path(key) is None
+        }
+
+        instances = await self.list_instances()
+        listed = {instance.id for instance in instances}
+        self.builds = {instance_id: keys for instance_id, keys in self.builds.items() if instance_id in listed}
+        self._deleting &= listed
+
+        for instance in instances:
+            if instance.id in self._deleting:
+                continue
+
+            keys = self.builds.get(instance.id)
+            is_done = keys is not None and all(self.artifact_store.get_path(key) is not None for key in keys)
+            if not is_done and float(instance.labels[ARTIFACT_BUILD_LABEL]) > now:
+                continue
+
+            try:
+                await self.delete_instance(instance.id)
+            except Exception as error:
+                logger.warning(f'Deletion of the artifact builder {instance.id} failed: {error}')
+                continue
+
+            self._deleting.add(instance.id)
@@ -1,85 +1,258 @@
-import base64
+import asyncio
 import time as tm
+from collections.abc import Awaitable
+from collections.abc import Callable
+from functools import cache
 from pathlib import Path
-from textwrap import dedent
-from textwrap import indent
+from typing import TYPE_CHECKING
+from typing import Any
 from uuid import UUID
 from uuid import uuid4
 
-import requests
+import httpx
+from cactus.components.artifacts.store import ArtifactStore
+from cactus.components.cloud.builds import ARTIFACT_BUILD_LABEL
+from cactus.components.cloud.builds import ArtifactBuilder
+from cactus.components.cloud.exoscale import AsyncExoscaleClient
+from cactus.components.cloud.exoscale import ExoscaleAPINotFoundException
+from cactus.components.cloud.exoscale import ExoscaleAPINoZoneAvailableException
+from cactus.components.cloud.exoscale import ExoscaleAPIRateLimitException
+from cactus.components.cloud.inventory import InstanceInventory
+from cactus.components.cloud.models import INSTANCE_LIST_ADAPTER
 from cactus.components.cloud.models import Instance
+from cactus.components.cloud.models import InstanceType
+from cactus.components.cloud.models import Operation
+from cactus.components.cloud.models import OperationState
+from cactus.components.cloud.operations import OperationPoller
+from cactus.components.cloud.providers import CloudProvider
+from cactus.components.cloud.simulator import SimulatedCloudProvider
+from cactus.components.cloud.user_data import UserDataBuilder
+from cactus.components.cloud.zones import ZoneSelector
 from cactus.components.repo.validators import RepoValidator
-from cactus.components.repo.validators import get_repo_validator
-from cactus.components.vm.schemas import InstanceCreateSchema
 from cactus.config import Settings
-from cactus.config import get_settings
-from exoscale.api.v2 import Client as ExoscaleClient
-from fastapi import Depends
+from cactus.logger import logger
+from cactus.metrics import CLOUD_ZONE_LISTING_FAILURES
+from cactus.metrics import JHUB_PROBES
+from cactus.metrics import VM_TIME_TO_READY
+from exoscale.api.exceptions import ExoscaleAPIClientException
+from exoscale.api.exceptions import ExoscaleAPIServerException
+from fastapi import Request
+from pydantic import HttpUrl
+
+if TYPE_CHECKING:
+    from cactus.components.vm.schemas import InstanceCreateSchema
+
+SETUP_ENVIRONMENT_SCRIPT_PATH = Path(__file__).parent / 'create_tljh_kernel.sh'
 
 
 class CloudClient:
+    """Manage the VMs spread over one or more cloud zones.
+
+    Listings fan out to all the zones concurrently and are merged, leaving out the zones that fail unless all of them
+    do. Creations go to the zone ranked first by the zone selector and fall back to the next zones if it refuses them.
+    The zone of every known instance and operation is remembered, so later calls go straight to it, unknown ones are
+    looked up in all the zones concurrently.
+    """
+
     def __init__(
         self,
         *,
-        api_key: str,
-        api_secret: str,
-        zone: str,
-        template_id: UUID,
+        providers: list[CloudProvider],
+        template_ids: dict[str, UUID],
+        zone_failure_cooldown: float,
         security_group_id: UUID,
         host_url: str,
         jhub_port: int,
+        jhub_probe_timeout: float,
         github_oauth_client_id: str,
         github_oauth_client_secret: str,
-        setup_environment_script_path: Path,
+        setup_environment_script: str,
         repo_validator: RepoValidator,
+        artifact_store: ArtifactStore,
+        artifact_build_interval: float,
+        artifact_build_timeout: float,
+        http_client: httpx.AsyncClient,
+        inventory_ttl: float,
+        operation_poll_initial_interval: float,
+        operation_poll_max_interval: float,
+        operation_poll_backoff_factor: float,
+        operation_poll_jitter: float,
     ) -> None:
-        self.client = ExoscaleClient(api_key, api_secret, zone=zone)
-        self.template_id = template_id
+        self.clients = {provider.zone: provider for provider in providers}
+        self.zone_selector = ZoneSelector(list(self.clients), failure_cooldown=zone_failure_cooldown)
+        self.instance_zones: dict[UUID, str] = {}
+        self.operation_zones: dict[UUID, str] = {}
+        self.http_client = http_client
+        self.inventory = InstanceInventory(
+            ttl=inventory_ttl,
+            fetch_instances=self._fetch_instances,
+            fetch_instance=self._fetch_instance,
+        )
+        self.operation_poller = OperationPoller(
+            self.get_operation,
+            initial_interval=operation_poll_initial_interval,
+            max_interval=operation_poll_max_interval,
+            backoff_factor=operation_poll_backoff_factor,
+            jitter=operation_poll_jitter,
+        )
+        self.template_ids = template_ids
         self.security_group_id = security_group_id
-        self.host_url = host_url
 
         self.jhub_port = jhub_port
+        self.jhub_probe_timeout = jhub_probe_timeout
+
+        self.user_data_builder = UserDataBuilder(
+            setup_environment_script=setup_environment_script,
+            host_url=host_url,
+            github_oauth_client_id=github_oauth_client_id,
+            github_oauth_client_secret=github_oauth_client_secret,
+            artifact_store=artifact_store,
+        )
+        self.artifact_builder = ArtifactBuilder(
+            artifact_store,
+            self.user_data_builder,
+            create_instance=self._create_artifact_builder,
+            list_instances=lambda: self._list_labelled_instances(ARTIFACT_BUILD_LABEL),
+            delete_instance=self.start_instance_deletion,
+            interval=artifact_build_interval,
+            timeout=artifact_build_timeout,
+        )
+        self.repo_validator = repo_validator
 
-        self.github_oauth_client_id = github_oauth_client_id
-        self.github_oauth_client_secret = github_oauth_client_secret
+        # Start of the creation or claim of the instances that have not been seen ready yet, per instance ID
+        self.readiness_started_at: dict[UUID, tuple[str, float]] = {}
 
-        self.setup_environment_script = setup_environment_script_path.read_text()
-        self.repo_validator = repo_validator
+    async def wait_for_operation_state(
+        self, operation_id: UUID, status: str = OperationState.SUCCESS, timeout: int = 300
+    ) -> Operation:
+        operation = await self.operation_poller.wait(operation_id, timeout)
 
-    def wait_for_operation_state(self, operation_id: UUID, status: str = 'success', timeout: int = 300) -> None:
-        end_time = tm.perf_counter() + timeout
+        if operation.state != status:
+            raise RuntimeError(f'Operation "{operation_id}" ended in the "{operation.state}" state')
 
-        while tm.perf_counter() < end_time:
-            operation = self.client.get_operation(id=operation_id)
-            if operation['state'] == status:
-                return
-            tm.sleep(10)
+        return operation
 
-        raise TimeoutError
+    async def get_operation(self, operation_id: UUID) -> Operation:
+        zone, response = await self._call_in_zone(
+            self.operation_zones.get(operation_id), lambda client: client.get_operation(operation_id)
+        )
+        operation = Operation.model_validate(response)
 
-    def list_instances(self):
-        response = self.client.list_instances()
+        if operation.state != OperationState.PENDING:
+            self.operation_zones.pop(operation_id, None)
+            self.zone_selector.finish_creation(operation_id, operation.state == OperationState.SUCCESS)
 
-        instances = []
-        for instance in response['instances']:
-            instance = Instance.model_validate(instance)
-            if 'redirect_id' in instance.labels:
-                instances.append(instance)
+        return operation
+
+    async def _call_in_zone(
+        self, zone: str | None, call: Callable[[CloudProvider], Awaitable[dict[str, Any]]]
+    ) -> tuple[str, dict[str, Any]]:
+        """Run the call in the zone if it is known, otherwise in all the zones and keep the one knowing the resource."""
+
+        if zone is not None:
+            return zone, await call(self.clients[zone])
+
+        responses = await asyncio.gather(*(call(client) for client in self.clients.values()), return_exceptions=True)
+        for zone, response in zip(self.clients, responses, strict=True):
+            if not isinstance(response, Exception):
+                return zone, response
+
+        # A zone failing for another reason than not knowing the resource may have been the right one
+        errors = [error for error in responses if not isinstance(error, ExoscaleAPINotFoundException)]
+        raise (errors or responses)[0]
+
+    async def _list_labelled_instances(self, label: str) -> list[Instance]:
+        instances, _ = await self._list_labelled_instances_by_zone(label)
 
         return instances
 
-    def get_instance(self, instance_id: UUID) -> Instance:
-        response = self.client.get_instance(id=instance_id)
-        instance = Instance.model_validate(response)
+    async def _list_labelled_instances_by_zone(self, label: str) -> tuple[list[Instance], set[str]]:
+        """List the labelled instances of the zones that answered, along with the zones that did not."""
+
+        responses = await asyncio.gather(
+            *(client.list_instances() for client in self.clients.values()), return_exceptions=True
+        )
+        if all(isinstance(response, Exception) for response in responses):
+            raise responses[0]
+
+        instances = []
+        unavailable_zones = set()
+        for zone, response in zip(self.clients, responses, strict=True):
+            if isinstance(response, Exception):
+                logger.warning(f'Listing of the instances of zone "{zone}" failed, leaving it out: {response}')
+                CLOUD_ZONE_LISTING_FAILURES.labels(zone=zone).inc()
+                unavailable_zones.add(zone)
+                continue
+
+            zone_instances = self._parse_labelled_instances(response, label, zone)
+            self.instance_zones.update((instance.id, zone) for instance in zone_instances)
+            instances += zone_instances
+
+        return instances, unavailable_zones
+
+    async def _fetch_instances(self) -> tuple[list[Instance], set[str]]:
+        return await self._list_labelled_instances_by_zone('redirect_id')
+
+    @property
+    def unavailable_zones(self) -> set[str]:
+        """Zones left out of the last listing of the inventory because they failed to answer."""
+
+        return self.inventory.unavailable_zones
+
+    @staticmethod
+    def _parse_labelled_instances(response: dict[str, Any], label: str, zone: str) -> list[Instance]:
+        """Build the models of the instances carrying the label only, the rest of the organization stays raw data."""
+
+        return INSTANCE_LIST_ADAPTER.validate_python(
+            [
+                {**instance, 'zone': zone}
+                for instance in response['instances']
+                if label in (instance.get('labels') or {})
+            ]
+        )
+
+    async def _fetch_instance(self, instance_id: UUID) -> Instance:
+        zone, response = await self._call_in_zone(
+            self.instance_zones.get(instance_id), lambda client: client.get_instance(instance_id)
+        )
+        instance = Instance.model_validate({**response, 'zone': zone})
+        self.instance_zones[instance.id] = zone
 
         return instance
 
-    def get_instance_status(self, instance_id: UUID) -> str:
-        instance = self.get_instance(instance_id)
+    async def list_instances(self, labels: dict[str, str] | None = None) -> list[Instance]:
+        """List the labelled instances, only those carrying all the passed `labels` if any."""
+
+        instances = await self.inventory.list_instances()
+        if not labels:
+            return instances
+
+        return [instance for instance in instances if labels.items() <= instance.labels.items()]
+
+    async def get_instance(self, instance_id: UUID) -> Instance:
+        return await self.inventory.get_instance(instance_id)
+
+    async def get_instance_status(self, instance_id: UUID) -> str:
+        instance = await self.get_instance(instance_id)
 
+        return await self.probe_instance(instance)
+
+    async def probe_instance(self, instance: Instance) -> str:
+        status = await self._probe_jhub(instance)
+        JHUB_PROBES.labels(status=status).inc()
+
+        if status == 'ready' and instance.id in self.readiness_started_at:
+            source, started_at = self.readiness_started_at.pop(instance.id)
+            VM_TIME_TO_READY.labels(source=source).observe(tm.monotonic() - started_at)
+
+        return status
+
+    async def _probe_jhub(self, instance: Instance) -> str:
         try:
-            response = requests.get(f'http://{instance.public_ip}:{self.jhub_port}/hub/login', timeout=5)
-        except requests.exceptions.RequestException:
+            response = await self.http_client.get(
+                f'http://{instance.public_ip}:{self.jhub_port}/hub/login', timeout=self.jhub_probe_timeout
+            )
+        except httpx.HTTPError:
             return 'error'
 
         if response.status_code == 200:
@@ -90,101 +263,198 @@ class CloudClient:
 
         return 'unknown'
 
-    def find_instance(self, redirect_id: UUID) -> Instance | None:
-        instances = self.list_instances()
+    async def find_instance(self, redirect_id: UUID) -> Instance | None:
+        return await self.inventory.find_instance(redirect_id)
 
-        for instance in instances:
-            if instance.labels.get('redirect_id') == str(redirect_id):
-                return instance
+    async def list_pool_instances(self) -> tuple[list[Instance], set[str]]:
+        """List the unassigned warm pool instances, which are never part of the inventory, and the zones left out."""
 
-    def create_instance(self, payload: InstanceCreateSchema) -> Instance:
-        redirect_id = uuid4()
+        return await self._list_labelled_instances_by_zone('pool')
+
+    async def claim_pool_instance(self, instance: Instance) -> Operation | None:
+        """Assign a warm pool instance by exposing the redirect ID its OAuth callback was configured with at boot.
+
+        Return `None` if the instance has been claimed by another worker in the meantime.
+        """
 
-        setup_environment_commands = ''
-        for env in payload.python_envs or []:
-            packages = "', '".join(env['PIP_PACKAGES'])
-
-            setup_environment_commands += f"""
-                /usr/local/bin/setup_environment.sh \
-                '{env["PYTHON_VERSION"]}' '{env["UNIQUE_ENV_NAME"]}' '{env["KERNEL_DISPLAY_NAME"]}' \
-                '{packages}'"""
-
-        for repo_url in payload.repo_urls or []:
-            repo = self.repo_validator.get_validation_results(str(repo_url))
-            kernel_display_name = f'Python (with {repo["UNIQUE_ENV_NAME"]})'
-            setup_environment_commands += f"""
-                /usr/local/bin/setup_environment.sh \
-                '{repo["PYTHON_VERSION"].lstrip('>=')}' '{repo["UNIQUE_ENV_NAME"]}' '{kernel_display_name}' \
-                --url '{repo_url}'"""
-
-        setup_environment_script = '\n' + indent(self.setup_environment_script, ' ' * 18)
-
-        user_data = dedent(
-            f"""
-            #cloud-config
-            write_files:
-              - path: /usr/local/bin/setup_environment.sh
-                permissions: '0755'
-                owner: root:root
-                content: | {setup_environment_script}
-            runcmd:
-              - >
-                sed -i
-                -e "s|GITHUB_OAUTH_CLIENT_ID|{self.github_oauth_client_id}|g"
-                -e "s|GITHUB_OAUTH_CLIENT_SECRET|{self.github_oauth_client_secret}|g"
-                -e "s|GITHUB_OAUTH_CALLBACK_URL|{self.host_url}/vms/oauth/{redirect_id}|g"
-                /opt/tljh/config/config.yaml
-              - "tljh-config reload"
-              - "systemctl stop jupyterhub"
-              - | {setup_environment_commands}
-              - "systemctl start jupyterhub"
-            """
+        instance = await self._fetch_instance(instance.id)
+        if 'pool' not in instance.labels:
+            return None
+
+        response = await self.clients[instance.zone].update_instance(
+            instance.id, labels={'redirect_id': instance.labels['pool_redirect_id']}
         )
+        operation = Operation.model_validate(response)
+        self.operation_zones[operation.id] = instance.zone
+        self.inventory.invalidate()
+        self.readiness_started_at[instance.id] = ('pool', tm.monotonic())
+
+        return operation
+
+    async def validate_repos(self, repo_urls: list[HttpUrl]) -> list[dict[str, Any]]:
+        """Validate all the repos concurrently, raise ValueError if any of them is invalid."""
+
+        repos = await asyncio.gather(
+            *(self.repo_validator.get_validation_results(str(repo_url)) for repo_url in repo_urls)
+        )
+
+        invalid_repo_urls = [str(repo_url) for repo_url, repo in zip(repo_urls, repos, strict=True) if repo is None]
+        if invalid_repo_urls:
+            raise ValueError(f'Invalid repos: {", ".join(invalid_repo_urls)}')
+
+        return repos
 
-        response = self.client.create_instance(
+    async def create_instance(
+        self,
+        payload: 'InstanceCreateSchema',
+        pool_key: str | None = None,
+        repos: list[dict[str, Any]] | None = None,
+    ) -> Operation:
+        """Start the VM creation, `repos` are the validation results of the payload repos if they are already known."""
+
+        redirect_id = uuid4()
+        labels = {'redirect_id': str(redirect_id)}
+        if pool_key is not None:
+            labels = {'pool': pool_key, 'pool_redirect_id': str(redirect_id)}
+
+        repo_urls = payload.repo_urls or []
+        if repos is None:
+            repos = await self.validate_repos(repo_urls)
+
+        zone_error = None
+        for zone in self.zone_selector.rank():
+            try:
+                response = await self.clients[zone].create_instance(
+                    public_ip_assignment='inet4',
+                    labels=labels,
+                    security_groups=[{'id': str(self.security_group_id)}],
+                    instance_type={'id': str(payload.size.to_id())},
+                    template={'id': str(self.template_ids[zone])},
+                    ssh_key={'name': 'antonio_key', 'fingerprint': '02:51:97:3e:d9:e3:a8:e2:fb:c7:b6:57:14:f9:c5:34'},
+                    disk_size=50,
+                    user_data=self.user_data_builder.build(payload, repos, redirect_id, self.template_ids[zone]),
+                )
+            except ExoscaleAPIRateLimitException:
+                # The rate limit is shared by all the zones
+                raise
+            except (ExoscaleAPIClientException, ExoscaleAPIServerException, httpx.TransportError) as error:
+                logger.warning(f'Zone "{zone}" refused the VM creation, trying the next one: {error}')
+                self.zone_selector.record_failure(zone)
+                zone_error = error
+                continue
+
+            operation = Operation.model_validate(response)
+            self.operation_zones[operation.id] = zone
+            self.instance_zones[operation.reference_id] = zone
+            self.zone_selector.start_creation(zone, operation.id)
+            self.inventory.invalidate()
+            if pool_key is None:
+                self.readiness_started_at[operation.reference_id] = ('create', tm.monotonic())
+            self.artifact_builder.request(
+                zone, payload.size, self.user_data_builder.get_setups(payload, repos, self.template_ids[zone])
+            )
+
+            return operation
+
+        if zone_error is None:
+            raise ExoscaleAPINoZoneAvailableException('No zone is available for the VM creation')
+        raise zone_error
+
+    async def _create_artifact_builder(
+        self, zone: str, size: InstanceType, user_data: str, labels: dict[str, str]
+    ) -> UUID:
+        """Start a VM building environment artifacts, on the template of the zone they are built for."""
+
+        response = await self.clients[zone].create_instance(
             public_ip_assignment='inet4',
-            labels={'redirect_id': str(redirect_id)},
+            labels=labels,
             security_groups=[{'id': str(self.security_group_id)}],
-            instance_type={'id': str(payload.size.to_id())},
-            template={'id': str(self.template_id)},
+            instance_type={'id': str(size.to_id())},
+            template={'id': str(self.template_ids[zone])},
             ssh_key={'name': 'antonio_key', 'fingerprint': '02:51:97:3e:d9:e3:a8:e2:fb:c7:b6:57:14:f9:c5:34'},
             disk_size=50,
-            user_data=base64.b64encode(user_data.encode()).decode(),
+            user_data=user_data,
         )
+        operation = Operation.model_validate(response)
+        self.instance_zones[operation.reference_id] = zone
 
-        operation_id = UUID(response['id'])
-        self.wait_for_operation_state(operation_id)
+        return operation.reference_id
 
-        instance_id = UUID(response['reference']['id'])
-        instance = self.get_instance(instance_id)
+    async def start_instance_deletion(self, instance_id: UUID) -> Operation:
+        zone, response = await self._call_in_zone(
+            self.instance_zones.get(instance_id), lambda client: client.delete_instance(instance_id)
+        )
+        operation = Operation.model_validate(response)
+        self.operation_zones[operation.id] = zone
+        self.instance_zones.pop(instance_id, None)
+        self.inventory.invalidate()
+        self.readiness_started_at.pop(instance_id, None)
 
-        return instance
+        return operation
 
-    def delete_instance(self, instance_id: UUID) -> Instance:
-        instance = self.get_instance(instance_id)
+    async def delete_instance(self, instance_id: UUID) -> Instance:
+        instance = await self.get_instance(instance_id)
 
-        response = self.client.delete_instance(id=instance_id)
-        operation_id = UUID(response['id'])
-        self.wait_for_operation_state(operation_id)
+        operation = await self.start_instance_deletion(instance_id)
+        await self.wait_for_operation_state(operation.id)
+        self.inventory.invalidate()
 
         return instance
 
 
-def get_cloud_client(
-    settings: Settings = Depends(get_settings), repo_validator: RepoValidator = Depends(get_repo_validator)
+def create_cloud_provider(settings: Settings, zone: str, http_client: httpx.AsyncClient) -> CloudProvider:
+    if settings.cloud_provider == 'simulator':
+        return SimulatedCloudProvider(
+            zone=zone,
+            api_latency=settings.cloud_simulator_api_latency,
+            operation_latency=settings.cloud_simulator_operation_latency,
+            error_rate=settings.cloud_simulator_error_rate,
+            operation_failure_rate=settings.cloud_simulator_operation_failure_rate,
+            public_ip=settings.cloud_simulator_public_ip,
+        )
+
+    return AsyncExoscaleClient(
+        settings.cloud_api_key,
+        settings.cloud_api_secret,
+        zone=zone,
+        url=settings.cloud_api_urls.get(zone, settings.cloud_api_url),
+        http_client=http_client,
+    )
+
+
+@cache
+def read_setup_environment_script() -> str:
+    return SETUP_ENVIRONMENT_SCRIPT_PATH.read_text()
+
+
+def create_cloud_client(
+    settings: Settings, repo_validator: RepoValidator, artifact_store: ArtifactStore, http_client: httpx.AsyncClient
 ) -> CloudClient:
-    setup_environment_script_path = Path(__file__).parent / 'create_tljh_kernel.sh'
+    zones = settings.cloud_zones or [settings.cloud_zone]
 
     return CloudClient(
-        api_key=settings.cloud_api_key,
-        api_secret=settings.cloud_api_secret,
-        zone=settings.cloud_zone,
-        template_id=settings.cloud_template_id,
+        providers=[create_cloud_provider(settings, zone, http_client) for zone in zones],
+        template_ids={zone: settings.cloud_template_ids.get(zone, settings.cloud_template_id) for zone in zones},
+        zone_failure_cooldown=settings.cloud_zone_failure_cooldown,
         security_group_id=settings.cloud_security_group_id,
         host_url=settings.cloud_host_url,
         jhub_port=settings.jhub_port,
+        jhub_probe_timeout=settings.jhub_probe_timeout,
         github_oauth_client_id=settings.github_oauth_client_id,
         github_oauth_client_secret=settings.github_oauth_client_secret,
-        setup_environment_script_path=setup_environment_script_path,
+        setup_environment_script=read_setup_environment_script(),
         repo_validator=repo_validator,
+        artifact_store=artifact_store,
+        artifact_build_interval=settings.artifact_build_interval,
+        artifact_build_timeout=settings.artifact_build_timeout,
+        http_client=http_client,
+        inventory_ttl=settings.cloud_inventory_ttl,
+        operation_poll_initial_interval=settings.operation_poll_initial_interval,
+        operation_poll_max_interval=settings.operation_poll_max_interval,
+        operation_poll_backoff_factor=settings.operation_poll_backoff_factor,
+        operation_poll_jitter=settings.operation_poll_jitter,
     )
+
+
+def get_cloud_client(request: Request) -> CloudClient:
+    return request.app.state.cloud_client
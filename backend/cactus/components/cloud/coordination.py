@@ -0,0 +1,82 @@
+import sqlite3
+import time as tm
+from pathlib import Path
+
+from cactus.components.repo.cache import BUSY_TIMEOUT
+from cactus.components.repo.cache import skip_when_locked
+from cactus.config import Settings
+
+# Seconds a claim is remembered, long after the claimed instance was relabelled
+CLAIM_RETENTION = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS claims (
+    key TEXT PRIMARY KEY,
+    claimed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS claims_claimed_at ON claims (claimed_at);
+
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class CoordinationStore:
+    """Coordinate the workers of the process through a SQLite database in WAL mode.
+
+    A resource is claimed by inserting its key, which only one worker can do, e.g. a warm pool VM before it is
+    relabelled. A background loop that must run in a single worker holds a lease, renewed by its holder on every cycle
+    and taken over by another worker once it expired. Like the validation cache, calls do not wait for the lock held by
+    another worker beyond `BUSY_TIMEOUT`, they fail to claim instead.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT}')
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @skip_when_locked(False)
+    def claim(self, key: str) -> bool:
+        """Claim the resource unless another worker did it first, return whether this call won."""
+
+        now = tm.time()
+        cursor = self.connection.execute('INSERT OR IGNORE INTO claims (key, claimed_at) VALUES (?, ?)', (key, now))
+        if cursor.rowcount != 1:
+            return False
+
+        self.connection.execute('DELETE FROM claims WHERE claimed_at < ?', (now - CLAIM_RETENTION,))
+
+        return True
+
+    @skip_when_locked()
+    def release(self, key: str) -> None:
+        self.connection.execute('DELETE FROM claims WHERE key = ?', (key,))
+
+    @skip_when_locked(False)
+    def acquire_lease(self, name: str, holder: str, duration: float) -> bool:
+        """Take or renew the lease for `duration` seconds unless another holder has it, return whether this call won."""
+
+        now = tm.time()
+        cursor = self.connection.execute(
+            'INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at '
+            'WHERE leases.holder = excluded.holder OR leases.expires_at < ?',
+            (name, holder, now + duration, now),
+        )
+
+        return cursor.rowcount == 1
+
+
+def create_coordination_store(settings: Settings) -> CoordinationStore:
+    return CoordinationStore(settings.coordination_path)
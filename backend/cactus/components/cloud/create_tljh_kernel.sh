@@ -16,6 +16,12 @@ show_help() {
     echo ""
     echo "Flags:"
     echo "  --url <REPO_URL>    Git repository URL to install a package from source"
+    echo "  --commit <SHA>      Commit of the repository to check out (only with --url)"
+    echo ""
+    echo "Environment variables:"
+    echo "  ARTIFACT_URL           URL of the packed environment, unpacked instead of installing when it exists"
+    echo "  ARTIFACT_SHA256        SHA-256 digest the packed environment must match to be unpacked"
+    echo "  ARTIFACT_UPLOAD_TOKEN  Token to upload the environment packed after installing it to ARTIFACT_URL"
     exit 0
 }
 
@@ -36,31 +42,79 @@ CONDA_BIN="/opt/tljh/user/bin/conda"
 PYTHON_VERSION="$1"
 UNIQUE_ENV_NAME="$2"
 KERNEL_DISPLAY_NAME="$3"
+ENV_DIR="/opt/tljh/user/envs/$UNIQUE_ENV_NAME"
+ARTIFACT_FILE="/tmp/$UNIQUE_ENV_NAME.tar.gz"
+# Kernels may be set up concurrently, changes to the shared conda installation are serialized
+CONDA_LOCK="/var/lock/cactus-conda.lock"
 shift 3 # Remove the first three arguments so the remaining ones can be treated as PIP_PACKAGES
 
+# Unpack the environment packed by a builder VM, return non-zero if there is none or it does not match its digest
+unpack_artifact() {
+    [[ -n "$ARTIFACT_URL" && -n "$ARTIFACT_SHA256" ]] || return 1
+    curl --fail --silent --show-error --location --retry 3 "$ARTIFACT_URL" --output "$ARTIFACT_FILE" || return 1
+    # Errors are not fatal inside an `if` condition, so every step is checked and a broken artifact is discarded
+    if ! (
+        echo "$ARTIFACT_SHA256  $ARTIFACT_FILE" | sha256sum --check --status &&
+        sudo mkdir -p "$ENV_DIR" &&
+        sudo tar -xzf "$ARTIFACT_FILE" -C "$ENV_DIR" &&
+        sudo "$ENV_DIR/bin/conda-unpack"
+    ); then
+        sudo rm -rf "$ENV_DIR" "$ARTIFACT_FILE"
+        return 1
+    fi
+    rm -f "$ARTIFACT_FILE"
+}
+
+# Pack the freshly installed environment and upload it for the next VMs, only builder VMs get an upload token
+upload_artifact() {
+    [[ -n "$ARTIFACT_URL" && -n "$ARTIFACT_UPLOAD_TOKEN" ]] || return 0
+    (
+        sudo flock "$CONDA_LOCK" /opt/tljh/user/bin/python -m pip install --quiet conda-pack &&
+        sudo /opt/tljh/user/bin/conda-pack --prefix "$ENV_DIR" --output "$ARTIFACT_FILE" \
+            --ignore-editable-packages --quiet --force &&
+        curl --fail --silent --show-error --upload-file "$ARTIFACT_FILE" \
+            --header "X-Artifact-Token: $ARTIFACT_UPLOAD_TOKEN" "$ARTIFACT_URL"
+    ) || echo "Upload of the $UNIQUE_ENV_NAME environment artifact failed."
+    sudo rm -f "$ARTIFACT_FILE"
+}
+
 # Check for --url flag
 if [[ "$1" == "--url" ]]; then
     # TODO fix sudo logic and folder permissions. For now it's working, but solution is not ideal.
     REPO_URL="$2"
+    if [[ "$3" == "--commit" ]]; then
+        REPO_COMMIT="$4"
+    fi
     SHARED_DIR="/srv/shared_repos"
     REPO_DIR="$SHARED_DIR/$(basename "$REPO_URL" .git)"
     sudo mkdir -p "$SHARED_DIR"
     sudo chmod 775 "$SHARED_DIR"
     sudo chown :users "$SHARED_DIR"
     sudo git clone "$REPO_URL" "$REPO_DIR"
+    if [[ -n "$REPO_COMMIT" ]]; then
+        sudo git -C "$REPO_DIR" checkout --quiet "$REPO_COMMIT"
+    fi
     sudo chmod -R 775 "$REPO_DIR"
     sudo chown -R :users "$REPO_DIR"
+fi
+
+# The editable install of a repo points to REPO_DIR, which is cloned at the same path on every VM
+if unpack_artifact; then
+    echo "Environment $UNIQUE_ENV_NAME unpacked from $ARTIFACT_URL"
+elif [[ -n "$REPO_URL" ]]; then
     cd "$REPO_DIR"
-    sudo $CONDA_BIN create -n $UNIQUE_ENV_NAME python=$PYTHON_VERSION -y
-    sudo /opt/tljh/user/bin/conda run -n $UNIQUE_ENV_NAME pip install -e .
-    sudo /opt/tljh/user/bin/conda run -n $UNIQUE_ENV_NAME pip install ipykernel
+    sudo flock "$CONDA_LOCK" $CONDA_BIN create -n $UNIQUE_ENV_NAME python=$PYTHON_VERSION -y
+    sudo --preserve-env=PIP_CACHE_DIR /opt/tljh/user/bin/conda run -n $UNIQUE_ENV_NAME pip install -e .
+    sudo --preserve-env=PIP_CACHE_DIR /opt/tljh/user/bin/conda run -n $UNIQUE_ENV_NAME pip install ipykernel
     cd -
+    upload_artifact
 else
     PIP_PACKAGES=("$@")
     # Create the Python environment with ipykernel
-    sudo $CONDA_BIN create -n $UNIQUE_ENV_NAME python=$PYTHON_VERSION -y
-    sudo /opt/tljh/user/bin/conda run -n $UNIQUE_ENV_NAME pip install "${PIP_PACKAGES[@]}"
-    sudo /opt/tljh/user/bin/conda run -n $UNIQUE_ENV_NAME pip install ipykernel
+    sudo flock "$CONDA_LOCK" $CONDA_BIN create -n $UNIQUE_ENV_NAME python=$PYTHON_VERSION -y
+    sudo --preserve-env=PIP_CACHE_DIR /opt/tljh/user/bin/conda run -n $UNIQUE_ENV_NAME pip install "${PIP_PACKAGES[@]}"
+    sudo --preserve-env=PIP_CACHE_DIR /opt/tljh/user/bin/conda run -n $UNIQUE_ENV_NAME pip install ipykernel
+    upload_artifact
 fi
 
 # Register the kernel with TLJH
@@ -0,0 +1,43 @@
+import asyncio
+from collections.abc import AsyncIterator
+from collections.abc import Iterable
+
+from cactus.components.cloud.models import InstanceEvent
+from fastapi import Request
+
+
+class EventBroker:
+    """Fan out the instance lifecycle events to every subscribed client.
+
+    Each subscriber gets a bounded queue, a subscriber that does not keep up loses its oldest events instead of
+    slowing the publisher down.
+    """
+
+    def __init__(self, *, queue_size: int) -> None:
+        self.queue_size = queue_size
+        self._subscribers: set[asyncio.Queue[InstanceEvent]] = set()
+
+    def publish(self, event: InstanceEvent) -> None:
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def subscribe(self, snapshot: Iterable[InstanceEvent] = ()) -> AsyncIterator[InstanceEvent]:
+        """Yield the passed snapshot first and then every published event until the subscriber goes away."""
+
+        queue: asyncio.Queue[InstanceEvent] = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+
+        try:
+            for event in snapshot:
+                yield event
+
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.discard(queue)
+
+
+def get_event_broker(request: Request) -> EventBroker:
+    return request.app.state.event_broker
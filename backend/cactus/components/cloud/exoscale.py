@@ -0,0 +1,178 @@
+import base64
+import hashlib
+import hmac
+import time as tm
+from collections.abc import Generator
+from functools import cache
+from typing import Any
+from urllib.parse import parse_qs
+from uuid import UUID
+
+import httpx
+from cactus.components.cloud.providers import CloudProvider
+from cactus.metrics import CLOUD_API_DURATION
+from cactus.metrics import CLOUD_API_ERRORS
+from exoscale.api.exceptions import ExoscaleAPIAuthException
+from exoscale.api.exceptions import ExoscaleAPIClientException
+from exoscale.api.exceptions import ExoscaleAPIServerException
+
+# Default endpoint of the API, as in the `servers` of its specification
+API_URL_TEMPLATE = 'https://api-{zone}.exoscale.com/v2'
+
+
+@cache
+def get_api_operations() -> dict[str, dict[str, Any]]:
+    """Return the operations of the Exoscale API specification by ID.
+
+    The SDK parses its bundled specification and pulls `requests` in when imported, which would slow the start of
+    every worker down, so it is only imported by the first call.
+    """
+
+    from exoscale.api.v2 import BY_OPERATION
+
+    return BY_OPERATION
+
+
+class ExoscaleAPINotFoundException(ExoscaleAPIClientException):
+    pass
+
+
+class ExoscaleAPINoZoneAvailableException(ExoscaleAPIServerException):
+    pass
+
+
+class ExoscaleAPIRateLimitException(ExoscaleAPIClientException):
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ExoscaleAuth(httpx.Auth):
+    """Sign requests with the Exoscale API V2 `EXO2-HMAC-SHA256` scheme."""
+
+    requires_request_body = True
+
+    def __init__(self, key: str, secret: str, expiration: int = 600) -> None:
+        self.key = key
+        self.secret = secret.encode()
+        self.expiration = expiration
+
+    def auth_flow(self, request: httpx.Request) -> Generator[httpx.Request, httpx.Response, None]:
+        expires = str(int(tm.time() + self.expiration))
+
+        # Query parameters are signed in alphabetical order, parameters with multiple values are listed but not signed
+        query = parse_qs(request.url.query.decode())
+        signed_query_args = sorted(query)
+        signed_query_values = ''.join(query[arg][0] for arg in signed_query_args if len(query[arg]) == 1)
+
+        message = b'\n'.join(
+            [
+                f'{request.method} {request.url.path}'.encode(),
+                request.content,
+                signed_query_values.encode(),
+                b'',
+                expires.encode(),
+            ]
+        )
+        signature = base64.standard_b64encode(hmac.new(self.secret, msg=message, digestmod=hashlib.sha256).digest())
+
+        authorization = f'EXO2-HMAC-SHA256 credential={self.key}'
+        if signed_query_args:
+            authorization += f',signed-query-args={";".join(signed_query_args)}'
+        authorization += f',expires={expires},signature={signature.decode()}'
+
+        request.headers['Authorization'] = authorization
+        yield request
+
+
+class AsyncExoscaleClient(CloudProvider):
+    """Asynchronous counterpart of `exoscale.api.v2.Client` that runs on a shared HTTP connection pool."""
+
+    def __init__(
+        self, key: str, secret: str, *, zone: str, http_client: httpx.AsyncClient, url: str | None = None
+    ) -> None:
+        self.zone = zone
+        self.endpoint = url or API_URL_TEMPLATE.format(zone=zone)
+        self.auth = ExoscaleAuth(key, secret)
+        self.http_client = http_client
+
+    async def call_operation(
+        self, operation_id: str, parameters: dict[str, Any] | None = None, body: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        operation = get_api_operations()[operation_id]
+        parameters = parameters or {}
+
+        path_params = {}
+        query_params = {}
+        for param in operation['operation'].get('parameters', []):
+            name = param['name']
+            if param['required'] and name not in parameters:
+                raise ValueError(f'Missing mandatory param {name!r}')
+            if name not in parameters:
+                continue
+            if param['in'] == 'path':
+                path_params[name] = parameters[name]
+            elif param['in'] == 'query':
+                query_params[name] = parameters[name]
+
+        started_at = tm.perf_counter()
+        try:
+            response = await self.http_client.request(
+                method=operation['verb'].upper(),
+                url=f'{self.endpoint}{operation["path"].format(**path_params)}',
+                params=query_params,
+                json=body,
+                auth=self.auth,
+            )
+        except httpx.TransportError:
+            CLOUD_API_ERRORS.labels(operation=operation_id, zone=self.zone, error='transport').inc()
+            raise
+        finally:
+            CLOUD_API_DURATION.labels(operation=operation_id, zone=self.zone).observe(tm.perf_counter() - started_at)
+
+        if response.status_code >= 400:
+            CLOUD_API_ERRORS.labels(operation=operation_id, zone=self.zone, error=response.status_code).inc()
+            self._raise_for_status(response)
+
+        return response.json()
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response) -> None:
+        if response.status_code == 429:
+            retry_after = response.headers.get('Retry-After', '')
+            raise ExoscaleAPIRateLimitException(
+                f'Rate limit error {response.status_code}: {response.text}',
+                retry_after=float(retry_after) if retry_after.isdecimal() else None,
+            )
+        if response.status_code == 404:
+            raise ExoscaleAPINotFoundException(f'Not found error {response.status_code}: {response.text}')
+        if response.status_code == 403:
+            raise ExoscaleAPIAuthException(f'Authentication error {response.status_code}: {response.text}')
+        if 400 <= response.status_code < 500:
+            raise ExoscaleAPIClientException(f'Client error {response.status_code}: {response.text}')
+        if response.status_code >= 500:
+            raise ExoscaleAPIServerException(f'Server error {response.status_code}: {response.text}')
+
+    async def list_instances(self) -> dict[str, Any]:
+        return await self.call_operation('list-instances')
+
+    async def get_instance(self, instance_id: UUID) -> dict[str, Any]:
+        return await self.call_operation('get-instance', {'id': instance_id})
+
+    @staticmethod
+    def _to_api_body(body: dict[str, Any]) -> dict[str, Any]:
+        """Map the Python names of the body fields to their API names, e.g. `user_data` to `user-data`."""
+
+        return {name.replace('_', '-'): value for name, value in body.items()}
+
+    async def create_instance(self, **body: Any) -> dict[str, Any]:
+        return await self.call_operation('create-instance', body=self._to_api_body(body))
+
+    async def update_instance(self, instance_id: UUID, **body: Any) -> dict[str, Any]:
+        return await self.call_operation('update-instance', {'id': instance_id}, body=self._to_api_body(body))
+
+    async def delete_instance(self, instance_id: UUID) -> dict[str, Any]:
+        return await self.call_operation('delete-instance', {'id': instance_id})
+
+    async def get_operation(self, operation_id: UUID) -> dict[str, Any]:
+        return await self.call_operation('get-operation', {'id': operation_id})
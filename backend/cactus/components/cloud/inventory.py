@@ -0,0 +1,108 @@
+import asyncio
+import time as tm
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Hashable
+from typing import Any
+from uuid import UUID
+
+from cactus.components.cloud.models import Instance
+
+
+class InstanceInventory:
+    """Cache the labelled instances for a short time to live and coalesce concurrent identical lookups.
+
+    Concurrent callers asking for the same data while it is being fetched share a single upstream call. Any
+    invalidation bumps the generation, so results of fetches started before it are neither stored nor shared. The
+    zones left out of the last listing because they failed to answer are kept in `unavailable_zones`.
+    """
+
+    # Minimum age of the inventory before an unknown redirect ID triggers a refresh
+    miss_refresh_interval = 1.0
+
+    def __init__(
+        self,
+        *,
+        ttl: float,
+        fetch_instances: Callable[[], Awaitable[tuple[list[Instance], set[str]]]],
+        fetch_instance: Callable[[UUID], Awaitable[Instance]],
+    ) -> None:
+        self.ttl = ttl
+        self.fetch_instances = fetch_instances
+        self.fetch_instance = fetch_instance
+
+        self._generation = 0
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+
+        self._instances: dict[UUID, Instance] = {}
+        self._instances_fetched_at: float | None = None
+        self._instances_by_redirect_id: dict[str, Instance] = {}
+        self.unavailable_zones: set[str] = set()
+        self._single_instances: dict[UUID, tuple[Instance, float]] = {}
+
+    def _is_fresh(self, fetched_at: float | None, ttl: float | None = None) -> bool:
+        return fetched_at is not None and tm.monotonic() - fetched_at < (self.ttl if ttl is None else ttl)
+
+    async def _coalesce(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        key = (self._generation, key)
+
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(load())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # A cancelled caller must not cancel the fetch the other callers are waiting for
+        return await asyncio.shield(future)
+
+    async def _refresh_instances(self) -> list[Instance]:
+        generation = self._generation
+        instances, unavailable_zones = await self.fetch_instances()
+
+        if generation == self._generation:
+            self._instances = {instance.id: instance for instance in instances}
+            self.unavailable_zones = unavailable_zones
+            self._instances_by_redirect_id = {instance.labels['redirect_id']: instance for instance in instances}
+            self._instances_fetched_at = tm.monotonic()
+
+        return instances
+
+    async def _refresh_instance(self, instance_id: UUID) -> Instance:
+        generation = self._generation
+        instance = await self.fetch_instance(instance_id)
+
+        if generation == self._generation:
+            self._single_instances[instance_id] = (instance, tm.monotonic())
+
+        return instance
+
+    async def list_instances(self) -> list[Instance]:
+        if self._is_fresh(self._instances_fetched_at):
+            return list(self._instances.values())
+
+        return await self._coalesce('list', self._refresh_instances)
+
+    async def get_instance(self, instance_id: UUID) -> Instance:
+        if self._is_fresh(self._instances_fetched_at) and instance_id in self._instances:
+            return self._instances[instance_id]
+
+        instance, fetched_at = self._single_instances.get(instance_id, (None, None))
+        if self._is_fresh(fetched_at):
+            return instance
+
+        return await self._coalesce(('get', instance_id), lambda: self._refresh_instance(instance_id))
+
+    async def find_instance(self, redirect_id: UUID) -> Instance | None:
+        if str(redirect_id) in self._instances_by_redirect_id and self._is_fresh(self._instances_fetched_at):
+            return self._instances_by_redirect_id[str(redirect_id)]
+
+        # The instance may have been created by another worker since the last refresh
+        if not self._is_fresh(self._instances_fetched_at, self.miss_refresh_interval):
+            await self._coalesce('list', self._refresh_instances)
+
+        return self._instances_by_redirect_id.get(str(redirect_id))
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._instances_fetched_at = None
+        self._single_instances.clear()
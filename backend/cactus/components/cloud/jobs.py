@@ -0,0 +1,155 @@
+import asyncio
+import datetime as dt
+from collections.abc import AsyncIterator
+from uuid import UUID
+
+from cactus.components.cloud.clients import CloudClient
+from cactus.components.cloud.exoscale import ExoscaleAPINotFoundException
+from cactus.components.cloud.models import Job
+from cactus.components.cloud.models import JobStatus
+from cactus.components.cloud.models import Operation
+from cactus.components.cloud.models import OperationState
+from cactus.logger import logger
+from fastapi import Request
+
+
+class JobScheduler:
+    """Track cloud operations as jobs through the shared operation poller.
+
+    Every job is a lightweight task waiting for its operation, so the number of in-flight VM creations does not affect
+    the number of occupied workers nor the number of calls to the cloud API. A job is identified by its operation ID,
+    so a worker asked for a job submitted to another one picks it up from the cloud operation.
+    """
+
+    # Interval between two removals of the expired jobs
+    prune_interval = 60
+
+    def __init__(self, cloud_client: CloudClient, *, timeout: int, retention: int) -> None:
+        self.cloud_client = cloud_client
+        self.timeout = timeout
+        self.retention = dt.timedelta(seconds=retention)
+
+        self.jobs: dict[UUID, Job] = {}
+        self._changed = asyncio.Condition()
+        self._tracking: set[asyncio.Task] = set()
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        for task in self._tracking:
+            task.cancel()
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def submit(self, operation: Operation, fetch_instance: bool = True) -> Job:
+        """Track the operation as a job, the instance is attached on success unless `fetch_instance` is unset."""
+
+        now = dt.datetime.now(dt.UTC)
+        job = Job(
+            id=operation.id,
+            operation_id=operation.id,
+            instance_id=operation.reference_id,
+            created_at=now,
+            updated_at=now,
+        )
+
+        self.jobs[job.id] = job
+        task = asyncio.create_task(self._track(job, fetch_instance, operation))
+        self._tracking.add(task)
+        task.add_done_callback(self._tracking.discard)
+
+        return job
+
+    async def get_job(self, job_id: UUID) -> Job | None:
+        """Get the job, picking it up from its cloud operation if it was submitted to another worker."""
+
+        if job_id in self.jobs:
+            return self.jobs[job_id]
+
+        try:
+            operation = await self.cloud_client.get_operation(job_id)
+        except ExoscaleAPINotFoundException:
+            return None
+
+        # Another request may have picked the job up in the meantime
+        if job_id in self.jobs:
+            return self.jobs[job_id]
+
+        # The operation does not tell a creation from a deletion, the instance is attached if it still exists
+        job = self.submit(operation, fetch_instance=True)
+        if operation.state != OperationState.PENDING:
+            async with self._changed:
+                await self._changed.wait_for(lambda: job.is_finished)
+
+        return job
+
+    async def watch(self, job_id: UUID) -> AsyncIterator[Job]:
+        """Yield the job every time its state changes until it is finished."""
+
+        job = self.jobs[job_id]
+
+        while True:
+            last_update = job.updated_at
+            yield job
+
+            if job.is_finished:
+                return
+
+            async with self._changed:
+                while job.updated_at == last_update:
+                    await self._changed.wait()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.prune_interval)
+            self._prune()
+
+    async def _track(self, job: Job, fetch_instance: bool, operation: Operation) -> None:
+        try:
+            if operation.state == OperationState.PENDING:
+                operation = await self.cloud_client.operation_poller.wait(job.operation_id, self.timeout)
+
+            if operation.state == OperationState.SUCCESS and not fetch_instance:
+                self._finish(job, JobStatus.SUCCEEDED)
+            elif operation.state == OperationState.SUCCESS:
+                try:
+                    instance = await self.cloud_client.get_instance(operation.reference_id)
+                except ExoscaleAPINotFoundException:
+                    instance = None
+                self._finish(job, JobStatus.SUCCEEDED, instance=instance)
+            else:
+                self._finish(job, JobStatus.FAILED, error=operation.message or operation.reason or operation.state)
+        except TimeoutError:
+            self._finish(job, JobStatus.FAILED, error='Operation timed out')
+        except Exception:
+            logger.exception(f'Polling of operation "{job.operation_id}" failed')
+            self._finish(job, JobStatus.FAILED, error='Operation polling failed')
+
+        async with self._changed:
+            self._changed.notify_all()
+
+    def _finish(self, job: Job, status: JobStatus, **kwargs) -> None:
+        for key, value in kwargs.items():
+            setattr(job, key, value)
+        job.status = status
+        job.updated_at = dt.datetime.now(dt.UTC)
+
+    def _prune(self) -> None:
+        expired_at = dt.datetime.now(dt.UTC) - self.retention
+        for job_id, job in list(self.jobs.items()):
+            if job.is_finished and job.updated_at < expired_at:
+                del self.jobs[job_id]
+
+
+def get_job_scheduler(request: Request) -> JobScheduler:
+    return request.app.state.job_scheduler
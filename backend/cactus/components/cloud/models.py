@@ -1,8 +1,11 @@
+import datetime as dt
 from enum import StrEnum
 from uuid import UUID
 
+from pydantic import AliasPath
 from pydantic import BaseModel
 from pydantic import Field
+from pydantic import TypeAdapter
 
 
 class Instance(BaseModel):
@@ -10,6 +13,11 @@ class Instance(BaseModel):
     name: str
     public_ip: str = Field(alias='public-ip', serialization_alias='public_ip')
     labels: dict[str, str]
+    zone: str | None = None
+
+
+# Validates a whole listing in a single call instead of one `model_validate` per instance
+INSTANCE_LIST_ADAPTER = TypeAdapter(list[Instance])
 
 
 class InstanceType(StrEnum):
@@ -27,3 +35,68 @@ class InstanceType(StrEnum):
             'medium': UUID('b6e9d1e8-89fc-4db3-aaa4-9b4c5b1d0844'),
             'large': UUID('c6f99499-7f59-4138-9427-a09db13af2bc'),
         }.get(self)
+
+    def to_setup_parallelism(self) -> int:
+        """Return how many kernels can be installed concurrently without exhausting the CPUs and memory."""
+
+        return {
+            'micro': 1,
+            'tiny': 1,
+            'small': 2,
+            'medium': 3,
+            'large': 4,
+        }.get(self)
+
+
+class OperationState(StrEnum):
+    PENDING: str = 'pending'
+    SUCCESS: str = 'success'
+    FAILURE: str = 'failure'
+    TIMEOUT: str = 'timeout'
+
+
+class Operation(BaseModel):
+    id: UUID
+    state: OperationState
+    reference_id: UUID | None = Field(default=None, validation_alias=AliasPath('reference', 'id'))
+    reason: str | None = None
+    message: str | None = None
+
+
+class JobStatus(StrEnum):
+    PENDING: str = 'pending'
+    SUCCEEDED: str = 'succeeded'
+    FAILED: str = 'failed'
+
+
+class Job(BaseModel):
+    id: UUID
+    status: JobStatus = JobStatus.PENDING
+    operation_id: UUID
+    instance_id: UUID | None = None
+    instance: Instance | None = None
+    error: str | None = None
+    created_at: dt.datetime
+    updated_at: dt.datetime
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status != JobStatus.PENDING
+
+
+class InstanceEventType(StrEnum):
+    CREATED: str = 'created'
+    DELETED: str = 'deleted'
+    STARTING: str = 'starting'
+    READY: str = 'ready'
+    ERROR: str = 'error'
+
+    @classmethod
+    def from_status(cls, status: str) -> 'InstanceEventType':
+        return {'ready': cls.READY, 'error': cls.ERROR}.get(status, cls.STARTING)
+
+
+class InstanceEvent(BaseModel):
+    type: InstanceEventType
+    instance: Instance
+    timestamp: dt.datetime
@@ -0,0 +1,167 @@
+import asyncio
+import random
+import time as tm
+from collections.abc import Awaitable
+from collections.abc import Callable
+from contextlib import suppress
+from dataclasses import dataclass
+from uuid import UUID
+
+import httpx
+from cactus.components.cloud.exoscale import ExoscaleAPIRateLimitException
+from cactus.components.cloud.models import Operation
+from cactus.components.cloud.models import OperationState
+from cactus.logger import logger
+from cactus.metrics import CLOUD_OPERATION_DURATION
+from cactus.metrics import CLOUD_OPERATION_POLLS
+from cactus.metrics import CLOUD_RATE_LIMITED
+from exoscale.api.exceptions import ExoscaleAPIServerException
+
+
+@dataclass
+class WatchedOperation:
+    future: asyncio.Future
+    started_at: float
+    deadline: float
+    interval: float
+    next_poll_at: float
+    polls: int = 0
+
+
+class OperationPoller:
+    """Poll all the outstanding cloud operations from a single background task and wake up their waiters.
+
+    Every operation is polled with its own exponentially growing, jittered interval, so short operations are noticed
+    quickly and long ones cost few calls. Concurrent waiters of the same operation share its polls. A rate limited
+    call pauses all the polls for the time requested by the cloud API.
+    """
+
+    def __init__(
+        self,
+        fetch_operation: Callable[[UUID], Awaitable[Operation]],
+        *,
+        initial_interval: float,
+        max_interval: float,
+        backoff_factor: float,
+        jitter: float,
+    ) -> None:
+        self.fetch_operation = fetch_operation
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+
+        self._watched: dict[UUID, WatchedOperation] = {}
+        self._changed = asyncio.Event()
+        self._paused_until = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def wait(self, operation_id: UUID, timeout: float) -> Operation:
+        """Return the operation once it is no longer pending, raise TimeoutError after `timeout` seconds."""
+
+        now = tm.monotonic()
+        watched = self._watched.get(operation_id)
+
+        if watched is None:
+            watched = WatchedOperation(
+                future=asyncio.get_running_loop().create_future(),
+                started_at=now,
+                deadline=now + timeout,
+                interval=self.initial_interval,
+                next_poll_at=now + self._jittered(self.initial_interval),
+            )
+            self._watched[operation_id] = watched
+            self._changed.set()
+        else:
+            watched.deadline = max(watched.deadline, now + timeout)
+
+        # A waiter giving up must not cancel the polling the other waiters rely on
+        return await asyncio.wait_for(asyncio.shield(watched.future), timeout)
+
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def _run(self) -> None:
+        while True:
+            now = tm.monotonic()
+
+            for operation_id, watched in list(self._watched.items()):
+                if watched.deadline <= now:
+                    self._finish(operation_id, watched, error=TimeoutError())
+
+            if now >= self._paused_until:
+                due = [
+                    (operation_id, watched)
+                    for operation_id, watched in self._watched.items()
+                    if watched.next_poll_at <= now
+                ]
+                await asyncio.gather(*(self._poll(operation_id, watched) for operation_id, watched in due))
+
+            delay = None
+            if self._watched:
+                next_poll_at = min(watched.next_poll_at for watched in self._watched.values())
+                delay = max(next_poll_at, self._paused_until) - tm.monotonic()
+
+            self._changed.clear()
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self._changed.wait(), delay)
+
+    async def _poll(self, operation_id: UUID, watched: WatchedOperation) -> None:
+        watched.polls += 1
+
+        try:
+            operation = await self.fetch_operation(operation_id)
+        except ExoscaleAPIRateLimitException as error:
+            CLOUD_RATE_LIMITED.inc()
+            retry_after = error.retry_after or self.max_interval
+            logger.warning(f'Cloud API rate limit hit, pausing the operation polls for {retry_after}s')
+            self._paused_until = max(self._paused_until, tm.monotonic() + retry_after)
+            return
+        except (ExoscaleAPIServerException, httpx.TransportError):
+            logger.warning(f'Polling of operation "{operation_id}" failed, retrying', exc_info=True)
+            operation = None
+        except Exception as error:
+            self._finish(operation_id, watched, error=error)
+            return
+
+        if operation is not None and operation.state != OperationState.PENDING:
+            self._finish(operation_id, watched, operation=operation)
+            return
+
+        watched.interval = min(watched.interval * self.backoff_factor, self.max_interval)
+        watched.next_poll_at = tm.monotonic() + self._jittered(watched.interval)
+
+    def _finish(
+        self,
+        operation_id: UUID,
+        watched: WatchedOperation,
+        operation: Operation | None = None,
+        error: BaseException | None = None,
+    ) -> None:
+        del self._watched[operation_id]
+
+        if operation is not None:
+            watched.future.set_result(operation)
+            state = operation.state
+        else:
+            watched.future.set_exception(error)
+            # Mark the exception as retrieved, the waiters may have timed out already
+            watched.future.exception()
+            state = 'error'
+
+        CLOUD_OPERATION_DURATION.labels(state=state).observe(tm.monotonic() - watched.started_at)
+        CLOUD_OPERATION_POLLS.observe(watched.polls)
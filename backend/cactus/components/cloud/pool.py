@@ -0,0 +1,136 @@
+import asyncio
+from contextlib import suppress
+from typing import TYPE_CHECKING
+from uuid import UUID
+from uuid import uuid4
+
+from cactus.components.cloud.clients import CloudClient
+from cactus.components.cloud.coordination import CoordinationStore
+from cactus.components.cloud.models import Instance
+from cactus.components.cloud.models import Operation
+from cactus.logger import logger
+from fastapi import Request
+
+if TYPE_CHECKING:
+    from cactus.components.vm.schemas import InstanceCreateSchema
+
+REFILL_LEASE = 'warm_pool_refill'
+
+# Refill intervals the refill lease lasts, so a stopped leader is replaced within a few cycles
+REFILL_LEASE_INTERVALS = 3
+
+
+class WarmPool:
+    """Keep a target number of provisioned but unassigned VMs per instance type and kernel set.
+
+    Pool VMs boot with the OAuth callback of a redirect ID that is kept in a `pool_redirect_id` label, and stay out of
+    the inventory until a matching creation request claims one by relabelling it with that redirect ID. A VM is claimed
+    in the coordination store first, so two workers never hand out the same one.
+
+    Every worker lists the pool VMs on each cycle to know what it can claim, but only the worker holding the refill
+    lease creates VMs, at most `refill_batch_size` per cycle, so the workers do not overfill the pool together. A claim
+    wakes the cycle of its worker up right away.
+    """
+
+    def __init__(
+        self,
+        cloud_client: CloudClient,
+        coordination_store: CoordinationStore,
+        *,
+        targets: list[tuple['InstanceCreateSchema', int]],
+        refill_interval: float,
+        refill_batch_size: int,
+    ) -> None:
+        self.cloud_client = cloud_client
+        self.coordination_store = coordination_store
+        self.payloads = {payload.pool_key: payload for payload, _ in targets}
+        self.targets = {payload.pool_key: count for payload, count in targets}
+        self.refill_interval = refill_interval
+        self.refill_batch_size = refill_batch_size
+
+        self.instances: dict[str, list[Instance]] = {pool_key: [] for pool_key in self.targets}
+        self.ready: set[UUID] = set()
+        self._holder = uuid4().hex
+        self._refill_requested = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self.targets:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def claim(self, payload: 'InstanceCreateSchema') -> Operation | None:
+        """Claim a pool VM matching the request, ready ones first, return `None` if there is none."""
+
+        pool_key = payload.pool_key
+        if pool_key not in self.targets:
+            return None
+
+        candidates = sorted(self.instances[pool_key], key=lambda instance: instance.id not in self.ready)
+        for instance in candidates:
+            self.instances[pool_key].remove(instance)
+            if not self.coordination_store.claim(f'pool:{instance.id}'):
+                continue
+
+            try:
+                operation = await self.cloud_client.claim_pool_instance(instance)
+            except Exception:
+                self.coordination_store.release(f'pool:{instance.id}')
+                raise
+            if operation is not None:
+                self._refill_requested.set()
+                return operation
+
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            self._refill_requested.clear()
+            try:
+                await self.refill()
+            except Exception:
+                logger.exception('Refill of the warm pool failed')
+
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self._refill_requested.wait(), self.refill_interval)
+
+    async def refill(self) -> None:
+        instances, unavailable_zones = await self.cloud_client.list_pool_instances()
+        statuses = await asyncio.gather(*(self.cloud_client.probe_instance(instance) for instance in instances))
+
+        self.ready = {instance.id for instance, status in zip(instances, statuses, strict=True) if status == 'ready'}
+        self.instances = {
+            pool_key: [instance for instance in instances if instance.labels['pool'] == pool_key]
+            for pool_key in self.targets
+        }
+
+        lease_duration = self.refill_interval * REFILL_LEASE_INTERVALS
+        if not self.coordination_store.acquire_lease(REFILL_LEASE, self._holder, lease_duration):
+            return
+        # The pool VMs of a zone that could not be listed would be counted as missing
+        if unavailable_zones:
+            logger.warning(f'Skipping the refill of the warm pool, zones {", ".join(sorted(unavailable_zones))} failed')
+            return
+
+        creations = []
+        for pool_key, target in self.targets.items():
+            missing = min(target - len(self.instances[pool_key]), self.refill_batch_size - len(creations))
+            creations += [self.cloud_client.create_instance(self.payloads[pool_key], pool_key) for _ in range(missing)]
+
+        if creations:
+            logger.info(f'Refilling the warm pool with {len(creations)} VMs')
+            await asyncio.gather(*creations)
+
+
+def get_warm_pool(request: Request) -> WarmPool:
+    return request.app.state.warm_pool
@@ -0,0 +1,39 @@
+from abc import ABC
+from abc import abstractmethod
+from typing import Any
+from uuid import UUID
+
+
+class CloudProvider(ABC):
+    """Interface of the backends managing the instances of a single zone.
+
+    Responses follow the Exoscale API V2 format and errors are raised as `exoscale.api.exceptions` exceptions, so the
+    cloud client handles all the backends alike. Every mutation returns an operation to be polled until it is no
+    longer pending.
+    """
+
+    zone: str
+
+    @abstractmethod
+    async def list_instances(self) -> dict[str, Any]:
+        """Return all the instances of the zone as `{'instances': [...]}`."""
+
+    @abstractmethod
+    async def get_instance(self, instance_id: UUID) -> dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def create_instance(self, **body: Any) -> dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def update_instance(self, instance_id: UUID, **body: Any) -> dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def delete_instance(self, instance_id: UUID) -> dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def get_operation(self, operation_id: UUID) -> dict[str, Any]:
+        pass
@@ -0,0 +1,109 @@
+import asyncio
+import datetime as dt
+from uuid import UUID
+
+from cactus.components.cloud.clients import CloudClient
+from cactus.components.cloud.events import EventBroker
+from cactus.components.cloud.models import Instance
+from cactus.components.cloud.models import InstanceEvent
+from cactus.components.cloud.models import InstanceEventType
+from cactus.logger import logger
+from fastapi import Request
+
+
+class ReadinessTracker:
+    """Probe JupyterHub on all the labelled instances from a single background task and keep their last known state.
+
+    The cost of the probes depends on the number of instances only, no matter how many clients ask for the statuses.
+    Every change noticed between two probe cycles is published as an instance event. Instances of a zone that could not
+    be listed keep their last known state, they are not reported as deleted.
+    """
+
+    def __init__(self, cloud_client: CloudClient, event_broker: EventBroker, *, interval: float) -> None:
+        self.cloud_client = cloud_client
+        self.event_broker = event_broker
+        self.interval = interval
+
+        self.instances: dict[UUID, Instance] = {}
+        self.statuses: dict[UUID, str] = {}
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def get_status(self, instance_id: UUID) -> str:
+        """Return the last known status of the instance, probing it right away if it has not been seen yet."""
+
+        if instance_id not in self.statuses:
+            self.statuses[instance_id] = await self.cloud_client.get_instance_status(instance_id)
+
+        return self.statuses[instance_id]
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.probe_all()
+            except Exception:
+                logger.exception('Probing of the instances failed')
+
+            await asyncio.sleep(self.interval)
+
+    async def probe_all(self) -> None:
+        instances = await self.cloud_client.list_instances()
+        unavailable_zones = self.cloud_client.unavailable_zones
+        statuses = await asyncio.gather(*(self.cloud_client.probe_instance(instance) for instance in instances))
+        current_instances = {instance.id: instance for instance in instances}
+
+        unlisted_instances = {}
+        for instance_id, instance in self.instances.items():
+            if instance_id in current_instances:
+                continue
+            if instance.zone in unavailable_zones:
+                unlisted_instances[instance_id] = instance
+            else:
+                self._publish(InstanceEventType.DELETED, instance)
+
+        for instance, status in zip(instances, statuses, strict=True):
+            if instance.id not in self.instances:
+                self._publish(InstanceEventType.CREATED, instance)
+
+            event_type = InstanceEventType.from_status(status)
+            previous_status = self.statuses.get(instance.id)
+            if previous_status is None or InstanceEventType.from_status(previous_status) != event_type:
+                self._publish(event_type, instance)
+
+        self.instances = {**unlisted_instances, **current_instances}
+        self.statuses = {
+            **{instance_id: self.statuses[instance_id] for instance_id in unlisted_instances},
+            **{instance.id: status for instance, status in zip(instances, statuses, strict=True)},
+        }
+
+    def snapshot(self) -> list[InstanceEvent]:
+        """Describe the last known status of every instance as a list of events."""
+
+        now = dt.datetime.now(dt.UTC)
+
+        return [
+            InstanceEvent(
+                type=InstanceEventType.from_status(self.statuses[instance_id]), instance=instance, timestamp=now
+            )
+            for instance_id, instance in self.instances.items()
+        ]
+
+    def _publish(self, event_type: InstanceEventType, instance: Instance) -> None:
+        self.event_broker.publish(InstanceEvent(type=event_type, instance=instance, timestamp=dt.datetime.now(dt.UTC)))
+
+
+def get_readiness_tracker(request: Request) -> ReadinessTracker:
+    return request.app.state.readiness_tracker
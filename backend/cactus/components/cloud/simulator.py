@@ -0,0 +1,143 @@
+import asyncio
+import heapq
+import random
+import time as tm
+from typing import Any
+from uuid import UUID
+from uuid import uuid4
+
+from cactus.components.cloud.exoscale import ExoscaleAPINotFoundException
+from cactus.components.cloud.providers import CloudProvider
+from exoscale.api.exceptions import ExoscaleAPIServerException
+
+
+class SimulatedCloudProvider(CloudProvider):
+    """In-memory stand-in of a cloud zone for load and concurrency testing without paying for VMs.
+
+    Every call takes `api_latency` seconds and fails with a server error with probability `error_rate`. Operations
+    stay pending for `operation_latency` seconds, then fail with probability `operation_failure_rate`, and are settled
+    by the next call even if nobody polls them. Like on Exoscale, a created instance is listed right away, and a
+    deleted one until its operation succeeded. Simulated instances all share `public_ip`, where a single JupyterHub
+    stand-in can answer the probes.
+    """
+
+    def __init__(
+        self,
+        *,
+        zone: str,
+        api_latency: float = 0,
+        operation_latency: float = 0,
+        error_rate: float = 0,
+        operation_failure_rate: float = 0,
+        public_ip: str = '127.0.0.1',
+    ) -> None:
+        self.zone = zone
+        self.api_latency = api_latency
+        self.operation_latency = operation_latency
+        self.error_rate = error_rate
+        self.operation_failure_rate = operation_failure_rate
+        self.public_ip = public_ip
+
+        self.calls = 0
+        self.instances: dict[str, dict[str, Any]] = {}
+        self.operations: dict[str, dict[str, Any]] = {}
+        # Operations to settle as `(done_at, operation_id, command, changes)`, the earliest first
+        self._pending: list[tuple[float, str, str, dict[str, Any]]] = []
+
+    async def _call(self) -> None:
+        self.calls += 1
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+
+        if random.random() < self.error_rate:
+            raise ExoscaleAPIServerException('Server error 500: simulated failure')
+
+        self._settle()
+
+    def _settle(self) -> None:
+        """Apply the outcome of all the operations due by now, whether they are polled or not."""
+
+        now = tm.monotonic()
+        while self._pending and self._pending[0][0] <= now:
+            _, operation_id, command, changes = heapq.heappop(self._pending)
+            operation = self.operations[operation_id]
+            instance_id = operation['reference']['id']
+
+            if random.random() < self.operation_failure_rate:
+                operation['state'] = 'failure'
+                operation['message'] = 'Simulated failure'
+                # A failed creation leaves no instance behind
+                if command == 'create-instance':
+                    self.instances.pop(instance_id, None)
+                continue
+
+            operation['state'] = 'success'
+            if command == 'delete-instance':
+                self.instances.pop(instance_id, None)
+            elif instance_id in self.instances:
+                self.instances[instance_id] = {**self.instances[instance_id], **changes}
+
+    def _get_instance(self, instance_id: UUID) -> dict[str, Any]:
+        instance = self.instances.get(str(instance_id))
+        if instance is None:
+            raise ExoscaleAPINotFoundException(f'Not found error 404: instance {instance_id}')
+
+        return instance
+
+    def _start_operation(self, instance_id: str, command: str, changes: dict[str, Any] | None = None) -> dict[str, Any]:
+        operation = {'id': str(uuid4()), 'state': 'pending', 'reference': {'id': instance_id, 'command': command}}
+        self.operations[operation['id']] = operation
+        heapq.heappush(
+            self._pending, (tm.monotonic() + self.operation_latency, operation['id'], command, changes or {})
+        )
+
+        return dict(operation)
+
+    async def list_instances(self) -> dict[str, Any]:
+        await self._call()
+
+        return {'instances': list(self.instances.values())}
+
+    async def get_instance(self, instance_id: UUID) -> dict[str, Any]:
+        await self._call()
+
+        return self._get_instance(instance_id)
+
+    async def create_instance(self, **body: Any) -> dict[str, Any]:
+        await self._call()
+
+        instance_id = str(uuid4())
+        self.instances[instance_id] = {
+            'id': instance_id,
+            'name': f'vm-{instance_id[:8]}',
+            'public-ip': self.public_ip,
+            'labels': body.get('labels', {}),
+            'state': 'starting',
+        }
+
+        return self._start_operation(instance_id, 'create-instance', {'state': 'running'})
+
+    async def update_instance(self, instance_id: UUID, **body: Any) -> dict[str, Any]:
+        await self._call()
+
+        # Updates are applied right away, like on Exoscale
+        instance = self._get_instance(instance_id)
+        instance.update(body)
+
+        return self._start_operation(instance['id'], 'update-instance')
+
+    async def delete_instance(self, instance_id: UUID) -> dict[str, Any]:
+        await self._call()
+
+        instance = self._get_instance(instance_id)
+
+        return self._start_operation(instance['id'], 'delete-instance')
+
+    async def get_operation(self, operation_id: UUID) -> dict[str, Any]:
+        await self._call()
+
+        operation = self.operations.get(str(operation_id))
+        if operation is None:
+            raise ExoscaleAPINotFoundException(f'Not found error 404: operation {operation_id}')
+
+        return dict(operation)
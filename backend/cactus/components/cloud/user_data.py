@@ -0,0 +1,309 @@
+import base64
+import gzip
+import json
+import shlex
+from functools import lru_cache
+from textwrap import indent
+from typing import TYPE_CHECKING
+from typing import Any
+from uuid import UUID
+
+from cactus.components.artifacts.store import ArtifactStore
+from cactus.components.cloud.models import InstanceType
+
+if TYPE_CHECKING:
+    from cactus.components.vm.schemas import InstanceCreateSchema
+
+# Largest base64 encoded user data accepted by Exoscale
+USER_DATA_MAX_SIZE = 32768
+
+TLJH_CONFIG_PATH = '/opt/tljh/config/config.yaml'
+
+# Installs the kernels concurrently, at most `parallelism` at a time, with a pip cache shared by all of them.
+# On user VMs, JupyterHub is started as soon as the first kernel is ready, starting it again once it runs is a no-op.
+SETUP_PLAN_HEADER = """\
+#!/usr/bin/env bash
+export PIP_CACHE_DIR=/var/cache/cactus/pip
+mkdir -p "$PIP_CACHE_DIR"
+
+setup_kernel() {{
+    "$@"{on_kernel_ready}
+}}
+
+wait_for_slot() {{
+    while (( $(jobs -rp | wc -l) >= {parallelism} )); do
+        wait -n
+    done
+}}
+
+"""
+
+SETUP_PLAN_FOOTER = 'wait\n'
+
+START_JUPYTERHUB = ' && systemctl start jupyterhub'
+
+# Indentation of the content of the files in the `write_files` section
+CONTENT_INDENT = ' ' * 6
+
+
+class UserDataTooLargeError(ValueError):
+    pass
+
+
+def _escape_sed_replacement(value: str) -> str:
+    """Escape a value to be used as the replacement of a `s|...|...|g` sed expression."""
+
+    return value.replace('\\', '\\\\').replace('|', '\\|').replace('&', '\\&').replace('\n', '\\n')
+
+
+def _render_file(path: str, content: str) -> str:
+    return (
+        f'  - path: {path}\n'
+        "    permissions: '0755'\n"
+        '    owner: root:root\n'
+        '    content: |\n'
+        f'{indent(content, CONTENT_INDENT)}'
+    )
+
+
+class UserDataBuilder:
+    """Build the cloud-init configuration installing the requested kernels on a VM.
+
+    The parts shared by all the VMs, e.g. the setup script, are rendered once, and the setup command of every kernel
+    once per template, so a document is assembled from cached pieces. Interpolated values are shell-quoted, and the
+    runtime commands run without a shell. Documents above the Exoscale limit are sent gzipped, which cloud-init
+    decompresses, and refused with a `UserDataTooLargeError` if still too large.
+
+    User VMs only get the URL and digest of the stored environment artifacts, the upload tokens are only given to the
+    artifact builder VMs, which no user can log in to.
+    """
+
+    def __init__(
+        self,
+        *,
+        setup_environment_script: str,
+        host_url: str,
+        github_oauth_client_id: str,
+        github_oauth_client_secret: str,
+        artifact_store: ArtifactStore,
+        max_size: int = USER_DATA_MAX_SIZE,
+        cache_size: int = 1024,
+    ) -> None:
+        self.host_url = host_url
+        self.artifact_store = artifact_store
+        self.max_size = max_size
+
+        self._head = (
+            '#cloud-config\n'
+            'write_files:\n'
+            f'{_render_file("/usr/local/bin/setup_environment.sh", setup_environment_script)}'
+            '  - path: /usr/local/bin/setup_environments.sh\n'
+            "    permissions: '0755'\n"
+            '    owner: root:root\n'
+            '    content: |\n'
+        )
+        self._plan_headers = {
+            size: indent(
+                SETUP_PLAN_HEADER.format(parallelism=size.to_setup_parallelism(), on_kernel_ready=START_JUPYTERHUB),
+                CONTENT_INDENT,
+            )
+            for size in InstanceType
+        }
+        self._builder_plan_headers = {
+            size: indent(
+                SETUP_PLAN_HEADER.format(parallelism=size.to_setup_parallelism(), on_kernel_ready=''), CONTENT_INDENT
+            )
+            for size in InstanceType
+        }
+        self._plan_footer = indent(SETUP_PLAN_FOOTER, CONTENT_INDENT)
+        self._sed_arguments = [
+            'sed',
+            '-i',
+            '-e',
+            f's|GITHUB_OAUTH_CLIENT_ID|{_escape_sed_replacement(github_oauth_client_id)}|g',
+            '-e',
+            f's|GITHUB_OAUTH_CLIENT_SECRET|{_escape_sed_replacement(github_oauth_client_secret)}|g',
+        ]
+        self._tail = ''.join(
+            f'  - {json.dumps(command)}\n'
+            for command in (
+                ['tljh-config', 'reload'],
+                ['systemctl', 'stop', 'jupyterhub'],
+                ['/usr/local/bin/setup_environments.sh'],
+                ['systemctl', 'start', 'jupyterhub'],
+            )
+        )
+
+        # Builders never start JupyterHub, whose first user would become its admin, and power off once done
+        self._builder_tail = ''.join(
+            f'  - {json.dumps(command)}\n'
+            for command in (
+                ['systemctl', 'stop', 'jupyterhub'],
+                ['/usr/local/bin/setup_environments.sh'],
+                ['poweroff'],
+            )
+        )
+
+        self._get_env_setup = lru_cache(maxsize=cache_size)(self._get_env_setup)
+        self._get_repo_setup = lru_cache(maxsize=cache_size)(self._get_repo_setup)
+        self._render_command = lru_cache(maxsize=cache_size)(self._render_command)
+
+    def build(
+        self,
+        payload: 'InstanceCreateSchema',
+        repos: list[dict[str, Any]],
+        redirect_id: UUID,
+        template_id: UUID,
+    ) -> str:
+        """Return the base64 encoded cloud-init configuration, `repos` are the validation results of the repos."""
+
+        commands = []
+        for key, arguments in self.get_setups(payload, repos, template_id):
+            commands.append(self._render_command(self.get_artifact_variables(key), arguments))
+
+        callback_url = f'{self.host_url}/vms/oauth/{redirect_id}'
+        sed_command = [
+            *self._sed_arguments,
+            '-e',
+            f's|GITHUB_OAUTH_CALLBACK_URL|{_escape_sed_replacement(callback_url)}|g',
+            TLJH_CONFIG_PATH,
+        ]
+
+        user_data = ''.join(
+            [
+                self._head,
+                self._plan_headers[payload.size],
+                *commands,
+                self._plan_footer,
+                'runcmd:\n',
+                f'  - {json.dumps(sed_command)}\n',
+                self._tail,
+            ]
+        )
+
+        return self._encode(user_data)
+
+    def build_artifact_builder(self, size: InstanceType, setups: list[tuple[str, tuple[str, ...]]]) -> str:
+        """Return the base64 encoded cloud-init configuration of a VM building and uploading the artifacts."""
+
+        commands = [
+            self._render_command(
+                (
+                    ('ARTIFACT_URL', self.artifact_store.get_url(key)),
+                    ('ARTIFACT_UPLOAD_TOKEN', self.artifact_store.get_upload_token(key)),
+                ),
+                arguments,
+            )
+            for key, arguments in setups
+        ]
+
+        user_data = ''.join(
+            [
+                self._head,
+                self._builder_plan_headers[size],
+                *commands,
+                self._plan_footer,
+                'runcmd:\n',
+                self._builder_tail,
+            ]
+        )
+
+        return self._encode(user_data)
+
+    def _encode(self, document: str) -> str:
+        user_data = document.encode()
+        encoded = base64.b64encode(user_data)
+        if len(encoded) > self.max_size:
+            encoded = base64.b64encode(gzip.compress(user_data, mtime=0))
+        if len(encoded) > self.max_size:
+            raise UserDataTooLargeError(
+                f'The setup of the requested kernels exceeds the {self.max_size} bytes of user data of a VM'
+            )
+
+        return encoded.decode()
+
+    def get_setups(
+        self, payload: 'InstanceCreateSchema', repos: list[dict[str, Any]], template_id: UUID
+    ) -> list[tuple[str | None, tuple[str, ...]]]:
+        """Return the artifact key, `None` if the environment is not reproducible, and setup arguments per kernel.
+
+        Environments are packed per template, since their binaries depend on the image they were built on.
+        """
+
+        setups = [
+            self._get_env_setup(
+                template_id,
+                env['PYTHON_VERSION'],
+                env['UNIQUE_ENV_NAME'],
+                env['KERNEL_DISPLAY_NAME'],
+                tuple(env['PIP_PACKAGES']),
+            )
+            for env in payload.python_envs or []
+        ]
+        setups += [
+            self._get_repo_setup(
+                template_id,
+                repo['PYTHON_VERSION'].lstrip('>='),
+                repo['UNIQUE_ENV_NAME'],
+                str(repo_url),
+                repo.get('commit_sha'),
+            )
+            for repo_url, repo in zip(payload.repo_urls or [], repos, strict=True)
+        ]
+
+        return setups
+
+    def _get_env_setup(
+        self,
+        template_id: UUID,
+        python_version: str,
+        env_name: str,
+        kernel_display_name: str,
+        pip_packages: tuple[str, ...],
+    ) -> tuple[str, tuple[str, ...]]:
+        key = self.artifact_store.get_key(
+            template_id=template_id,
+            python_version=python_version,
+            env_name=env_name,
+            kernel_display_name=kernel_display_name,
+            pip_packages=list(pip_packages),
+        )
+
+        return key, (python_version, env_name, kernel_display_name, *pip_packages)
+
+    def _get_repo_setup(
+        self, template_id: UUID, python_version: str, env_name: str, repo_url: str, commit_sha: str | None
+    ) -> tuple[str | None, tuple[str, ...]]:
+        kernel_display_name = f'Python (with {env_name})'
+        arguments = (python_version, env_name, kernel_display_name, '--url', repo_url)
+        # Only a repo pinned to a commit has a reproducible environment
+        if not commit_sha:
+            return None, arguments
+
+        key = self.artifact_store.get_key(
+            template_id=template_id,
+            python_version=python_version,
+            env_name=env_name,
+            kernel_display_name=kernel_display_name,
+            repo_url=repo_url,
+            commit_sha=commit_sha,
+        )
+
+        return key, (*arguments, '--commit', commit_sha)
+
+    def _render_command(self, variables: tuple[tuple[str, str], ...], arguments: tuple[str, ...]) -> str:
+        assignments = ''.join(f'{name}={shlex.quote(value)} ' for name, value in variables)
+        command = f'{assignments}setup_kernel /usr/local/bin/setup_environment.sh {shlex.join(arguments)}'
+
+        return indent(f'wait_for_slot; {command} &\n', CONTENT_INDENT)
+
+    def get_artifact_variables(self, key: str | None) -> tuple[tuple[str, str], ...]:
+        """Return the environment variables telling the setup script where to fetch the packed environment and how to
+        check it, none if it is not stored yet.
+        """
+
+        digest = key and self.artifact_store.get_digest(key)
+        if not digest:
+            return ()
+
+        return ('ARTIFACT_URL', self.artifact_store.get_url(key)), ('ARTIFACT_SHA256', digest)
@@ -0,0 +1,64 @@
+import time as tm
+from uuid import UUID
+
+
+class ZoneSelector:
+    """Rank the zones for the next VM creation by their recent provisioning latency.
+
+    The latency of a zone is an exponentially weighted moving average of the duration of its last creation operations.
+    Zones are ranked by latency first, then by number of creations in flight, so zones not measured yet are tried
+    and a burst of creations is spread over them. A zone refusing a creation, e.g. for lack of capacity or quota, is
+    ranked last for `failure_cooldown` seconds.
+    """
+
+    # Weight of the last creation in the latency average
+    smoothing = 0.3
+    # Creations not seen finished after this delay are no longer counted in flight
+    in_flight_timeout = 600
+
+    def __init__(self, zones: list[str], *, failure_cooldown: float) -> None:
+        self.zones = zones
+        self.failure_cooldown = failure_cooldown
+
+        self.latencies: dict[str, float] = {}
+        self.failed_at: dict[str, float] = {}
+        self._in_flight: dict[UUID, tuple[str, float]] = {}
+
+    def rank(self) -> list[str]:
+        """Return the zones from the most to the least preferred, ties keep the configured order."""
+
+        now = tm.monotonic()
+        self._in_flight = {
+            operation_id: (zone, started_at)
+            for operation_id, (zone, started_at) in self._in_flight.items()
+            if now - started_at < self.in_flight_timeout
+        }
+        in_flight = [zone for zone, _ in self._in_flight.values()]
+
+        return sorted(
+            self.zones,
+            key=lambda zone: (
+                zone in self.failed_at and now - self.failed_at[zone] < self.failure_cooldown,
+                self.latencies.get(zone, 0),
+                in_flight.count(zone),
+            ),
+        )
+
+    def start_creation(self, zone: str, operation_id: UUID) -> None:
+        self._in_flight[operation_id] = (zone, tm.monotonic())
+
+    def finish_creation(self, operation_id: UUID, succeeded: bool) -> None:
+        if operation_id not in self._in_flight:
+            return
+
+        zone, started_at = self._in_flight.pop(operation_id)
+        if not succeeded:
+            self.record_failure(zone)
+            return
+
+        latency = tm.monotonic() - started_at
+        previous_latency = self.latencies.get(zone, latency)
+        self.latencies[zone] = previous_latency + self.smoothing * (latency - previous_latency)
+
+    def record_failure(self, zone: str) -> None:
+        self.failed_at[zone] = tm.monotonic()
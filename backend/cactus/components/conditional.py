@@ -0,0 +1,40 @@
+import hashlib
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def compute_etag(content: bytes) -> str:
+    return f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Tell whether the client already has the representation, comparing the tags weakly as `If-None-Match` does."""
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is None:
+        return False
+
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+
+    return '*' in tags or etag in tags
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+
+def conditional_json_response(
+    request: Request, content: bytes, headers: dict[str, str] | None = None, etag: str | None = None
+) -> Response:
+    """Return the serialized JSON content tagged with its hash, or an empty 304 response if the client already has it.
+
+    Clients are asked to revalidate every time, so polling an unchanged resource only costs the serialization. An
+    `etag` derived from what the content depends on may be passed instead of the hash.
+    """
+
+    headers = {**(headers or {}), 'ETag': etag or compute_etag(content), 'Cache-Control': 'no-cache'}
+    if is_not_modified(request, headers['ETag']):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content, media_type='application/json', headers=headers)
@@ -0,0 +1,19 @@
+import httpx
+from cactus.config import Settings
+from fastapi import Request
+
+
+def create_http_client(settings: Settings) -> httpx.AsyncClient:
+    """Create the keep-alive connection pool shared by all the outgoing HTTP calls of the process."""
+
+    return httpx.AsyncClient(
+        timeout=settings.http_timeout,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+        ),
+    )
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http_client
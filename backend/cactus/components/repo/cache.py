@@ -0,0 +1,171 @@
+import json
+import sqlite3
+import time as tm
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import wraps
+from pathlib import Path
+from typing import Any
+
+from cactus.logger import logger
+
+# Milliseconds a call waits for the write lock of another worker, calls run on the event loop so they must not block it
+BUSY_TIMEOUT = 50
+
+# Number of writes to a table between two evictions of its oldest entries
+EVICTION_INTERVAL = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    etag TEXT NOT NULL,
+    content TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_updated_at ON responses (updated_at);
+
+CREATE TABLE IF NOT EXISTS results (
+    repo TEXT NOT NULL,
+    commit_sha TEXT NOT NULL,
+    result TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (repo, commit_sha)
+);
+CREATE INDEX IF NOT EXISTS results_updated_at ON results (updated_at);
+
+CREATE TABLE IF NOT EXISTS heads (
+    repo TEXT PRIMARY KEY,
+    commit_sha TEXT NOT NULL,
+    checked_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS heads_checked_at ON heads (checked_at);
+"""
+
+
+def skip_when_locked(default: Any = None) -> Callable[[Callable], Callable]:
+    """Return `default` instead of waiting when another worker holds the lock, a cache miss or a lost write is cheaper
+    than a blocked event loop."""
+
+    def decorator(method: Callable) -> Callable:
+        @wraps(method)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return method(*args, **kwargs)
+            except sqlite3.OperationalError as error:
+                if 'locked' not in str(error) and 'busy' not in str(error):
+                    raise
+                logger.debug(f'Store is locked by another worker, skipping {method.__qualname__}')
+                return default
+
+        return wrapper
+
+    return decorator
+
+
+@dataclass
+class CachedResponse:
+    etag: str
+    content: str
+
+
+@dataclass
+class CachedHead:
+    commit_sha: str
+    checked_at: float
+
+    @property
+    def age(self) -> float:
+        return tm.time() - self.checked_at
+
+
+class ValidationCache:
+    """Persist the validation results per repo and commit, the last known head commit of every repo and the last remote
+    responses per URL for revalidation.
+
+    The store is a SQLite database in WAL mode, so all the workers of the process share what any of them learned and
+    it survives restarts. A repo is validated only once per commit, and the responses are revalidated with
+    `If-None-Match`, so unchanged resources cost a `304 Not Modified` that does not count against the GitHub rate limit.
+    Entries above `max_entries` per table are evicted every few writes, the least recently stored first. Calls do not
+    wait for the lock held by another worker beyond `BUSY_TIMEOUT`, they miss or skip the write instead.
+    """
+
+    def __init__(self, path: Path, *, max_entries: int) -> None:
+        self.path = path
+        self.max_entries = max_entries
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        # The setup above may wait for the other workers starting at the same time, the calls below may not
+        self.connection.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT}')
+        self._writes: dict[str, int] = {}
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _evict(self, table: str, column: str = 'updated_at') -> None:
+        self._writes[table] = self._writes.get(table, 0) + 1
+        if self._writes[table] % EVICTION_INTERVAL:
+            return
+
+        self.connection.execute(
+            f'DELETE FROM {table} WHERE rowid IN '
+            f'(SELECT rowid FROM {table} ORDER BY {column} DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,),
+        )
+
+    @skip_when_locked()
+    def get_result(self, repo: str, commit_sha: str) -> dict[str, Any] | None:
+        row = self.connection.execute(
+            'SELECT result FROM results WHERE repo = ? AND commit_sha = ?', (repo, commit_sha)
+        ).fetchone()
+
+        return None if row is None else json.loads(row[0])
+
+    @skip_when_locked()
+    def set_result(self, repo: str, commit_sha: str, result: dict[str, Any]) -> None:
+        self.connection.execute(
+            'INSERT OR REPLACE INTO results (repo, commit_sha, result, updated_at) VALUES (?, ?, ?, ?)',
+            (repo, commit_sha, json.dumps(result), tm.time()),
+        )
+        self._evict('results')
+
+    @skip_when_locked()
+    def get_head(self, repo: str) -> CachedHead | None:
+        row = self.connection.execute('SELECT commit_sha, checked_at FROM heads WHERE repo = ?', (repo,)).fetchone()
+
+        return None if row is None else CachedHead(*row)
+
+    @skip_when_locked()
+    def set_head(self, repo: str, commit_sha: str) -> None:
+        self.connection.execute(
+            'INSERT OR REPLACE INTO heads (repo, commit_sha, checked_at) VALUES (?, ?, ?)',
+            (repo, commit_sha, tm.time()),
+        )
+        self._evict('heads', 'checked_at')
+
+    @skip_when_locked(False)
+    def claim_head(self, repo: str, head: CachedHead) -> bool:
+        """Mark the head as checked now unless another worker did it first, return whether this call won."""
+
+        cursor = self.connection.execute(
+            'UPDATE heads SET checked_at = ? WHERE repo = ? AND checked_at = ?', (tm.time(), repo, head.checked_at)
+        )
+
+        return cursor.rowcount == 1
+
+    @skip_when_locked()
+    def get_response(self, key: str) -> CachedResponse | None:
+        row = self.connection.execute('SELECT etag, content FROM responses WHERE key = ?', (key,)).fetchone()
+
+        return None if row is None else CachedResponse(*row)
+
+    @skip_when_locked()
+    def set_response(self, key: str, response: CachedResponse) -> None:
+        self.connection.execute(
+            'INSERT OR REPLACE INTO responses (key, etag, content, updated_at) VALUES (?, ?, ?, ?)',
+            (key, response.etag, response.content, tm.time()),
+        )
+        self._evict('responses')
@@ -0,0 +1,477 @@
+import asyncio
+import json
+import threading
+import time as tm
+from abc import ABC
+from abc import abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable
+from collections.abc import Coroutine
+from collections.abc import Hashable
+from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import replace
+from pathlib import Path
+from typing import Any
+from typing import Literal
+
+import httpx
+from cactus.components.repo.cache import CachedResponse
+from cactus.components.repo.cache import ValidationCache
+from cactus.logger import logger
+from cactus.metrics import REPO_PREFLIGHT_DURATION
+from cactus.metrics import REPO_PREFLIGHTS
+from packaging.requirements import InvalidRequirement
+from packaging.requirements import Requirement
+from packaging.specifiers import InvalidSpecifier
+from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion
+from packaging.version import Version
+from resolvelib import AbstractProvider
+from resolvelib import BaseReporter
+from resolvelib import ResolutionError
+from resolvelib import ResolutionImpossible
+from resolvelib import Resolver
+
+# Environment of the VMs the requirement markers are evaluated against, besides the Python version
+VM_MARKER_ENVIRONMENT = {
+    'implementation_name': 'cpython',
+    'os_name': 'posix',
+    'platform_machine': 'x86_64',
+    'platform_python_implementation': 'CPython',
+    'platform_system': 'Linux',
+    'sys_platform': 'linux',
+}
+
+# Bound on the backtracking of a single resolution, as pip does
+MAX_RESOLUTION_ROUNDS = 2000
+
+
+class PreflightTimeoutError(Exception):
+    pass
+
+
+class ExpiringCache:
+    """Keep at most `size` entries for `ttl` seconds each, evicting the least recently used ones first.
+
+    Entries are read by the resolver thread and written on the event loop, so every access holds a lock.
+    """
+
+    def __init__(self, *, size: int, ttl: float) -> None:
+        self.size = size
+        self.ttl = ttl
+
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        """Return the value stored under the key, `None` if there is none or it expired."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= tm.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (tm.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+class PackageIndex(ABC):
+    """Source of the metadata of the packages, with names canonicalized as in `packaging.utils.canonicalize_name`."""
+
+    @abstractmethod
+    async def get_releases(self, name: str) -> dict[str, str | None]:
+        """Return the `Requires-Python` of every installable release of the package by version, none if unknown."""
+
+    @abstractmethod
+    async def get_requirements(self, name: str, version: str) -> list[str]:
+        """Return the `Requires-Dist` of the release."""
+
+
+class SnapshotPackageIndex(PackageIndex):
+    """Serve the metadata from a local JSON snapshot, e.g. as a stand-in for the package index in tests.
+
+    The snapshot maps the packages to their releases, `{"name": {"version": {"requires_python": ...,
+    "requires_dist": [...]}}}`.
+    """
+
+    def __init__(self, path: Path) -> None:
+        snapshot = json.loads(path.read_text())
+        self.packages = {canonicalize_name(name): releases for name, releases in snapshot.items()}
+
+    async def get_releases(self, name: str) -> dict[str, str | None]:
+        return {version: release.get('requires_python') for version, release in self.packages.get(name, {}).items()}
+
+    async def get_requirements(self, name: str, version: str) -> list[str]:
+        return self.packages[name][version].get('requires_dist') or []
+
+
+class PyPIPackageIndex(PackageIndex):
+    """Fetch the metadata from the JSON API of PyPI or of a compatible index.
+
+    Responses are reduced to the metadata the resolver needs, persisted in the validation cache and revalidated with
+    `If-None-Match`, so the local copy of the index only grows by the packages and releases asked for.
+    """
+
+    def __init__(self, http_client: httpx.AsyncClient, cache: ValidationCache, *, url: str) -> None:
+        self.http_client = http_client
+        self.cache = cache
+        self.url = url.rstrip('/')
+
+    async def _get(self, url: str, reduce: Callable[[dict[str, Any]], Any]) -> Any:
+        """Return the reduced JSON response, `None` if the resource does not exist."""
+
+        request = self.http_client.build_request('GET', url, headers={'Accept': 'application/json'})
+        cache_key = f'preflight {url}'
+        cached_response = self.cache.get_response(cache_key)
+        if cached_response is not None:
+            request.headers['If-None-Match'] = cached_response.etag
+
+        response = await self.http_client.send(request)
+        if response.status_code == 304:
+            return json.loads(cached_response.content)
+
+        if response.status_code == 404:
+            return None
+
+        response.raise_for_status()
+
+        content = reduce(response.json())
+        if etag := response.headers.get('ETag'):
+            self.cache.set_response(cache_key, CachedResponse(etag=etag, content=json.dumps(content)))
+
+        return content
+
+    @staticmethod
+    def _reduce_releases(response: dict[str, Any]) -> dict[str, str | None]:
+        releases = {}
+        for version, files in response['releases'].items():
+            # Releases without files cannot be installed, and pip skips yanked ones unless pinned
+            installable_files = [file for file in files if not file.get('yanked')]
+            if installable_files:
+                releases[version] = installable_files[0].get('requires_python') or None
+
+        return releases
+
+    async def get_releases(self, name: str) -> dict[str, str | None]:
+        return await self._get(f'{self.url}/{name}/json', self._reduce_releases) or {}
+
+    async def get_requirements(self, name: str, version: str) -> list[str]:
+        return (
+            await self._get(f'{self.url}/{name}/{version}/json', lambda response: response['info']['requires_dist'])
+            or []
+        )
+
+
+@dataclass(frozen=True)
+class Candidate:
+    name: str
+    version: Version
+    extras: frozenset[str] = frozenset()
+
+
+class IndexProvider(AbstractProvider):
+    """Feed resolvelib with the releases of the package index compatible with the target Python version.
+
+    The resolver runs in a worker thread and fetches the metadata with the passed blocking functions. A requirement
+    with extras is resolved as its own identifier depending on the same release of the package without extras.
+    """
+
+    def __init__(
+        self,
+        *,
+        python_version: Version,
+        get_releases: Callable[[str], dict[Version, SpecifierSet | None]],
+        get_requirements: Callable[[str, Version], list[Requirement]],
+    ) -> None:
+        self.python_version = python_version
+        self.get_releases = get_releases
+        self.get_requirements = get_requirements
+        self.environment = {
+            **VM_MARKER_ENVIRONMENT,
+            'python_version': f'{python_version.major}.{python_version.minor}',
+            'python_full_version': str(python_version),
+            'implementation_version': str(python_version),
+        }
+
+    def is_applicable(self, requirement: Requirement, extras: frozenset[str] = frozenset()) -> bool:
+        if requirement.marker is None:
+            return True
+
+        return any(requirement.marker.evaluate({**self.environment, 'extra': extra}) for extra in {'', *extras})
+
+    def identify(self, requirement_or_candidate: Requirement | Candidate) -> str:
+        name = canonicalize_name(requirement_or_candidate.name)
+        extras = sorted(requirement_or_candidate.extras)
+
+        return f'{name}[{",".join(extras)}]' if extras else name
+
+    def get_preference(self, identifier, resolutions, candidates, information, backtrack_causes) -> tuple:
+        # Backtracking on the causes of the last conflict first, then pinned requirements, settles conflicts sooner
+        causes = {self.identify(cause.requirement) for cause in backtrack_causes}
+        pinned = any(
+            specifier.operator in ('==', '===')
+            for requirement, _ in information[identifier]
+            for specifier in requirement.specifier
+        )
+
+        return identifier not in causes, not pinned, identifier
+
+    def find_matches(self, identifier, requirements, incompatibilities) -> list[Candidate]:
+        name = identifier.partition('[')[0]
+        requirements = list(requirements[identifier])
+        extras = frozenset(extra for requirement in requirements for extra in requirement.extras)
+        incompatible_versions = {candidate.version for candidate in incompatibilities[identifier]}
+
+        versions = [
+            version
+            for version, requires_python in self.get_releases(name).items()
+            if version not in incompatible_versions
+            and (requires_python is None or requires_python.contains(self.python_version, prereleases=True))
+        ]
+        # Pre-releases are only candidates when asked for explicitly or when nothing else matches, as with pip
+        for requirement in requirements:
+            versions = list(requirement.specifier.filter(versions))
+
+        return [Candidate(name, version, extras) for version in sorted(versions, reverse=True)]
+
+    def is_satisfied_by(self, requirement: Requirement, candidate: Candidate) -> bool:
+        return requirement.specifier.contains(candidate.version, prereleases=True)
+
+    def get_dependencies(self, candidate: Candidate) -> list[Requirement]:
+        dependencies = [Requirement(f'{candidate.name}=={candidate.version}')] if candidate.extras else []
+        dependencies += [
+            requirement
+            for requirement in self.get_requirements(candidate.name, candidate.version)
+            if requirement.url is None and self.is_applicable(requirement, candidate.extras)
+        ]
+
+        return dependencies
+
+
+@dataclass
+class PreflightResult:
+    status: Literal['resolvable', 'unresolvable', 'unknown']
+    # Versions the requirements resolved to, by package
+    pins: dict[str, str] = field(default_factory=dict)
+    # Requirements left out of the resolution, e.g. direct URLs or pip options
+    skipped: list[str] = field(default_factory=list)
+    error: str | None = None
+
+
+class DependencyPreflight:
+    """Check that the dependencies of a repo can be installed together for its Python version before a VM is booted.
+
+    Requirements are resolved with backtracking like pip does, against the metadata of the package index. Metadata is
+    fetched on demand and memoized, and outcomes are memoized per Python version and set of requirements, concurrent
+    checks of the same set sharing a single resolution. Memoized outcomes and metadata are bounded in number and expire
+    after `cache_ttl` seconds, so new releases are taken into account. Requirements that cannot be checked, e.g. direct
+    URLs, are left out, and an index that cannot be reached or a resolution exceeding `timeout` seconds makes the
+    outcome unknown, which never rejects a repo. `mode` tells whether unresolvable repos are rejected, or only logged
+    by a check running in the background so the validation does not wait for it.
+    """
+
+    def __init__(
+        self,
+        index: PackageIndex,
+        *,
+        mode: Literal['warn', 'reject'],
+        timeout: float,
+        cache_size: int,
+        metadata_cache_size: int,
+        cache_ttl: float,
+    ) -> None:
+        self.index = index
+        self.mode = mode
+        self.timeout = timeout
+
+        self._results = ExpiringCache(size=cache_size, ttl=cache_ttl)
+        self._in_flight: dict[tuple[str, tuple[str, ...]], asyncio.Future] = {}
+        self._releases = ExpiringCache(size=metadata_cache_size, ttl=cache_ttl)
+        self._requirements = ExpiringCache(size=metadata_cache_size, ttl=cache_ttl)
+        self._background_checks: set[asyncio.Task] = set()
+
+    async def accepts(self, repo_url: str, validation_results: dict[str, Any]) -> bool:
+        """Tell whether a VM can be booted for the validated repo, log the repos whose dependencies do not resolve."""
+
+        python_version = validation_results['PYTHON_VERSION'].lstrip('>=')
+        requirements = validation_results['PIP_PACKAGES']
+        if isinstance(requirements, str):
+            requirements = requirements.splitlines()
+
+        if self.mode == 'warn':
+            task = asyncio.create_task(self._is_resolvable(repo_url, python_version, requirements))
+            self._background_checks.add(task)
+            task.add_done_callback(self._background_checks.discard)
+            return True
+
+        return await self._is_resolvable(repo_url, python_version, requirements)
+
+    async def _is_resolvable(self, repo_url: str, python_version: str, requirements: list[str]) -> bool:
+        try:
+            result = await self.check(python_version, requirements)
+        except Exception:
+            logger.exception(f'Dependency preflight of "{repo_url}" failed')
+            return True
+
+        if result.status != 'unresolvable':
+            return True
+
+        logger.warning(f'Dependencies of "{repo_url}" cannot be resolved for Python {python_version}: {result.error}')
+
+        return False
+
+    async def check(self, python_version: str, requirements: list[str]) -> PreflightResult:
+        parsed_requirements, skipped = self._parse_requirements(requirements)
+        key = (python_version, tuple(sorted({str(requirement) for requirement in parsed_requirements})))
+
+        result = self._results.get(key)
+        if result is not None:
+            return replace(result, skipped=skipped)
+
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._resolve(python_version, parsed_requirements))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        result = await asyncio.shield(future)
+
+        # An unknown outcome is checked again next time
+        if result.status != 'unknown':
+            self._results.set(key, result)
+
+        return replace(result, skipped=skipped)
+
+    @staticmethod
+    def _parse_requirements(requirements: list[str]) -> tuple[list[Requirement], list[str]]:
+        parsed_requirements = []
+        skipped = []
+        for line in requirements:
+            line = line.split(' #', 1)[0].strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                requirement = Requirement(line)
+            except InvalidRequirement:
+                skipped.append(line)
+                continue
+            if requirement.url is not None:
+                skipped.append(line)
+                continue
+            parsed_requirements.append(requirement)
+
+        return parsed_requirements, skipped
+
+    async def _resolve(self, python_version: str, requirements: list[Requirement]) -> PreflightResult:
+        started_at = tm.perf_counter()
+        try:
+            version = Version(python_version)
+        except InvalidVersion:
+            return PreflightResult('unknown', error=f'Invalid Python version "{python_version}"')
+
+        provider = self._create_provider(version, deadline=tm.monotonic() + self.timeout)
+        environment_requirements = [requirement for requirement in requirements if provider.is_applicable(requirement)]
+
+        try:
+            resolution = await asyncio.to_thread(
+                Resolver(provider, BaseReporter()).resolve, environment_requirements, MAX_RESOLUTION_ROUNDS
+            )
+        except ResolutionImpossible as error:
+            result = PreflightResult('unresolvable', error=self._describe_conflict(error))
+        except ResolutionError as error:
+            result = PreflightResult('unknown', error=f'Resolution gave up: {error}')
+        except (httpx.HTTPError, ValueError, PreflightTimeoutError) as error:
+            result = PreflightResult('unknown', error=str(error) or repr(error))
+        else:
+            result = PreflightResult(
+                'resolvable',
+                pins={
+                    candidate.name: str(candidate.version)
+                    for candidate in resolution.mapping.values()
+                    if not candidate.extras
+                },
+            )
+
+        REPO_PREFLIGHTS.labels(status=result.status).inc()
+        REPO_PREFLIGHT_DURATION.observe(tm.perf_counter() - started_at)
+
+        return result
+
+    def _create_provider(self, python_version: Version, *, deadline: float) -> IndexProvider:
+        """Create a provider fetching the metadata missing from the memo on the running loop until the deadline."""
+
+        loop = asyncio.get_running_loop()
+
+        def run(coroutine: Coroutine) -> Any:
+            future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+            try:
+                return future.result(timeout=max(deadline - tm.monotonic(), 0))
+            except TimeoutError:
+                future.cancel()
+                raise PreflightTimeoutError(f'Resolution took more than {self.timeout} seconds') from None
+
+        def get_releases(name: str) -> dict[Version, SpecifierSet | None]:
+            releases = self._releases.get(name)
+            if releases is None:
+                return run(self._fetch_releases(name))
+            return releases
+
+        def get_requirements(name: str, version: Version) -> list[Requirement]:
+            requirements = self._requirements.get((name, version))
+            if requirements is None:
+                return run(self._fetch_requirements(name, version))
+            return requirements
+
+        return IndexProvider(
+            python_version=python_version, get_releases=get_releases, get_requirements=get_requirements
+        )
+
+    @staticmethod
+    def _describe_conflict(error: ResolutionImpossible) -> str:
+        causes = [
+            f'{cause.requirement}'
+            + ('' if cause.parent is None else f' (required by {cause.parent.name} {cause.parent.version})')
+            for cause in error.causes
+        ]
+
+        return f'No compatible releases for {", ".join(dict.fromkeys(causes))}'
+
+    async def _fetch_releases(self, name: str) -> dict[Version, SpecifierSet | None]:
+        releases = {}
+        for version, requires_python in (await self.index.get_releases(name)).items():
+            try:
+                releases[Version(version)] = SpecifierSet(requires_python) if requires_python else None
+            except (InvalidVersion, InvalidSpecifier):
+                # Legacy versions and specifiers are not installable by pip either
+                continue
+
+        self._releases.set(name, releases)
+
+        return releases
+
+    async def _fetch_requirements(self, name: str, version: Version) -> list[Requirement]:
+        requirements = []
+        for line in await self.index.get_requirements(name, str(version)):
+            try:
+                requirements.append(Requirement(line))
+            except InvalidRequirement:
+                continue
+
+        self._requirements.set((name, version), requirements)
+
+        return requirements
@@ -1,74 +1,339 @@
 import ast
+import asyncio
+import datetime as dt
+import io
+import json
+import time as tm
 from abc import ABC
 from abc import abstractmethod
+from typing import TYPE_CHECKING
 from typing import Any
+from typing import Literal
 
-import requests
-import toml
+import httpx
+from cactus.components.repo.cache import CachedHead
+from cactus.components.repo.cache import CachedResponse
+from cactus.components.repo.cache import ValidationCache
+from cactus.config import Settings
 from cactus.logger import logger
+from cactus.metrics import GITHUB_API_CALLS
+from cactus.metrics import GITHUB_API_DURATION
+from cactus.metrics import GITHUB_RATE_LIMIT_REMAINING
+from fastapi import Request
+
+if TYPE_CHECKING:
+    from cactus.components.repo.preflight import DependencyPreflight
+
+# Packaging files in decreasing order of precedence
+PACKAGING_FILES = ('pyproject.toml', 'setup.cfg', 'setup.py', 'requirements.txt')
+
+# Larger packaging files are skipped rather than read into memory, real ones are a few kilobytes
+PACKAGING_FILE_MAX_SIZE = 1024 * 1024
+
+
+class ArchiveTooLargeError(Exception):
+    pass
 
 
 class RemoteRepoValidator(ABC):
 
-    def run_validation_check(self, repo_url: str) -> dict[str, Any]:
-        self._assert_repo_url_is_valid(repo_url)
-        validation_results = self._validate_repo_content(repo_url)
+    async def run_validation_check(self, repo_url: str) -> dict[str, Any]:
+        await self._assert_repo_url_is_valid(repo_url)
+        validation_results = await self._validate_repo_content(repo_url)
         return validation_results
 
+    def get_known_commit_sha(self, repo_url: str) -> str | None:
+        """Return the commit the repo is known to be at without any remote call, `None` if it is not known."""
+
+        return None
+
     @abstractmethod
-    def _assert_repo_url_is_valid(self, repo_url: str) -> None:
+    async def _assert_repo_url_is_valid(self, repo_url: str) -> None:
         """Raise ValueError if the passed URL is not valid for the corresponding source."""
 
     @abstractmethod
-    def _validate_repo_content(self, repo_url: str) -> dict[str, Any]:
+    async def _validate_repo_content(self, repo_url: str) -> dict[str, Any]:
         """Validate that all information required to successfully run `pip install -e` can be found in the repo."""
 
 
 class GitHubRepoValidator(RemoteRepoValidator):
+    """Validate GitHub repos once per commit of their default branch.
+
+    The head commit of a repo checked less than `fresh_ttl` seconds ago is trusted as is. Up to `stale_ttl` seconds, the
+    result for the known head is returned right away while a single worker checks the head again in the background.
+    In the `archive` mode a new commit costs a single tarball download whatever the number of packaging files, the
+    `contents` mode lists the repo root and looks up every packaging file found there. Every GitHub call is a
+    conditional request revalidating the last response for the same URL, and the calls that do not depend on each
+    other are made concurrently.
+    """
+
+    def __init__(
+        self,
+        http_client: httpx.AsyncClient,
+        cache: ValidationCache,
+        *,
+        api_url: str,
+        api_token: str,
+        fresh_ttl: float,
+        stale_ttl: float,
+        validation_mode: Literal['archive', 'contents'],
+        archive_max_size: int,
+        archive_max_uncompressed_size: int,
+    ) -> None:
+        self.http_client = http_client
+        self.cache = cache
+        self.api_url = api_url.rstrip('/')
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.validation_mode = validation_mode
+        self.archive_max_size = archive_max_size
+        self.archive_max_uncompressed_size = archive_max_uncompressed_size
+
+        self.headers = {'X-GitHub-Api-Version': '2022-11-28'}
+        if api_token:
+            self.headers['Authorization'] = f'Bearer {api_token}'
+
+        self._revalidations: dict[str, asyncio.Task] = {}
+
+    def get_known_commit_sha(self, repo_url: str) -> str | None:
+        owner, repo = self._parse_repo_url(repo_url)
+        head = self.cache.get_head(f'{owner}/{repo}')
+
+        return head.commit_sha if head is not None and head.age < self.fresh_ttl else None
+
+    def _revalidate_in_background(self, owner: str, repo: str, repo_url: str, head: CachedHead) -> None:
+        if f'{owner}/{repo}' in self._revalidations or not self.cache.claim_head(f'{owner}/{repo}', head):
+            return
+
+        task = asyncio.create_task(self._revalidate(owner, repo, repo_url))
+        self._revalidations[f'{owner}/{repo}'] = task
+        task.add_done_callback(lambda _: self._revalidations.pop(f'{owner}/{repo}', None))
+
+    async def _revalidate(self, owner: str, repo: str, repo_url: str) -> None:
+        try:
+            commit_sha = await self._get_head_commit_sha(owner, repo, repo_url)
+            await self._get_commit_validation_results(owner, repo, commit_sha)
+        except Exception:
+            logger.exception(f'Background revalidation of "{repo_url}" failed')
 
-    def _assert_repo_url_is_valid(self, repo_url: str) -> None:
-        owner, repo = repo_url.rstrip('/').split('/')[-2:]
-        api_url = f"https://api.github.com/repos/{owner}/{repo}/contents/"
-        response = requests.get(api_url)
-        if response.status_code != 200:
-            raise ValueError(f'Invalid GitHub URL: {repo_url}.')
+    async def _get_commit_validation_results(self, owner: str, repo: str, commit_sha: str) -> dict[str, Any]:
+        validation_results = self.cache.get_result(f'{owner}/{repo}', commit_sha)
+        if validation_results is None:
+            validation_results = await self._validate_commit_content(owner, repo, commit_sha)
+            self.cache.set_result(f'{owner}/{repo}', commit_sha, validation_results)
 
-    def _validate_repo_content(self, repo_url: str) -> dict[str, Any]:
+        return validation_results
+
+    async def _assert_repo_url_is_valid(self, repo_url: str) -> None:
+        # The repo itself is looked up along with its head commit, which fails if it does not exist
+        self._parse_repo_url(repo_url)
+
+    async def _validate_repo_content(self, repo_url: str) -> dict[str, Any]:
+        owner, repo = self._parse_repo_url(repo_url)
+        head = self.cache.get_head(f'{owner}/{repo}')
+
+        if head is not None and head.age < self.fresh_ttl:
+            commit_sha = head.commit_sha
+        elif (
+            head is not None and head.age < self.stale_ttl and self.cache.get_result(f'{owner}/{repo}', head.commit_sha)
+        ):
+            commit_sha = head.commit_sha
+            self._revalidate_in_background(owner, repo, repo_url, head)
+        else:
+            commit_sha = await self._get_head_commit_sha(owner, repo, repo_url)
+
+        validation_results = await self._get_commit_validation_results(owner, repo, commit_sha)
+
+        return {**validation_results, 'url': repo_url, 'commit_sha': commit_sha}
+
+    def _parse_repo_url(self, repo_url: str) -> tuple[str, str]:
         owner, repo = repo_url.rstrip('/').split('/')[-2:]
-        api_url = f"https://api.github.com/repos/{owner}/{repo}/contents/"
-        parsed_response = requests.get(api_url).json()
-        evaluation_results = {}
-        filenames = [file_info['name'] for file_info in parsed_response]
-        if 'pyproject.toml' in filenames:
-            pyproject_file_info = parsed_response[filenames.index('pyproject.toml')]
-            evaluation_results['pyproject'] = self._evaluate_pyproject(pyproject_file_info)
-            evaluation_results['pyproject']['last_updated_on'] = self._get_timestamp_of_last_update(
-                owner, repo, 'pyproject.toml'
-            )
-        elif 'setup.py' in filenames:
-            setup_file_info = parsed_response[filenames.index('setup.py')]
-            evaluation_results['setup'] = self._evaluate_setup(setup_file_info)
-            evaluation_results['setup']['last_updated_on'] = self._get_timestamp_of_last_update(owner, repo, 'setup.py')
-        elif 'requirements.txt' in filenames:
-            requirements_file_info = parsed_response[filenames.index('requirements.txt')]
-            evaluation_results['requirements'] = self._evaluate_requirements(requirements_file_info)
-            evaluation_results['requirements']['last_updated_on'] = self._get_timestamp_of_last_update(
-                owner, repo, 'requirements.txt'
+        return owner, repo
+
+    async def _get(
+        self, url: str, params: dict[str, Any] | None = None, accept: str = 'application/vnd.github+json'
+    ) -> str:
+        headers = {'Accept': accept}
+        if url.startswith(self.api_url):
+            headers.update(self.headers)
+
+        request = self.http_client.build_request('GET', url, params=params, headers=headers)
+        cache_key = f'{accept} {request.url}'
+        cached_response = self.cache.get_response(cache_key)
+        if cached_response is not None:
+            request.headers['If-None-Match'] = cached_response.etag
+
+        resource = 'api' if url.startswith(self.api_url) else 'raw'
+        started_at = tm.perf_counter()
+        try:
+            response = await self.http_client.send(request)
+        except httpx.TransportError:
+            self._record_call(resource, started_at)
+            raise
+        self._record_call(resource, started_at, response)
+
+        if response.status_code == 304:
+            return cached_response.content
+
+        if response.status_code in (403, 429) and cached_response is not None:
+            logger.warning(f'GitHub refused "{request.url}" with {response.status_code}, serving the cached response')
+            return cached_response.content
+
+        response.raise_for_status()
+
+        if etag := response.headers.get('ETag'):
+            self.cache.set_response(cache_key, CachedResponse(etag=etag, content=response.text))
+
+        return response.text
+
+    async def _get_head_commit_sha(self, owner: str, repo: str, repo_url: str) -> str:
+        try:
+            commit_sha = await self._get(
+                f'{self.api_url}/repos/{owner}/{repo}/commits/HEAD', accept='application/vnd.github.sha'
             )
+        except httpx.HTTPStatusError as error:
+            if error.response.status_code in (404, 422):
+                raise ValueError(f'Invalid GitHub URL: {repo_url}.') from error
+            raise
+
+        self.cache.set_head(f'{owner}/{repo}', commit_sha)
+        return commit_sha
+
+    async def _validate_commit_content(self, owner: str, repo: str, commit_sha: str) -> dict[str, Any]:
+        if self.validation_mode == 'archive':
+            try:
+                evaluation_results = await self._evaluate_archive(owner, repo, commit_sha)
+            except ArchiveTooLargeError:
+                logger.info(f'Archive of "{owner}/{repo}" is too large, falling back to the contents listing')
+                evaluation_results = await self._evaluate_contents(owner, repo, commit_sha)
+        else:
+            evaluation_results = await self._evaluate_contents(owner, repo, commit_sha)
         unified_results = self._unify_evaluation_results(evaluation_results)
-        unified_results['url'] = repo_url
         return unified_results
 
-    def _get_timestamp_of_last_update(self, owner: str, repo: str, filename: str) -> str:
-        url = f"https://api.github.com/repos/{owner}/{repo}/commits"
-        params = {'path': filename, 'per_page': 1}
-        response = requests.get(url, params=params)
-        timestamp_of_last_modification = response.json()[0]['commit']['committer']['date']
+    async def _evaluate_contents(self, owner: str, repo: str, commit_sha: str) -> dict[str, Any]:
+        """Evaluate the packaging files of the repo root, each one costs a download and a commit lookup."""
+
+        api_url = f"{self.api_url}/repos/{owner}/{repo}/contents/"
+        parsed_response = json.loads(await self._get(api_url, {'ref': commit_sha}))
+        file_infos = [file_info for file_info in parsed_response if file_info['name'] in PACKAGING_FILES]
+        evaluation_results = await asyncio.gather(
+            *(self._evaluate_file(owner, repo, commit_sha, file_info) for file_info in file_infos)
+        )
+        return {file_info['path']: result for file_info, result in zip(file_infos, evaluation_results, strict=True)}
+
+    async def _evaluate_file(self, owner: str, repo: str, commit_sha: str, file_info: dict[str, Any]) -> dict[str, Any]:
+        file_text, last_updated_on = await asyncio.gather(
+            self._get(file_info['download_url'], accept='application/vnd.github.raw'),
+            self._get_timestamp_of_last_update(owner, repo, commit_sha, file_info['path']),
+        )
+        return self._evaluate_packaging_file(file_info['path'], file_text, last_updated_on)
+
+    async def _evaluate_archive(self, owner: str, repo: str, commit_sha: str) -> dict[str, Any]:
+        """Evaluate the packaging files found at any depth of the repo from a single tarball download.
+
+        All the files of the archive carry the commit timestamp, so sources are told apart by their precedence only.
+        """
+
+        archive = await self._download_archive(owner, repo, commit_sha)
+        last_updated_on, packaging_files = await asyncio.to_thread(self._extract_packaging_files, archive)
+        return {
+            path: self._evaluate_packaging_file(path, file_text, last_updated_on)
+            for path, file_text in packaging_files.items()
+        }
+
+    async def _download_archive(self, owner: str, repo: str, commit_sha: str) -> bytes:
+        url = f'{self.api_url}/repos/{owner}/{repo}/tarball/{commit_sha}'
+        chunks = []
+        size = 0
+        request = self.http_client.build_request('GET', url, headers=self.headers)
+        started_at = tm.perf_counter()
+        try:
+            response = await self.http_client.send(request, stream=True, follow_redirects=True)
+        except httpx.TransportError:
+            self._record_call('archive', started_at)
+            raise
+        self._record_call('archive', started_at, response)
+
+        try:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > self.archive_max_size:
+                    raise ArchiveTooLargeError(f'Archive of "{owner}/{repo}" exceeds {self.archive_max_size} bytes')
+                chunks.append(chunk)
+        finally:
+            await response.aclose()
+        return b''.join(chunks)
+
+    @staticmethod
+    def _record_call(resource: str, started_at: float, response: httpx.Response | None = None) -> None:
+        """Record a GitHub call until its response headers, a missing response is a network error."""
+
+        GITHUB_API_DURATION.labels(resource=resource).observe(tm.perf_counter() - started_at)
+        GITHUB_API_CALLS.labels(
+            resource=resource, status='transport' if response is None else response.status_code
+        ).inc()
+        # Only the API calls are rate limited, the raw contents and the archives do not report it
+        if response is not None and (remaining := response.headers.get('X-RateLimit-Remaining')) is not None:
+            GITHUB_RATE_LIMIT_REMAINING.set(int(remaining))
+
+    def _extract_packaging_files(self, archive: bytes) -> tuple[str, dict[str, str]]:
+        # Like the parsers of the packaging files, imported on first use since most workers never validate a repo
+        import tarfile
+
+        packaging_files = {}
+        commit_time = 0
+        uncompressed_size = 0
+        with tarfile.open(fileobj=io.BytesIO(archive), mode='r|gz') as tar:
+            for member in tar:
+                # Skipped members are decompressed too, a small archive may expand to gigabytes
+                uncompressed_size += member.size
+                if uncompressed_size > self.archive_max_uncompressed_size:
+                    raise ArchiveTooLargeError(
+                        f'Archive expands to more than {self.archive_max_uncompressed_size} bytes'
+                    )
+                commit_time = max(commit_time, member.mtime)
+                # Members are prefixed with a `<owner>-<repo>-<sha>/` directory
+                path = member.name.partition('/')[2]
+                if not member.isfile() or path.rpartition('/')[2] not in PACKAGING_FILES:
+                    continue
+                if member.size > PACKAGING_FILE_MAX_SIZE:
+                    logger.info(f'Skipping "{path}" of {member.size} bytes, packaging files are expected to be small')
+                    continue
+                packaging_files[path] = tar.extractfile(member).read().decode(errors='replace')
+        last_updated_on = dt.datetime.fromtimestamp(commit_time, dt.UTC).strftime('%Y-%m-%dT%H:%M:%SZ')
+        return last_updated_on, packaging_files
+
+    def _evaluate_packaging_file(self, path: str, file_text: str, last_updated_on: str) -> dict[str, Any]:
+        filename = path.rpartition('/')[2]
+        evaluate = {
+            'pyproject.toml': self._evaluate_pyproject,
+            'setup.cfg': self._evaluate_setup_cfg,
+            'setup.py': self._evaluate_setup,
+            'requirements.txt': self._evaluate_requirements,
+        }[filename]
+        try:
+            eval_results = evaluate(file_text)
+        except Exception:
+            logger.warning(f'Evaluation of "{path}" failed', exc_info=True)
+            eval_results = {'is_valid': False}
+        eval_results['last_updated_on'] = last_updated_on
+        # Between sources updated at the same time, files closer to the root and earlier in PACKAGING_FILES win
+        eval_results['precedence'] = (-path.count('/'), -PACKAGING_FILES.index(filename))
+        return eval_results
+
+    async def _get_timestamp_of_last_update(self, owner: str, repo: str, commit_sha: str, filename: str) -> str:
+        url = f"{self.api_url}/repos/{owner}/{repo}/commits"
+        params = {'path': filename, 'sha': commit_sha, 'per_page': 1}
+        response = json.loads(await self._get(url, params))
+        timestamp_of_last_modification = response[0]['commit']['committer']['date']
         return timestamp_of_last_modification
 
-    def _evaluate_pyproject(self, file_info: dict[str, Any]) -> dict[str, Any]:
-        pyproject_response = requests.get(file_info['download_url'])
-        parsed_pyproject = toml.loads(pyproject_response.text)
+    def _evaluate_pyproject(self, pyproject_text: str) -> dict[str, Any]:
+        import toml
+
+        parsed_pyproject = toml.loads(pyproject_text)
         eval_results = {}
         if 'project' in parsed_pyproject.keys():
             if 'name' in parsed_pyproject['project'].keys():
@@ -83,9 +348,26 @@ class GitHubRepoValidator(RemoteRepoValidator):
             eval_results['is_valid'] = False
         return eval_results
 
-    def _evaluate_setup(self, setup_file_info: dict[str, Any]) -> dict[str, Any]:
-        setup_response = requests.get(setup_file_info['download_url'])
-        parsed_setup = self._parse_setup_response_text(setup_response.text)
+    def _evaluate_setup_cfg(self, setup_cfg_text: str) -> dict[str, Any]:
+        import configparser
+
+        parsed_setup_cfg = configparser.ConfigParser(interpolation=None)
+        parsed_setup_cfg.read_string(setup_cfg_text)
+        eval_results = {}
+        if parsed_setup_cfg.has_option('metadata', 'name'):
+            eval_results['is_valid'] = True
+            eval_results['package_name'] = parsed_setup_cfg.get('metadata', 'name')
+        else:
+            eval_results['is_valid'] = False
+        if parsed_setup_cfg.has_option('options', 'python_requires'):
+            eval_results['python_version'] = parsed_setup_cfg.get('options', 'python_requires')
+        if parsed_setup_cfg.has_option('options', 'install_requires'):
+            install_requires = parsed_setup_cfg.get('options', 'install_requires')
+            eval_results['dependencies'] = [line.strip() for line in install_requires.splitlines() if line.strip()]
+        return eval_results
+
+    def _evaluate_setup(self, setup_text: str) -> dict[str, Any]:
+        parsed_setup = self._parse_setup_response_text(setup_text)
         eval_results = {}
         if 'name' in parsed_setup.keys():
             eval_results['is_valid'] = True
@@ -107,9 +389,8 @@ class GitHubRepoValidator(RemoteRepoValidator):
             eval_results['dependencies'] = parsed_setup['install_requires']
         return eval_results
 
-    def _evaluate_requirements(self, requirements_file_info: dict[str, Any]) -> dict[str, Any]:
-        requirements_response = requests.get(requirements_file_info['download_url'])
-        parsed_requirements = requirements_response.text.splitlines()
+    def _evaluate_requirements(self, requirements_text: str) -> dict[str, Any]:
+        parsed_requirements = requirements_text.splitlines()
         eval_results = {}
         if len(parsed_requirements) > 0:
             eval_results['is_valid'] = True
@@ -164,7 +445,10 @@ class GitHubRepoValidator(RemoteRepoValidator):
         timestamps_of_valid_sources = {}
         for source in evaluation_results.keys():
             if (evaluation_results[source]['is_valid'] is True) & (key in evaluation_results[source].keys()):
-                timestamps_of_valid_sources[source] = evaluation_results[source]['last_updated_on']
+                timestamps_of_valid_sources[source] = (
+                    evaluation_results[source]['last_updated_on'],
+                    evaluation_results[source]['precedence'],
+                )
         if len(timestamps_of_valid_sources.keys()) > 0:
             key_of_most_recently_updated_valid_source = max(
                 timestamps_of_valid_sources, key=timestamps_of_valid_sources.get
@@ -180,22 +464,20 @@ class GitHubRepoValidator(RemoteRepoValidator):
 
 class ZenodoRepoValidator(RemoteRepoValidator):
 
-    def _assert_repo_url_is_valid(self, repo_url: str) -> None:
+    async def _assert_repo_url_is_valid(self, repo_url: str) -> None:
         raise NotImplementedError('The ZenodoRepoValidator has not been implemented yet.')
 
-    def _validate_repo_content(self, repo_url: str) -> dict[str, Any]:
+    async def _validate_repo_content(self, repo_url: str) -> dict[str, Any]:
         raise NotImplementedError('The ZenodoRepoValidator has not been implemented yet.')
 
 
 class RemoteRepoValidatorFactory:
 
-    @property
-    def _available_remote_repo_validators(self) -> dict[str, RemoteRepoValidator]:
-        available_validators = {
-            'https://github.com': GitHubRepoValidator(),
+    def __init__(self, github_repo_validator: GitHubRepoValidator) -> None:
+        self._available_remote_repo_validators: dict[str, RemoteRepoValidator] = {
+            'https://github.com': github_repo_validator,
             'https://zenodo.org': ZenodoRepoValidator(),
         }
-        return available_validators
 
     def get_remote_repo_validator(self, repo_url: str) -> RemoteRepoValidator | None:
         matching_validator = None
@@ -207,26 +489,96 @@ class RemoteRepoValidatorFactory:
 
 
 class RepoValidator:
+    """Validate repos, sharing a single validation between concurrent callers asking for the same URL.
+
+    With a `preflight`, a repo whose dependencies cannot be installed together may also be rejected.
+    """
 
-    def __init__(self) -> None:
-        self.repo_validator_factory = RemoteRepoValidatorFactory()
+    def __init__(
+        self, repo_validator_factory: RemoteRepoValidatorFactory, preflight: 'DependencyPreflight | None' = None
+    ) -> None:
+        self.repo_validator_factory = repo_validator_factory
+        self.preflight = preflight
+        self._in_flight: dict[str, asyncio.Future] = {}
 
-    def get_validation_results(self, repo_url: str) -> dict[str, Any] | None:
+    async def _run_validation_check(self, repo_url: str) -> dict[str, Any] | None:
         try:
             remote_repo_validator = self.repo_validator_factory.get_remote_repo_validator(repo_url)
-            validation_results = remote_repo_validator.run_validation_check(repo_url)
+            validation_results = await remote_repo_validator.run_validation_check(repo_url)
             assert validation_results['valid_repo'] is True
+            if self.preflight is not None and not await self.preflight.accepts(repo_url, validation_results):
+                return None
             return validation_results
         except Exception:
             logger.exception(f'Validation of "{repo_url}" failed')
 
         return None
 
-    def is_repo_valid(self, repo_url: str) -> bool:
-        validation_results = self.get_validation_results(repo_url)
+    async def get_validation_results(self, repo_url: str) -> dict[str, Any] | None:
+        future = self._in_flight.get(repo_url)
+        if future is None:
+            future = asyncio.ensure_future(self._run_validation_check(repo_url))
+            self._in_flight[repo_url] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(repo_url, None))
+
+        return await asyncio.shield(future)
+
+    def get_known_commit_sha(self, repo_url: str) -> str | None:
+        remote_repo_validator = self.repo_validator_factory.get_remote_repo_validator(repo_url)
+        if remote_repo_validator is None:
+            return None
+
+        try:
+            return remote_repo_validator.get_known_commit_sha(repo_url)
+        except ValueError:
+            return None
+
+    async def is_repo_valid(self, repo_url: str) -> bool:
+        validation_results = await self.get_validation_results(repo_url)
 
         return validation_results is not None
 
 
-def get_repo_validator() -> RepoValidator:
-    return RepoValidator()
+def create_validation_cache(settings: Settings) -> ValidationCache:
+    return ValidationCache(settings.github_cache_path, max_entries=settings.github_cache_size)
+
+
+def create_repo_validator(settings: Settings, http_client: httpx.AsyncClient, cache: ValidationCache) -> RepoValidator:
+    github_repo_validator = GitHubRepoValidator(
+        http_client,
+        cache,
+        api_url=settings.github_api_url,
+        api_token=settings.github_api_token,
+        fresh_ttl=settings.github_cache_fresh_ttl,
+        stale_ttl=settings.github_cache_stale_ttl,
+        validation_mode=settings.github_validation_mode,
+        archive_max_size=settings.github_archive_max_size,
+        archive_max_uncompressed_size=settings.github_archive_max_uncompressed_size,
+    )
+    repo_validator_factory = RemoteRepoValidatorFactory(github_repo_validator)
+
+    preflight = None
+    if settings.repo_preflight_mode != 'off':
+        # The resolver and its packaging dependencies are only loaded by the workers running the preflight
+        from cactus.components.repo.preflight import DependencyPreflight
+        from cactus.components.repo.preflight import PyPIPackageIndex
+        from cactus.components.repo.preflight import SnapshotPackageIndex
+
+        if settings.repo_preflight_snapshot_path is not None:
+            package_index = SnapshotPackageIndex(settings.repo_preflight_snapshot_path)
+        else:
+            package_index = PyPIPackageIndex(http_client, cache, url=settings.repo_preflight_index_url)
+        preflight = DependencyPreflight(
+            package_index,
+            mode=settings.repo_preflight_mode,
+            timeout=settings.repo_preflight_timeout,
+            cache_size=settings.repo_preflight_cache_size,
+            metadata_cache_size=settings.repo_preflight_metadata_cache_size,
+            cache_ttl=settings.repo_preflight_cache_ttl,
+        )
+
+    return RepoValidator(repo_validator_factory, preflight)
+
+
+def get_repo_validator(request: Request) -> RepoValidator:
+    return request.app.state.repo_validator
@@ -1,20 +1,45 @@
+import orjson
+from cactus.components.conditional import compute_etag
+from cactus.components.conditional import conditional_json_response
+from cactus.components.conditional import is_not_modified
+from cactus.components.conditional import not_modified_response
 from cactus.components.repo.validators import RepoValidator
 from cactus.components.repo.validators import get_repo_validator
 from fastapi import APIRouter
 from fastapi import Depends
+from fastapi import Request
 from fastapi.responses import JSONResponse
 
 router = APIRouter(prefix='/repos', tags=['Repos'])
 
+VALID_RESPONSE_CONTENT = orjson.dumps({'message': 'Valid'})
+
 
 @router.get('/validate/{repo_url:path}', summary='Validate repo dependencies.')
-def validate_repo(
+async def validate_repo(
     repo_url: str,
+    request: Request,
     repo_validator: RepoValidator = Depends(get_repo_validator),
 ):
-    """Validate that the repo includes all the required dependency information for the setup."""
+    """Validate that the repo includes all the required dependency information for the setup.
+
+    The ETag of a valid repo is derived from its URL and validated commit, a request whose `If-None-Match` header
+    matches the commit the repo is known to be at gets an empty 304 response without validating it again.
+    """
+
+    commit_sha = repo_validator.get_known_commit_sha(repo_url)
+    if commit_sha is not None and is_not_modified(request, get_validation_etag(repo_url, commit_sha)):
+        return not_modified_response(get_validation_etag(repo_url, commit_sha))
+
+    validation_results = await repo_validator.get_validation_results(repo_url)
+    if validation_results is None:
+        return JSONResponse(status_code=400, content={'message': 'Invalid'})
+
+    commit_sha = validation_results.get('commit_sha')
+    etag = None if commit_sha is None else get_validation_etag(repo_url, commit_sha)
+
+    return conditional_json_response(request, VALID_RESPONSE_CONTENT, etag=etag)
 
-    if repo_validator.is_repo_valid(repo_url):
-        return JSONResponse(status_code=200, content={'message': 'Valid'})
 
-    return JSONResponse(status_code=400, content={'message': 'Invalid'})
+def get_validation_etag(repo_url: str, commit_sha: str) -> str:
+    return compute_etag(f'{repo_url}@{commit_sha}'.encode())
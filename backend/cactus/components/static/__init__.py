@@ -0,0 +1,5 @@
+from cactus.components.static.files import PrecompressedStaticFiles
+
+__all__ = [
+    'PrecompressedStaticFiles',
+]
@@ -0,0 +1,141 @@
+"""Build the frontend for production.
+
+The local files referenced by the pages are published under a name carrying the hash of their content, so browsers can
+cache them forever, every file is also copied as it is, and every text file gets brotli and gzip variants next to it, so
+it is compressed once instead of on every request. The published names are listed in the manifest read by
+`PrecompressedStaticFiles`. The same layout can be served by a reverse proxy, e.g. with the `gzip_static` and
+`brotli_static` nginx modules.
+
+Run it with ``python -m cactus.components.static.build ../frontend /tmp/cactus-frontend``.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import shutil
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import brotli
+from cactus.components.static.files import ENCODING_SUFFIXES
+from cactus.components.static.files import MANIFEST_NAME
+from cactus.logger import logger
+
+# Attributes of the pages that may reference a local file, e.g. `<script src="./scripts.js">`
+REFERENCE_PATTERN = re.compile(r'(?P<attribute>\b(?:href|src))="(?P<url>[^"]+)"')
+
+COMPRESSIBLE_SUFFIXES = {'.html', '.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.ico'}
+
+# Smaller files do not gain anything from compression
+COMPRESSION_MIN_SIZE = 256
+
+
+def get_hashed_name(path: Path) -> str:
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+
+    return f'{path.stem}.{digest}{path.suffix}'
+
+
+def publish_page(source: Path, output: Path, page: Path, manifest: dict[str, str]) -> None:
+    """Publish the page with its references to local files pointing to their hashed copies."""
+
+    def replace_reference(match: re.Match) -> str:
+        url = urlsplit(match['url'])
+        if url.scheme or url.netloc or not url.path:
+            return match[0]
+
+        asset_path = (page.parent / url.path).resolve()
+        if not asset_path.is_file() or not asset_path.is_relative_to(source) or not url.path.endswith(asset_path.name):
+            return match[0]
+
+        name = asset_path.relative_to(source).as_posix()
+        if name not in manifest:
+            hashed_path = asset_path.with_name(get_hashed_name(asset_path)).relative_to(source)
+            (output / hashed_path).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(asset_path, output / hashed_path)
+            manifest[name] = hashed_path.as_posix()
+
+        hashed_name = manifest[name].rsplit('/', 1)[-1]
+        hashed_url = url._replace(path=url.path.removesuffix(asset_path.name) + hashed_name)
+
+        return f'{match["attribute"]}="{hashed_url.geturl()}"'
+
+    published_page = output / page.relative_to(source)
+    published_page.parent.mkdir(parents=True, exist_ok=True)
+    published_page.write_text(REFERENCE_PATTERN.sub(replace_reference, page.read_text()))
+
+
+def copy_unreferenced_files(source: Path, output: Path, pages: list[Path]) -> int:
+    """Copy every file of the sources but the pages as it is, return how many were copied.
+
+    Files the pages do not reference, e.g. the `/favicon.ico` browsers request by default, sourcemaps or files fetched
+    from scripts, keep being served under their name, revalidated like the pages. Referenced files are copied too, for
+    the requests not going through the pages.
+    """
+
+    output = output.resolve()
+
+    copied = 0
+    for path in source.rglob('*'):
+        if not path.is_file() or path in pages or path.is_relative_to(output):
+            continue
+
+        copied_path = output / path.relative_to(source)
+        copied_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, copied_path)
+        copied += 1
+
+    return copied
+
+
+def compress_files(output: Path) -> int:
+    """Write the brotli and gzip variants of the text files that compress, return how many were written."""
+
+    compressors = {
+        'br': lambda content: brotli.compress(content, quality=11),
+        'gzip': lambda content: gzip.compress(content, compresslevel=9, mtime=0),
+    }
+
+    variants = 0
+    for path in [path for path in output.rglob('*') if path.is_file()]:
+        if path.suffix not in COMPRESSIBLE_SUFFIXES or path.stat().st_size < COMPRESSION_MIN_SIZE:
+            continue
+
+        content = path.read_bytes()
+        for coding, compress in compressors.items():
+            compressed = compress(content)
+            if len(compressed) < len(content):
+                path.with_name(path.name + ENCODING_SUFFIXES[coding]).write_bytes(compressed)
+                variants += 1
+
+    return variants
+
+
+def build(source: Path, output: Path) -> None:
+    source = source.resolve()
+    output.mkdir(parents=True, exist_ok=True)
+
+    manifest: dict[str, str] = {}
+    pages = list(source.glob('*.html'))
+    for page in pages:
+        publish_page(source, output, page, manifest)
+
+    copied = copy_unreferenced_files(source, output, pages)
+    variants = compress_files(output)
+    (output / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+    logger.info(
+        f'Published {len(manifest)} hashed files, {copied} files as they are and {variants} compressed variants to '
+        f'"{output}"'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('source', type=Path, help='Frontend folder, with its npm dependencies installed')
+    parser.add_argument('output', type=Path, help='Folder served by the backend as `FRONTEND_FOLDER_PATH`')
+    args = parser.parse_args()
+
+    build(args.source, args.output)
@@ -0,0 +1,157 @@
+import json
+import os
+import re
+from dataclasses import dataclass
+from dataclasses import field
+from mimetypes import guess_type
+from pathlib import Path
+
+from cactus.components.conditional import is_not_modified
+from starlette.datastructures import URL
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import FileResponse
+from starlette.responses import RedirectResponse
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+# Lists the files published under a content-hashed name, as `{source name: published name}`
+MANIFEST_NAME = 'manifest.json'
+
+# Suffix of the precompressed variants per content coding, from the most to the least preferred
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+ACCEPT_ENCODING_ITEM_PATTERN = re.compile(r'\s*(?P<coding>[\w*-]+)\s*(?:;\s*q\s*=\s*(?P<quality>[\d.]+))?\s*')
+
+
+@dataclass
+class Representation:
+    path: Path
+    stat_result: os.stat_result
+    etag: str
+
+    @classmethod
+    def from_path(cls, path: Path) -> 'Representation':
+        stat_result = path.stat()
+
+        return cls(path, stat_result, f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"')
+
+
+@dataclass
+class StaticFile:
+    identity: Representation
+    media_type: str
+    cache_control: str
+    variants: dict[str, Representation] = field(default_factory=dict)
+
+    def negotiate(self, accept_encoding: str) -> tuple[str | None, Representation]:
+        """Return the preferred content coding accepted by the client and its representation."""
+
+        if self.variants:
+            accepted_codings = parse_accept_encoding(accept_encoding)
+            for coding, representation in self.variants.items():
+                if coding in accepted_codings:
+                    return coding, representation
+
+        return None, self.identity
+
+
+def parse_accept_encoding(accept_encoding: str) -> set[str]:
+    codings = set()
+    for item in accept_encoding.split(','):
+        match = ACCEPT_ENCODING_ITEM_PATTERN.fullmatch(item)
+        if match is None or (match['quality'] is not None and float(match['quality']) == 0):
+            continue
+        codings.add(match['coding'].lower())
+
+    return codings
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """Serve the built frontend from an index of its files made at startup, without looking files up per request.
+
+    Files are sent brotli or gzip compressed when the client accepts it and the build produced the variant, nothing is
+    compressed at request time. Files published under a content-hashed name are cached by browsers for a year, the
+    others, e.g. the pages referencing them, are revalidated with their ETag. Directories are served by their
+    `index.html`. A folder without a build manifest, e.g. the sources during development, is served by the plain
+    `StaticFiles`, which looks every file up per request, so edits show up without a restart.
+    """
+
+    def __init__(self, *, directory: Path) -> None:
+        super().__init__(directory=directory, html=True)
+        self.is_built = (Path(directory) / MANIFEST_NAME).is_file()
+        self.files, self.index_pages = self._index_files(Path(directory)) if self.is_built else ({}, {})
+
+    @staticmethod
+    def _index_files(directory: Path) -> tuple[dict[str, StaticFile], dict[str, StaticFile]]:
+        manifest_path = directory / MANIFEST_NAME
+        hashed_names = set(json.loads(manifest_path.read_text()).values())
+
+        files = {}
+        for path in directory.rglob('*'):
+            if not path.is_file() or path == manifest_path:
+                continue
+            if path.suffix in ENCODING_SUFFIXES.values() and path.with_suffix('').is_file():
+                continue
+
+            name = path.relative_to(directory).as_posix()
+            files[name] = StaticFile(
+                identity=Representation.from_path(path),
+                media_type=guess_type(path.name)[0] or 'text/plain',
+                cache_control=IMMUTABLE_CACHE_CONTROL if name in hashed_names else 'no-cache',
+                variants={
+                    coding: Representation.from_path(path.with_name(path.name + suffix))
+                    for coding, suffix in ENCODING_SUFFIXES.items()
+                    if path.with_name(path.name + suffix).is_file()
+                },
+            )
+
+        # Keyed like the normalized request paths, `.` for the root
+        index_pages = {
+            os.path.dirname(name) or '.': file
+            for name, file in files.items()
+            if name == 'index.html' or name.endswith('/index.html')
+        }
+
+        return files, index_pages
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if not self.is_built:
+            return await super().get_response(path, scope)
+
+        if scope['method'] not in ('GET', 'HEAD'):
+            raise HTTPException(status_code=405)
+
+        file = self.files.get(path)
+        if file is None and path in self.index_pages:
+            # Relative links of the page resolve against its directory only with the trailing slash
+            if not scope['path'].endswith('/'):
+                url = URL(scope=scope)
+                return RedirectResponse(url=url.replace(path=url.path + '/'))
+            file = self.index_pages[path]
+
+        if file is None:
+            raise HTTPException(status_code=404)
+
+        request = Request(scope)
+        coding, representation = file.negotiate(request.headers.get('Accept-Encoding', ''))
+
+        headers = {'ETag': representation.etag, 'Cache-Control': file.cache_control}
+        if file.variants:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if is_not_modified(request, representation.etag):
+            return Response(status_code=304, headers=headers)
+
+        if coding is not None:
+            headers['Content-Encoding'] = coding
+
+        return FileResponse(
+            representation.path,
+            headers=headers,
+            media_type=file.media_type,
+            stat_result=representation.stat_result,
+        )
@@ -0,0 +1,44 @@
+import asyncio
+from collections.abc import AsyncIterable
+from collections.abc import AsyncIterator
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+
+class EventStreamResponse(StreamingResponse):
+    """Stream the models from the passed iterable as Server-Sent Events.
+
+    A comment line is sent whenever nothing happened for `ping_interval` seconds, so idle connections are not closed
+    by proxies or client read timeouts.
+    """
+
+    media_type = 'text/event-stream'
+
+    def __init__(self, content: AsyncIterable[BaseModel], event: str, ping_interval: float = 15) -> None:
+        super().__init__(
+            self._format_events(content, event, ping_interval),
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+    @staticmethod
+    async def _format_events(content: AsyncIterable[BaseModel], event: str, ping_interval: float) -> AsyncIterator[str]:
+        iterator = aiter(content)
+        next_model = asyncio.ensure_future(anext(iterator))
+
+        try:
+            while True:
+                done, _ = await asyncio.wait({next_model}, timeout=ping_interval)
+                if not done:
+                    yield ': ping\n\n'
+                    continue
+
+                try:
+                    model = next_model.result()
+                except StopAsyncIteration:
+                    return
+
+                yield f'event: {event}\ndata: {model.model_dump_json(by_alias=True)}\n\n'
+                next_model = asyncio.ensure_future(anext(iterator))
+        finally:
+            next_model.cancel()
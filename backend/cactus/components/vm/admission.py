@@ -0,0 +1,202 @@
+import asyncio
+import math
+import time as tm
+from collections import OrderedDict
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Literal
+
+from cactus.components.cloud.batch import RateLimiter
+from cactus.metrics import ADMISSION_IN_FLIGHT
+from cactus.metrics import ADMISSION_QUEUE_DEPTH
+from cactus.metrics import ADMISSION_REJECTED
+from cactus.metrics import ADMISSION_WAIT_DURATION
+from fastapi import HTTPException
+from fastapi import Request
+
+# Weight of the last request in the moving average of the processing time used to estimate the waits
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class AdmissionRejectedError(Exception):
+    def __init__(
+        self,
+        message: str,
+        *,
+        reason: Literal['queue_full', 'client_queue_full', 'timeout'],
+        retry_after: float,
+    ) -> None:
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bound the number of VM creation requests processed at once and share the capacity fairly between the clients.
+
+    At most `concurrency` requests are processed at once, starting at most `rate` per second, so bursts stay within
+    the cloud API rate limit. Requests over that wait in a queue per client, and a freed slot goes to the clients in
+    turn, so a client queueing many requests does not delay the others. A request is rejected, with an estimate of
+    when to retry, when `queue_size` requests or `client_queue_size` requests of its client are already waiting, or
+    when it waited more than `max_wait` seconds.
+    """
+
+    def __init__(
+        self,
+        *,
+        concurrency: int,
+        rate: float,
+        queue_size: int,
+        client_queue_size: int,
+        max_wait: float,
+    ) -> None:
+        self.concurrency = concurrency
+        self.rate = rate
+        self.queue_size = queue_size
+        self.client_queue_size = client_queue_size
+        self.max_wait = max_wait
+
+        self.in_flight = 0
+        self.queued = 0
+        # Waiting requests per client, in the order the clients are served
+        self._queues: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+        self._rate_limiter = RateLimiter(rate)
+        self._service_time = 1 / rate
+
+    def estimate_wait(self, position: int) -> float:
+        """Estimate the seconds until the request at `position` in the queue is admitted."""
+
+        throughput = min(self.rate, self.concurrency / self._service_time)
+
+        return self._rate_limiter.delay + position / throughput
+
+    def back_off(self, delay: float | None) -> None:
+        """Hold the next admissions back after the cloud API rate limit was hit."""
+
+        self._rate_limiter.pause(delay or 1 / self.rate)
+
+    async def acquire(self, client_id: str) -> None:
+        started_at = tm.monotonic()
+        if self.in_flight < self.concurrency and not self.queued:
+            self.in_flight += 1
+        else:
+            await self._wait(client_id)
+        ADMISSION_WAIT_DURATION.observe(tm.monotonic() - started_at)
+        ADMISSION_IN_FLIGHT.set(self.in_flight)
+
+        try:
+            await self._rate_limiter.acquire()
+        except BaseException:
+            self.release()
+            raise
+
+    async def _wait(self, client_id: str) -> None:
+        client_queue = self._queues.get(client_id, ())
+        if self.queued >= self.queue_size:
+            self._reject('The VM creation queue is full', reason='queue_full', position=self.queued)
+        if len(client_queue) >= self.client_queue_size:
+            self._reject(
+                'Too many VM creation requests of this client are waiting',
+                reason='client_queue_full',
+                position=self.queued,
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(client_id, deque()).append(future)
+        self.queued += 1
+        ADMISSION_QUEUE_DEPTH.set(self.queued)
+
+        try:
+            async with asyncio.timeout(self.max_wait):
+                await future
+        except BaseException as error:
+            if future.done() and not future.cancelled():
+                # The slot was handed over as the wait ended, pass it on
+                self.release()
+            else:
+                future.cancel()
+                self._dequeue(client_id, future)
+            if isinstance(error, TimeoutError):
+                self._reject(
+                    f'The VM creation request waited more than {self.max_wait} seconds',
+                    reason='timeout',
+                    position=self.queued,
+                )
+            raise
+
+    def _dequeue(self, client_id: str, future: asyncio.Future) -> None:
+        client_queue = self._queues.get(client_id)
+        if client_queue is None or future not in client_queue:
+            return
+
+        client_queue.remove(future)
+        if not client_queue:
+            del self._queues[client_id]
+        self.queued -= 1
+        ADMISSION_QUEUE_DEPTH.set(self.queued)
+
+    def _reject(self, message: str, *, reason: str, position: int) -> None:
+        ADMISSION_REJECTED.labels(reason=reason).inc()
+
+        raise AdmissionRejectedError(message, reason=reason, retry_after=self.estimate_wait(position + 1))
+
+    def release(self) -> None:
+        """Free the slot of a finished request, handing it over to the next client in turn if any is waiting."""
+
+        while self._queues:
+            client_id, client_queue = next(iter(self._queues.items()))
+            future = client_queue.popleft()
+            self.queued -= 1
+            if client_queue:
+                self._queues.move_to_end(client_id)
+            else:
+                del self._queues[client_id]
+            ADMISSION_QUEUE_DEPTH.set(self.queued)
+
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight)
+
+    def record_service_time(self, service_time: float) -> None:
+        self._service_time += SERVICE_TIME_SMOOTHING * (service_time - self._service_time)
+
+
+def get_client_id(request: Request) -> str:
+    """Identify the client by its address for the fair share.
+
+    Credential headers are not verified by this service, a client rotating them would get a fresh share with every
+    request. Behind a reverse proxy, uvicorn takes the address from its `X-Forwarded-For` header.
+    """
+
+    return f'address:{request.client.host if request.client else "unknown"}'
+
+
+def get_admission_controller(request: Request) -> AdmissionController:
+    return request.app.state.admission_controller
+
+
+@asynccontextmanager
+async def admit_vm_creation(request: Request) -> AsyncIterator[None]:
+    """Hold an admission slot while the block runs, reject the request with a 429 if none frees up in time.
+
+    Views enter it once their body was validated, so requests failing with a 422 never take a slot.
+    """
+
+    admission_controller = get_admission_controller(request)
+    try:
+        await admission_controller.acquire(get_client_id(request))
+    except AdmissionRejectedError as error:
+        raise HTTPException(
+            status_code=429, detail=str(error), headers={'Retry-After': str(max(math.ceil(error.retry_after), 1))}
+        )
+
+    started_at = tm.monotonic()
+    try:
+        yield
+    finally:
+        admission_controller.record_service_time(tm.monotonic() - started_at)
+        admission_controller.release()
@@ -1,8 +1,13 @@
 from typing import Any
+from uuid import UUID
 
+from cactus.components.cloud.models import Instance
 from cactus.components.cloud.models import InstanceType
+from cactus.components.cloud.models import Job
 from cactus.components.schemas import BaseSchema
+from pydantic import Field
 from pydantic import HttpUrl
+from pydantic import conint
 from pydantic import conlist
 from pydantic import field_validator
 from pydantic import model_validator
@@ -53,6 +58,67 @@ class InstanceCreateSchema(BaseSchema):
 
         return self
 
+    @classmethod
+    def from_pool_key(cls, pool_key: str) -> 'InstanceCreateSchema':
+        size, _, python_envs = pool_key.partition(':')
+        return cls(size=size, python_envs=python_envs.split(','))
+
+    @property
+    def pool_key(self) -> str | None:
+        """Identify the warm pool able to serve the request as `<size>:<env>,<env>`, VMs with repos are never pooled."""
+
+        if self.repo_urls is not None:
+            return None
+
+        return f'{self.size}:{",".join(sorted(env["UNIQUE_ENV_NAME"] for env in self.python_envs))}'
+
+
+class InstanceListQuerySchema(BaseSchema):
+    label: list[str] = Field(default=[], description='Only list the VMs with all these `key=value` labels.')
+    fields: list[str] | None = Field(default=None, description='Comma separated fields to return, all by default.')
+    offset: conint(ge=0) = 0
+    limit: conint(ge=1, le=1000) | None = None
+
+    @field_validator('label')
+    @classmethod
+    def validate_label(cls, values: list[str]) -> list[str]:
+        for value in values:
+            if '=' not in value:
+                raise ValueError(f'"{value}" is not a `key=value` label')
+
+        return values
+
+    @field_validator('fields', mode='before')
+    @classmethod
+    def validate_fields(cls, values: list[str] | None) -> list[str] | None:
+        if values is None:
+            return None
+
+        fields = [field for value in values for field in value.split(',') if field]
+        for field in fields:
+            if field not in Instance.model_fields:
+                raise ValueError(f'"{field}" is not a VM field')
+
+        return fields
+
+    @property
+    def labels(self) -> dict[str, str]:
+        return dict(value.split('=', 1) for value in self.label)
+
+
+class InstanceBatchCreateSchema(InstanceCreateSchema):
+    count: conint(ge=1, le=100)
+
+
+class InstanceBatchDeleteSchema(BaseSchema):
+    instance_ids: conlist(UUID, min_length=1, max_length=100)
+
 
 class InstanceStatusResponseSchema(BaseSchema):
     jhub: str
+
+
+class BatchItemResponseSchema(BaseSchema):
+    instance_id: UUID | None = None
+    job: Job | None = None
+    error: str | None = None
@@ -1,11 +1,39 @@
+import math
+from functools import partial
+from typing import Annotated
 from uuid import UUID
 
+from cactus.components.cloud.batch import BatchExecutor
+from cactus.components.cloud.batch import get_batch_executor
 from cactus.components.cloud.clients import CloudClient
 from cactus.components.cloud.clients import get_cloud_client
+from cactus.components.cloud.events import EventBroker
+from cactus.components.cloud.events import get_event_broker
+from cactus.components.cloud.exoscale import ExoscaleAPIRateLimitException
+from cactus.components.cloud.jobs import JobScheduler
+from cactus.components.cloud.jobs import get_job_scheduler
+from cactus.components.cloud.models import INSTANCE_LIST_ADAPTER
+from cactus.components.cloud.models import Job
+from cactus.components.cloud.models import Operation
+from cactus.components.cloud.pool import WarmPool
+from cactus.components.cloud.pool import get_warm_pool
+from cactus.components.cloud.readiness import ReadinessTracker
+from cactus.components.cloud.readiness import get_readiness_tracker
+from cactus.components.conditional import conditional_json_response
+from cactus.components.streaming import EventStreamResponse
+from cactus.components.vm.admission import AdmissionController
+from cactus.components.vm.admission import admit_vm_creation
+from cactus.components.vm.admission import get_admission_controller
+from cactus.components.vm.schemas import BatchItemResponseSchema
+from cactus.components.vm.schemas import InstanceBatchCreateSchema
+from cactus.components.vm.schemas import InstanceBatchDeleteSchema
 from cactus.components.vm.schemas import InstanceCreateSchema
+from cactus.components.vm.schemas import InstanceListQuerySchema
 from cactus.components.vm.schemas import InstanceStatusResponseSchema
 from fastapi import APIRouter
 from fastapi import Depends
+from fastapi import HTTPException
+from fastapi import Query
 from fastapi import Request
 from fastapi.responses import RedirectResponse
 from fastapi.responses import Response
@@ -14,65 +42,233 @@ router = APIRouter(prefix='/vms', tags=['VMs'])
 
 
 @router.get('/', summary='List all the VMs.')
-def list_vms(
+async def list_vms(
+    request: Request,
+    query: Annotated[InstanceListQuerySchema, Query()],
     cloud_client: CloudClient = Depends(get_cloud_client),
 ):
-    """List all the VMs."""
+    """List the VMs sorted by name, filtered by labels, paginated with `offset` and `limit` and projected to `fields`.
+
+    The total number of matching VMs is returned in the `X-Total-Count` header. The listing is tagged with an ETag,
+    a request whose `If-None-Match` header matches it gets an empty 304 response.
+    """
+
+    instances = sorted(
+        await cloud_client.list_instances(query.labels), key=lambda instance: (instance.name, instance.id)
+    )
+    total_count = len(instances)
+
+    end = None if query.limit is None else query.offset + query.limit
+    include = None if query.fields is None else {'__all__': set(query.fields)}
+    content = INSTANCE_LIST_ADAPTER.dump_json(instances[query.offset : end], include=include, by_alias=True)
 
-    return cloud_client.list_instances()
+    return conditional_json_response(request, content, headers={'X-Total-Count': str(total_count)})
 
 
-@router.post('/', summary='Create a VM.')
-def create_vm(
+@router.post(
+    '/',
+    summary='Create a VM.',
+    status_code=202,
+    response_model=Job,
+)
+async def create_vm(
     body: InstanceCreateSchema,
+    request: Request,
     cloud_client: CloudClient = Depends(get_cloud_client),
+    job_scheduler: JobScheduler = Depends(get_job_scheduler),
+    warm_pool: WarmPool = Depends(get_warm_pool),
+    admission_controller: AdmissionController = Depends(get_admission_controller),
+):
+    """Claim a matching warm pool VM or start the VM creation, and return the job tracking it.
+
+    Creations beyond the admission limits are queued, fairly between the clients, and rejected with a 429 and a
+    `Retry-After` header when the queue is full or the wait too long.
+    """
+
+    async with admit_vm_creation(request):
+        operation = await warm_pool.claim(body)
+        if operation is None:
+            try:
+                operation = await cloud_client.create_instance(body)
+            except ValueError as error:
+                raise HTTPException(status_code=400, detail=str(error))
+            except ExoscaleAPIRateLimitException as error:
+                admission_controller.back_off(error.retry_after)
+                raise HTTPException(
+                    status_code=429,
+                    detail='The cloud API rate limit was hit',
+                    headers={'Retry-After': str(math.ceil(error.retry_after or 1))},
+                )
+
+        return job_scheduler.submit(operation)
+
+
+@router.post(
+    '/batch',
+    summary='Create many VMs.',
+    status_code=202,
+    response_model=list[BatchItemResponseSchema],
+)
+async def create_vms_batch(
+    body: InstanceBatchCreateSchema,
+    request: Request,
+    cloud_client: CloudClient = Depends(get_cloud_client),
+    job_scheduler: JobScheduler = Depends(get_job_scheduler),
+    warm_pool: WarmPool = Depends(get_warm_pool),
+    batch_executor: BatchExecutor = Depends(get_batch_executor),
+):
+    """Start the creation of `count` identical VMs and return the job tracking each of them or the reason it failed."""
+
+    async def create_instance() -> Operation:
+        operation = await warm_pool.claim(body)
+        if operation is None:
+            operation = await cloud_client.create_instance(body, repos=repos)
+        return operation
+
+    async with admit_vm_creation(request):
+        try:
+            repos = await cloud_client.validate_repos(body.repo_urls or [])
+        except ValueError as error:
+            raise HTTPException(status_code=400, detail=str(error))
+
+        results = await batch_executor.run([create_instance] * body.count)
+
+    return [
+        (
+            BatchItemResponseSchema(instance_id=result.reference_id, job=job_scheduler.submit(result))
+            if isinstance(result, Operation)
+            else BatchItemResponseSchema(error=repr(result))
+        )
+        for result in results
+    ]
+
+
+@router.delete(
+    '/batch',
+    summary='Delete many VMs.',
+    status_code=202,
+    response_model=list[BatchItemResponseSchema],
+)
+async def delete_vms_batch(
+    body: InstanceBatchDeleteSchema,
+    cloud_client: CloudClient = Depends(get_cloud_client),
+    job_scheduler: JobScheduler = Depends(get_job_scheduler),
+    batch_executor: BatchExecutor = Depends(get_batch_executor),
+):
+    """Start the deletion of the VMs and return the job tracking each of them or the reason it failed."""
+
+    results = await batch_executor.run(
+        [partial(cloud_client.start_instance_deletion, instance_id) for instance_id in body.instance_ids]
+    )
+
+    return [
+        (
+            BatchItemResponseSchema(instance_id=instance_id, job=job_scheduler.submit(result, fetch_instance=False))
+            if isinstance(result, Operation)
+            else BatchItemResponseSchema(instance_id=instance_id, error=repr(result))
+        )
+        for instance_id, result in zip(body.instance_ids, results, strict=True)
+    ]
+
+
+@router.get('/jobs/{job_id}', summary='Get the VM creation job.', response_model=Job)
+async def get_job(
+    job_id: UUID,
+    job_scheduler: JobScheduler = Depends(get_job_scheduler),
+):
+    """Get the VM creation job."""
+
+    job = await job_scheduler.get_job(job_id)
+
+    if not job:
+        raise HTTPException(status_code=404)
+
+    return job
+
+
+@router.get('/jobs/{job_id}/events', summary='Stream the progress of the VM creation job.')
+async def stream_job_events(
+    job_id: UUID,
+    job_scheduler: JobScheduler = Depends(get_job_scheduler),
 ):
-    """Create a VM."""
+    """Stream the VM creation job as Server-Sent Events until it is finished."""
+
+    if not await job_scheduler.get_job(job_id):
+        raise HTTPException(status_code=404)
 
-    return cloud_client.create_instance(body)
+    return EventStreamResponse(job_scheduler.watch(job_id), event='job')
+
+
+@router.get(
+    '/status',
+    summary='Get the status of services on all the VMs.',
+    response_model=dict[UUID, InstanceStatusResponseSchema],
+)
+async def get_vms_services_status(
+    readiness_tracker: ReadinessTracker = Depends(get_readiness_tracker),
+):
+    """Get the last known status of services on all the VMs."""
+
+    return {
+        instance_id: InstanceStatusResponseSchema(jhub=status)
+        for instance_id, status in readiness_tracker.statuses.items()
+    }
+
+
+@router.get('/events', summary='Stream the lifecycle events of the VMs.')
+def stream_vms_events(
+    event_broker: EventBroker = Depends(get_event_broker),
+    readiness_tracker: ReadinessTracker = Depends(get_readiness_tracker),
+):
+    """Stream the current state of every VM followed by its lifecycle changes as Server-Sent Events."""
+
+    return EventStreamResponse(event_broker.subscribe(readiness_tracker.snapshot()), event='instance')
 
 
 @router.get('/{instance_id}', summary='Get the VM.')
-def get_vm(
+async def get_vm(
     instance_id: UUID,
+    request: Request,
     cloud_client: CloudClient = Depends(get_cloud_client),
 ):
-    """Get the VM."""
+    """Get the VM, or an empty 304 response if the `If-None-Match` header matches its ETag."""
 
-    return cloud_client.get_instance(instance_id)
+    instance = await cloud_client.get_instance(instance_id)
+
+    return conditional_json_response(request, instance.model_dump_json(by_alias=True).encode())
 
 
 @router.get('/{instance_id}/status', summary='Get the status of services on the VM.')
-def get_vm_services_status(
+async def get_vm_services_status(
     instance_id: UUID,
-    cloud_client: CloudClient = Depends(get_cloud_client),
+    readiness_tracker: ReadinessTracker = Depends(get_readiness_tracker),
 ):
     """Get the status of services on the VM."""
 
-    status = cloud_client.get_instance_status(instance_id)
+    status = await readiness_tracker.get_status(instance_id)
 
     return InstanceStatusResponseSchema(jhub=status)
 
 
 @router.delete('/{instance_id}', summary='Delete the VM.')
-def delete_vm(
+async def delete_vm(
     instance_id: UUID,
     cloud_client: CloudClient = Depends(get_cloud_client),
 ):
     """Delete the VM."""
 
-    return cloud_client.delete_instance(instance_id)
+    return await cloud_client.delete_instance(instance_id)
 
 
 @router.get('/oauth/{redirect_id}', summary='OAuth callback.')
-def oauth_callback(
+async def oauth_callback(
     redirect_id: UUID,
     request: Request,
     cloud_client: CloudClient = Depends(get_cloud_client),
 ):
     """OAuth callback."""
 
-    instance = cloud_client.find_instance(redirect_id)
+    instance = await cloud_client.find_instance(redirect_id)
 
     if not instance:
         return Response(status_code=404)
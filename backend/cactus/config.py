@@ -1,6 +1,8 @@
 import logging
+import tempfile
 from functools import lru_cache
 from pathlib import Path
+from typing import Literal
 from uuid import UUID
 
 from pydantic import DirectoryPath
@@ -18,17 +20,97 @@ class Settings(BaseSettings):
     reload: bool = False
     logging_level: int = logging.INFO
 
+    # `simulator` runs the VM lifecycle in memory, for load and concurrency testing
+    cloud_provider: Literal['exoscale', 'simulator'] = 'exoscale'
     cloud_api_key: str = 'EXO...'
     cloud_api_secret: str = 'PJt...'
     cloud_zone: str = 'de-fra-1'
+    # Zones to spread the VMs over, only `cloud_zone` if empty
+    cloud_zones: list[str] = []
+    cloud_zone_failure_cooldown: float = 300
+    cloud_api_url: str | None = None
+    # Per-zone overrides of `cloud_api_url`, e.g. `{"de-fra-1": "http://127.0.0.1:9992/v2"}`
+    cloud_api_urls: dict[str, str] = {}
     cloud_template_id: UUID = UUID(int=0)
+    # Per-zone overrides of `cloud_template_id`, templates are registered in every zone under a different ID
+    cloud_template_ids: dict[str, UUID] = {}
     cloud_security_group_id: UUID = UUID(int=0)
     cloud_host_url: str = 'https://example.com'
+    cloud_inventory_ttl: float = 5
+    cloud_simulator_api_latency: float = 0.05
+    cloud_simulator_operation_latency: float = 5
+    cloud_simulator_error_rate: float = 0
+    cloud_simulator_operation_failure_rate: float = 0
+    cloud_simulator_public_ip: str = '127.0.0.1'
 
     jhub_port: int = 8080
+    jhub_probe_timeout: float = 5
+    jhub_probe_interval: float = 5
+
+    http_timeout: float = 10
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+
+    operation_poll_initial_interval: float = 1
+    operation_poll_max_interval: float = 15
+    operation_poll_backoff_factor: float = 1.5
+    operation_poll_jitter: float = 0.2
+
+    job_timeout: int = 300
+    job_retention: int = 3600
+
+    event_queue_size: int = 100
+
+    batch_concurrency: int = 10
+    batch_rate_limit: float = 10
+
+    # VM creation requests processed at once and started per second, kept under the cloud API rate limit. Waiting
+    # requests are queued per client address, see `get_client_id`
+    admission_concurrency: int = 10
+    admission_rate_limit: float = 5
+    admission_queue_size: int = 100
+    admission_client_queue_size: int = 10
+    admission_max_wait: float = 30
+
+    # Number of unassigned VMs to keep per `<size>:<env>,<env>` key, e.g. `{"small:sklearn": 2}`
+    warm_pool_targets: dict[str, int] = {}
+    warm_pool_refill_interval: float = 30
+    warm_pool_refill_batch_size: int = 2
+
+    # SQLite database through which the workers claim pool VMs and elect the one refilling the pool
+    coordination_path: Path = Path(tempfile.gettempdir()) / 'cactus' / 'coordination.sqlite3'
+    # Directory where the workers share their metrics when there are several, emptied on startup
+    metrics_path: Path = Path(tempfile.gettempdir()) / 'cactus' / 'metrics'
 
     github_oauth_client_id: str = ''
     github_oauth_client_secret: str = ''
+    github_api_url: str = 'https://api.github.com'
+    github_api_token: str = ''
+    github_validation_mode: Literal['archive', 'contents'] = 'archive'
+    github_archive_max_size: int = 50 * 1024 * 1024
+    github_archive_max_uncompressed_size: int = 200 * 1024 * 1024
+    github_cache_path: Path = Path(tempfile.gettempdir()) / 'cactus' / 'github-cache.sqlite3'
+    github_cache_size: int = 1024
+    github_cache_fresh_ttl: float = 60
+    github_cache_stale_ttl: float = 86400
+
+    # Check that the dependencies of a repo resolve before booting a VM, `warn` only logs the repos that do not from a
+    # background check, `reject` makes the validation wait for the resolution, see `DependencyPreflight`
+    repo_preflight_mode: Literal['off', 'warn', 'reject'] = 'off'
+    repo_preflight_index_url: str = 'https://pypi.org/pypi'
+    # Local JSON snapshot of the package metadata used instead of the index, see `SnapshotPackageIndex`
+    repo_preflight_snapshot_path: Path | None = None
+    repo_preflight_timeout: float = 30
+    repo_preflight_cache_size: int = 1024
+    repo_preflight_metadata_cache_size: int = 10000
+    repo_preflight_cache_ttl: float = 3600
+
+    artifact_store_path: Path = Path(tempfile.gettempdir()) / 'cactus' / 'artifacts'
+    artifact_secret: str = ''
+    artifact_max_size: int = 4 * 1024 * 1024 * 1024
+    # Environments missing from the store are built on dedicated VMs, deleted once done or after the timeout
+    artifact_build_interval: float = 60
+    artifact_build_timeout: float = 3600
 
     path_hash: str = '/path-hash'
     frontend_folder_path: DirectoryPath = Field(default_factory=lambda: Path(__file__).parents[2] / 'frontend')
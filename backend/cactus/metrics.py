@@ -0,0 +1,196 @@
+import os
+import shutil
+import time as tm
+from pathlib import Path
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client import CollectorRegistry
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from prometheus_client import Histogram
+from prometheus_client import generate_latest
+from prometheus_client import multiprocess
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+# Directory where the workers write their metrics when the application runs several, read by `prometheus_client`
+MULTIPROCESS_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+HTTP_REQUEST_DURATION = Histogram(
+    'cactus_http_request_duration_seconds',
+    'Time from the reception of the request until the response headers are sent.',
+    ['method', 'route', 'status'],
+)
+CLOUD_API_DURATION = Histogram(
+    'cactus_cloud_api_duration_seconds',
+    'Latency of the cloud API calls.',
+    ['operation', 'zone'],
+)
+CLOUD_API_ERRORS = Counter(
+    'cactus_cloud_api_errors_total',
+    'Number of failed cloud API calls, by HTTP status or `transport` for network errors.',
+    ['operation', 'zone', 'error'],
+)
+
+CLOUD_OPERATION_DURATION = Histogram(
+    'cactus_cloud_operation_duration_seconds',
+    'Time from the start of the wait until the cloud operation finished.',
+    ['state'],
+    buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300),
+)
+CLOUD_OPERATION_POLLS = Histogram(
+    'cactus_cloud_operation_polls',
+    'Number of polls until the cloud operation finished.',
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34),
+)
+CLOUD_RATE_LIMITED = Counter(
+    'cactus_cloud_rate_limited_total',
+    'Number of cloud API calls rejected by the rate limit.',
+)
+CLOUD_ZONE_LISTING_FAILURES = Counter(
+    'cactus_cloud_zone_listing_failures_total',
+    'Number of instance listings that left out a zone because it failed to answer.',
+    ['zone'],
+)
+
+GITHUB_API_DURATION = Histogram(
+    'cactus_github_api_duration_seconds',
+    'Latency of the GitHub calls until the response headers are received.',
+    ['resource'],
+)
+GITHUB_API_CALLS = Counter(
+    'cactus_github_api_calls_total',
+    'Number of GitHub calls, by HTTP status or `transport` for network errors.',
+    ['resource', 'status'],
+)
+GITHUB_RATE_LIMIT_REMAINING = Gauge(
+    'cactus_github_rate_limit_remaining',
+    'Number of GitHub API calls left in the current rate limit window.',
+    multiprocess_mode='mostrecent',
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    'cactus_admission_queue_depth',
+    'Number of VM creation requests waiting for admission.',
+    multiprocess_mode='livesum',
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    'cactus_admission_in_flight',
+    'Number of admitted VM creation requests being processed.',
+    multiprocess_mode='livesum',
+)
+ADMISSION_WAIT_DURATION = Histogram(
+    'cactus_admission_wait_duration_seconds',
+    'Time the admitted VM creation requests waited in the queue.',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+ADMISSION_REJECTED = Counter(
+    'cactus_admission_rejected_total',
+    'Number of VM creation requests rejected with a 429, by reason.',
+    ['reason'],
+)
+REPO_PREFLIGHTS = Counter(
+    'cactus_repo_preflights_total',
+    'Number of dependency resolutions of repos, by outcome.',
+    ['status'],
+)
+REPO_PREFLIGHT_DURATION = Histogram(
+    'cactus_repo_preflight_duration_seconds',
+    'Time spent resolving the dependencies of a repo.',
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+JHUB_PROBES = Counter(
+    'cactus_jhub_probes_total',
+    'Number of JupyterHub probes, by outcome.',
+    ['status'],
+)
+VM_TIME_TO_READY = Histogram(
+    'cactus_vm_time_to_ready_seconds',
+    'Time from the VM creation or warm pool claim until JupyterHub first answered.',
+    ['source'],
+    buckets=(5, 10, 30, 60, 120, 180, 300, 450, 600, 900, 1200, 1800),
+)
+
+router = APIRouter(tags=['Metrics'])
+
+
+@router.get('/metrics', summary='Export the Prometheus metrics.', include_in_schema=False)
+def get_metrics():
+    """Export the Prometheus metrics of the process, or of all the workers when there are several."""
+
+    if MULTIPROCESS_DIR_ENV not in os.environ:
+        return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def setup_multiprocess_metrics(path: Path) -> None:
+    """Make the workers started from now on share their metrics through files in the directory.
+
+    Must run before the workers import `prometheus_client`, the files of a previous run are removed so its counters do
+    not add up with the new ones.
+    """
+
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+    os.environ[MULTIPROCESS_DIR_ENV] = str(path)
+
+
+def mark_worker_dead() -> None:
+    """Drop the live gauges of the worker from the shared metrics once it stops."""
+
+    if MULTIPROCESS_DIR_ENV in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class TimingMiddleware:
+    """Record the latency of every HTTP request per route template, so the label cardinality stays bounded.
+
+    The latency ends when the response headers are sent, streamed responses are not measured until their end.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started_at = tm.perf_counter()
+        responded = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal responded
+            if message['type'] == 'http.response.start':
+                responded = True
+                self._observe(scope, message['status'], started_at)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not responded:
+                self._observe(scope, 500, started_at)
+            raise
+
+    @staticmethod
+    def _observe(scope: Scope, status: int, started_at: float) -> None:
+        if (route := scope.get('route')) is not None:
+            route_path = route.path
+        elif 'endpoint' in scope:
+            # Mounted applications, such as the static files, are labelled with their mount path
+            route_path = f'{scope["root_path"]}/*'
+        else:
+            route_path = 'unmatched'
+
+        HTTP_REQUEST_DURATION.labels(method=scope['method'], route=route_path, status=status).observe(
+            tm.perf_counter() - started_at
+        )
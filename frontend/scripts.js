@@ -42,39 +42,48 @@ const createDeleteButton = (instanceID) => {
     return deleteButton;
 };
 
-const checkInstanceStatus = (instanceID) => {
-    let url = BASE_URL + 'vms/' + instanceID + '/status';
+const instanceStatuses = {};
 
-    return fetch(url, {
-        method: 'GET',
-        headers: {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-        },
-    })
-        .then(response => response.json())
-        .then(response => {
-            return response.jhub
-        })
-        .catch(error => console.error('Error:', error));
+const updateInstanceRow = (instance) => {
+    let col = document.getElementById(instance.id);
+    let status = instanceStatuses[instance.id];
+
+    if (!col) {
+        return;
+    }
+
+    if (status === 'ready') {
+        col.replaceChildren(...[createLink(`${instance.public_ip}:8080`)]);
+    } else if (status === 'error') {
+        col.replaceChildren(...[createText('Error ❌')]);
+    }
 };
 
-const instanceReady = (instance) => {
-    let ready = checkInstanceStatus(instance.id);
+const handleInstanceEvent = (event) => {
+    let data = JSON.parse(event.data);
+    let instance = data.instance;
     let col = document.getElementById(instance.id);
 
-    ready.then(isReady => {
-        if (isReady === 'ready') {
-            col.replaceChildren(...[createLink(`${instance.public_ip}:8080`)]);
-        } else if (isReady === 'error') {
-            col.replaceChildren(...[createText('Error ❌')]);
-        } else {
-            setTimeout(() => {
-                instanceReady(instance);
-            }, 5000);
-        }
-    });
+    if (data.type === 'deleted') {
+        delete instanceStatuses[instance.id];
+        col ? col.parentElement.remove() : null;
+        return;
+    }
+
+    if (data.type !== 'created') {
+        instanceStatuses[instance.id] = data.type;
+    }
+
+    if (!col) {
+        let table = document.getElementById('instancesTable');
+        table.appendChild(createInstanceRow(instance));
+    }
+    updateInstanceRow(instance);
+};
 
+const subscribeToInstanceEvents = () => {
+    let source = new EventSource(BASE_URL + 'vms/events');
+    source.addEventListener('instance', handleInstanceEvent);
 };
 
 const createInstanceRow = (instance) => {
@@ -108,7 +117,7 @@ const listInstances = () => {
             let instanceRows = data.map(instance => createInstanceRow(instance));
             appendInstanceRows(instanceRows);
             data.forEach(instance => {
-                instanceReady(instance);
+                updateInstanceRow(instance);
             });
         })
         .catch(error => console.error('Error:', error));
@@ -182,7 +191,7 @@ const createInstance = () => {
                 size: formData.get('size')
             })
         })
-            .then(response => response.status === 200 ? instanceCreationSuccess(createInstanceButton) : instanceCreationFail(createInstanceButton))
+            .then(response => response.ok ? instanceCreationSuccess(createInstanceButton) : instanceCreationFail(createInstanceButton))
             .catch(error => console.error('Error:', error));
     }
 };
@@ -270,3 +279,4 @@ document.getElementById('check').addEventListener('click', checkCustomRepo);
 document.getElementById('customRepo').addEventListener('keyup', repoValidationReset);
 document.getElementById('refresh').addEventListener('click', listInstances);
 controlCollapse();
+subscribeToInstanceEvents();